@@ -6,14 +6,26 @@ Flask Web应用
 
 import os
 import uuid
+import atexit
+import threading
 from functools import wraps
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from src.lexer import Lexer
 from src.parser import Parser
 from src.interpreter import Interpreter, InterpreterState
-from src.intent_recognizer import GeminiIntentRecognizer, create_intent_recognizer
+from src.intent_recognizer import (
+    GeminiIntentRecognizer, create_intent_recognizer, init_circuit_breaker
+)
+from src.local_intent_recognizer import create_local_recognizer
 #from src.local_intent_recognizer import create_intent_recognizer_local as create_intent_recognizer;
 from src.auth import get_auth_service, AuthService
+from src.script_cache import get_script_cache
+from src.session_store import BoundedSessionStore
+from src.intent_cache import IntentCache
+from src.cascade_recognizer import CascadeIntentRecognizer
+from src.async_gemini import AsyncGeminiClient
+from src.rate_limiter import init_rate_limiter
+from src.prompt_builder import IntentPromptBuilder
 from src.scenario_manager import get_scenario_manager, init_scenario_manager
 
 app = Flask(__name__)
@@ -24,6 +36,15 @@ GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', 'AIzaSyDQJo3RmKSiAfj_CtVqFRCNP
 BASE_DIR = os.path.dirname(__file__)
 SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
 CONFIG_DIR = os.path.join(BASE_DIR, 'config')
+SESSION_MAX = int(os.environ.get('SESSION_MAX', '10000'))        # 每个场景的最大会话数
+SESSION_IDLE_TTL = float(os.environ.get('SESSION_IDLE_TTL', '1800'))  # 会话空闲超时（秒）
+INTENT_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'intent_cache.json')  # 意图缓存持久化文件
+GEMINI_RPM = float(os.environ.get('GEMINI_RPM', '60'))      # Gemini配额：每分钟请求数
+GEMINI_BURST = float(os.environ.get('GEMINI_BURST', '10'))  # 令牌桶突发容量
+LOCAL_INTENT_THRESHOLD = float(os.environ.get('LOCAL_INTENT_THRESHOLD', '0.4'))  # 本地识别直接采用的最低置信度
+GEMINI_BREAKER_FAILURES = int(os.environ.get('GEMINI_BREAKER_FAILURES', '5'))  # 连续失败多少次后熔断
+GEMINI_BREAKER_RESET = float(os.environ.get('GEMINI_BREAKER_RESET', '30'))  # 熔断后多少秒放行探测请求
+PROMPT_MAX_TOKENS = int(os.environ.get('PROMPT_MAX_TOKENS', '600'))  # 意图识别提示词的token预算
 
 # 初始化场景管理器
 scenario_manager = init_scenario_manager(
@@ -33,11 +54,18 @@ scenario_manager = init_scenario_manager(
 
 # 全局存储
 scripts_cache = {}  # 缓存解析后的脚本
-interpreters = {}   # 存储解释器实例
+interpreters = {}   # 每个场景一个共享的解释器实例，会话上下文保存在解释器内
+_interpreters_lock = threading.Lock()
+_intent_recognizer = None  # 所有场景共享的级联意图识别器（复用HTTP连接池）
+_intent_recognizer_lock = threading.Lock()
 
 # 认证服务
 auth_service = get_auth_service()
 
+# 磁盘脚本缓存（跨进程共享解析结果）
+script_cache = get_script_cache()
+script_cache.prune_stale()
+
 
 # ==================== 认证装饰器 ====================
 
@@ -96,29 +124,51 @@ def load_script(scenario: str):
     if not script_path or not os.path.exists(script_path):
         raise FileNotFoundError(f"脚本文件不存在: {scenario}")
     
-    with open(script_path, 'r', encoding='utf-8') as f:
-        source = f.read()
-    
-    lexer = Lexer(source)
-    tokens = lexer.tokenize()
-    parser = Parser(tokens)
-    script = parser.parse()
+    script = script_cache.load_file(script_path)
     
     scripts_cache[scenario] = script
     return script
 
 
-def get_interpreter(scenario: str, session_id: str):
-    """获取或创建解释器"""
-    key = f"{scenario}_{session_id}"
+def get_intent_recognizer():
+    """获取共享的意图识别器（首次调用时创建，限流器、熔断器和缓存全进程只初始化一次）"""
+    global _intent_recognizer
+    if _intent_recognizer is not None:
+        return _intent_recognizer
     
-    if key not in interpreters:
-        script = load_script(scenario)
-        intent_recognizer = create_intent_recognizer(GEMINI_API_KEY)
-        interpreter = Interpreter(script, intent_recognizer)
-        interpreters[key] = interpreter
+    with _intent_recognizer_lock:
+        if _intent_recognizer is None:
+            cache = IntentCache(max_size=4096, ttl=24 * 3600, persist_path=INTENT_CACHE_PATH)
+            atexit.register(cache.save)
+            rate_limiter = init_rate_limiter(GEMINI_RPM, GEMINI_BURST)
+            init_circuit_breaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET)
+            client = AsyncGeminiClient(GEMINI_API_KEY, rate_limiter=rate_limiter)
+            atexit.register(client.close)
+            # 被限流或熔断时直接采用本地识别结果（不要求达到置信度阈值）
+            local_recognizer = create_local_recognizer()
+            degraded = CascadeIntentRecognizer(None, local_recognizer)
+            llm_recognizer = create_intent_recognizer(GEMINI_API_KEY, cache=cache, async_client=client,
+                                                      rate_limiter=rate_limiter,
+                                                      fallback_recognizer=degraded,
+                                                      prompt_builder=IntentPromptBuilder(PROMPT_MAX_TOKENS))
+            _intent_recognizer = CascadeIntentRecognizer(llm_recognizer, local_recognizer,
+                                                         local_threshold=LOCAL_INTENT_THRESHOLD)
+        return _intent_recognizer
+
+
+def get_interpreter(scenario: str):
+    """获取或创建场景的共享解释器"""
+    interpreter = interpreters.get(scenario)
+    if interpreter is not None:
+        return interpreter
     
-    return interpreters[key]
+    with _interpreters_lock:
+        if scenario not in interpreters:
+            script = load_script(scenario)
+            store = BoundedSessionStore(max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL)
+            interpreters[scenario] = Interpreter(script, get_intent_recognizer(),
+                                                 session_store=store)
+        return interpreters[scenario]
 
 
 # ==================== 认证页面路由 ====================
@@ -372,7 +422,7 @@ def start_session():
         session_id = f"{user.user_id}_{str(uuid.uuid4())}"
         
         # 获取解释器
-        interpreter = get_interpreter(scenario, session_id)
+        interpreter = get_interpreter(scenario)
         
         # 创建会话上下文，传入用户名
         context = interpreter.create_session(session_id, {'name': user.username})
@@ -420,7 +470,7 @@ def chat():
             }), 404
         
         # 获取解释器
-        interpreter = get_interpreter(scenario, session_id)
+        interpreter = get_interpreter(scenario)
         
         # 检查会话是否存在
         context = interpreter.get_session(session_id)
@@ -468,9 +518,8 @@ def end_session():
         session_id = data.get('session_id')
         
         if session_id:
-            key = f"{scenario}_{session_id}"
-            if key in interpreters:
-                interpreter = interpreters[key]
+            interpreter = interpreters.get(scenario)
+            if interpreter:
                 interpreter.remove_session(session_id)
         
         return jsonify({
@@ -535,10 +584,10 @@ def parse_script():
         data = request.json
         source = data.get('source', '')
         
-        lexer = Lexer(source)
-        tokens = lexer.tokenize()
-        parser = Parser(tokens)
+        # 调试用的任意源码不写入磁盘缓存（磁盘缓存只用于场景脚本）
+        parser = Parser(Lexer(source, backend='regex').tokenize())
         script = parser.parse()
+        errors = parser.errors
         
         # 返回脚本结构
         steps = []
@@ -556,7 +605,7 @@ def parse_script():
             'success': True,
             'entry_step': script.entry_step,
             'steps': steps,
-            'errors': [str(e) for e in parser.errors]
+            'errors': [str(e) for e in errors]
         })
     
     except Exception as e:
@@ -566,6 +615,39 @@ def parse_script():
         }), 500
 
 
+@app.route('/api/llm/metrics')
+@login_required
+def api_llm_metrics():
+    """获取LLM调用指标：限流拒绝与降级次数、熔断状态、各级识别次数、缓存、请求合并和提示词大小，
+    以及各场景会话存储的容量、过期和淘汰统计"""
+    metrics = {}
+    # 只读取已创建的识别器，不在这里初始化（识别器在第一个会话开始时创建）
+    recognizer = _intent_recognizer
+    if recognizer is not None:
+        llm_recognizer = recognizer.llm_recognizer
+        metrics['cascade'] = recognizer.get_stats()
+        if getattr(llm_recognizer, 'rate_limiter', None) is not None:
+            metrics['rate_limiter'] = llm_recognizer.rate_limiter.get_stats()
+        if getattr(llm_recognizer, 'circuit_breaker', None) is not None:
+            metrics['circuit_breaker'] = llm_recognizer.circuit_breaker.get_stats()
+        if hasattr(llm_recognizer, 'get_degraded_stats'):
+            metrics['degraded'] = llm_recognizer.get_degraded_stats()
+        if getattr(llm_recognizer, 'cache', None) is not None:
+            metrics['cache'] = llm_recognizer.cache.get_stats()
+        if getattr(llm_recognizer, 'async_client', None) is not None:
+            metrics['client'] = llm_recognizer.async_client.get_stats()
+        if getattr(llm_recognizer, 'prompt_builder', None) is not None:
+            metrics['prompt'] = llm_recognizer.prompt_builder.get_stats()
+    with _interpreters_lock:
+        scenario_interpreters = list(interpreters.items())
+    metrics['sessions'] = {scenario: interpreter.contexts.get_stats()
+                           for scenario, interpreter in scenario_interpreters}
+    return jsonify({
+        'success': True,
+        'metrics': metrics
+    })
+
+
 @app.route('/api/site-config')
 def api_site_config():
     """获取站点配置"""
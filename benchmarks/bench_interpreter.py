@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+解释器单轮延迟基准测试
+在三个业务脚本上回放相同的随机对话，比较逐节点遍历AST（tree）、
+预编译闭包（closure）与字节码虚拟机（vm）三种执行后端的每轮耗时
+
+用法: python benchmarks/bench_interpreter.py [对话数]
+"""
+
+import sys
+import os
+import time
+import random
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.interpreter import Interpreter
+from src.intent_recognizer import MockIntentRecognizer
+from benchmarks.fixtures import DeterministicServiceHandler
+
+SCENARIOS = ('hospital', 'restaurant', 'theater')
+
+
+def load(name: str):
+    with open(os.path.join(project_root, 'scripts', f'{name}.dsl'), 'r', encoding='utf-8') as f:
+        return parse(f.read())
+
+
+def bench(script, backend: str, conversations: int, max_turns: int = 30) -> float:
+    """返回平均每轮耗时（微秒）"""
+    interpreter = Interpreter(script, MockIntentRecognizer(),
+                              DeterministicServiceHandler(), backend=backend)
+    rng = random.Random(0)
+    turns = 0
+    start = time.perf_counter()
+    for i in range(conversations):
+        session_id = f"bench_{i}"
+        interpreter.create_session(session_id, {"name": "测试用户"})
+        output = interpreter.start(session_id)
+        turns += 1
+        for _ in range(max_turns):
+            if not output.waiting_for_input:
+                break
+            user_input = rng.choice(output.available_intents or [""])
+            output = interpreter.process_input(session_id, user_input)
+            turns += 1
+        interpreter.remove_session(session_id)
+    elapsed = time.perf_counter() - start
+    return elapsed / turns * 1e6
+
+
+def main():
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    backends = Interpreter.BACKENDS
+    
+    print(f"每个场景 {conversations} 段对话，单位: 微秒/轮")
+    print(f"{'场景':<12}" + "".join(f"{b:>12}" for b in backends))
+    for name in SCENARIOS:
+        script = load(name)
+        results = [bench(script, backend, conversations) for backend in backends]
+        print(f"{name:<12}" + "".join(f"{r:>12.1f}" for r in results))
+
+
+if __name__ == '__main__':
+    main()
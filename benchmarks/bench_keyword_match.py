@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+关键词匹配基准测试
+在IntentLibrary全部意图上比较逐个关键词子串判断与Aho-Corasick自动机
+一次扫描两种方式的关键词匹配耗时
+
+用法: python benchmarks/bench_keyword_match.py [输入条数]
+"""
+
+import sys
+import os
+import time
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.local_intent_recognizer import IntentLibrary, TextPreprocessor, create_local_recognizer
+from benchmarks.fixtures import intent_library_inputs
+
+ALL_INTENTS = [IntentLibrary.HOSPITAL_INTENTS, IntentLibrary.RESTAURANT_INTENTS,
+               IntentLibrary.THEATER_INTENTS, IntentLibrary.COMMON_INTENTS]
+
+
+def bench(recognizer, inputs, use_automaton: bool) -> float:
+    """返回每条输入在全部意图上做关键词匹配的平均耗时（微秒）"""
+    patterns = list(recognizer.intent_patterns.values())
+    start = time.perf_counter()
+    for text in inputs:
+        hits = recognizer._keyword_automaton.find_all(text.lower()) if use_automaton else None
+        for pattern in patterns:
+            recognizer._keyword_match(text, pattern, hits)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(inputs) * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    recognizer = create_local_recognizer()
+    inputs = [TextPreprocessor.preprocess(text)
+              for text in intent_library_inputs(ALL_INTENTS, count=count)]
+    
+    # 未命中的关键词会继续做模糊匹配；关闭模糊匹配后单独统计包含判断和同义词扩展的开销
+    exact_only = create_local_recognizer()
+    exact_only._fuzzy_match = lambda keyword, text, *args: False
+    
+    print(f"{len(recognizer.intent_patterns)} 个意图，{len(inputs)} 条输入，单位: 微秒/条")
+    print(f"{'':<16}{'逐个判断':>12}{'自动机':>12}")
+    for name, target in (("含模糊匹配", recognizer), ("仅包含判断", exact_only)):
+        legacy = bench(target, inputs, use_automaton=False)
+        automaton = bench(target, inputs, use_automaton=True)
+        print(f"{name:<16}{legacy:>12.1f}{automaton:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+会话内存基准测试
+模拟大量并发聊天会话，比较两种解释器组织方式的内存占用：
+  per-session: 每个会话一个解释器和一个意图识别器（旧的 app.get_interpreter 行为）
+  shared:      每个场景一个共享解释器，会话只保存执行上下文
+
+用法: python benchmarks/bench_sessions.py [会话数]
+"""
+
+import sys
+import os
+import gc
+import time
+import tracemalloc
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.interpreter import Interpreter
+from src.intent_recognizer import GeminiIntentRecognizer
+
+SCENARIOS = ('hospital', 'restaurant', 'theater')
+
+
+def load_scripts():
+    scripts = {}
+    for name in SCENARIOS:
+        with open(os.path.join(project_root, 'scripts', f'{name}.dsl'), 'r', encoding='utf-8') as f:
+            scripts[name] = parse(f.read())
+    return scripts
+
+
+def per_session(scripts, sessions: int):
+    """旧方式：按 场景_会话 创建解释器和识别器"""
+    interpreters = {}
+    for i in range(sessions):
+        scenario = SCENARIOS[i % len(SCENARIOS)]
+        session_id = f"user_{i}"
+        interpreter = Interpreter(scripts[scenario], GeminiIntentRecognizer("bench-key"))
+        interpreter.create_session(session_id, {"name": "测试用户"})
+        interpreter.start(session_id)
+        interpreters[f"{scenario}_{session_id}"] = interpreter
+    return interpreters
+
+
+def shared(scripts, sessions: int):
+    """新方式：每个场景一个解释器，共享一个识别器"""
+    recognizer = GeminiIntentRecognizer("bench-key")
+    interpreters = {name: Interpreter(script, recognizer) for name, script in scripts.items()}
+    for i in range(sessions):
+        interpreter = interpreters[SCENARIOS[i % len(SCENARIOS)]]
+        session_id = f"user_{i}"
+        interpreter.create_session(session_id, {"name": "测试用户"})
+        interpreter.start(session_id)
+    return interpreters
+
+
+def measure(fn, scripts, sessions: int):
+    """返回 (保留内存MB, 耗时秒)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(scripts, sessions)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / 1024 / 1024, elapsed
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scripts = load_scripts()
+    
+    print(f"模拟 {sessions} 个会话")
+    print(f"{'方式':<14}{'内存(MB)':>12}{'每会话(KB)':>14}{'耗时(s)':>10}")
+    for name, fn in (('per-session', per_session), ('shared', shared)):
+        memory, elapsed = measure(fn, scripts, sessions)
+        print(f"{name:<14}{memory:>12.1f}{memory * 1024 / sessions:>14.2f}{elapsed:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
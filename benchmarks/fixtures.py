@@ -0,0 +1,90 @@
+"""
+基准测试与等价性测试共用的固定输入
+确定性服务处理器、按随机种子生成的对话和意图识别语料，
+使不同执行后端、不同识别器实现可以在相同输入上比较结果
+"""
+
+import random
+from typing import List, Dict, Any
+
+
+class DeterministicServiceHandler:
+    """
+    确定性服务处理器
+    与解释器的ExternalServiceHandler接口兼容，返回值只取决于服务名和参数，
+    便于比较不同执行后端的输出
+    """
+    
+    def __init__(self):
+        self.call_history: List[Dict] = []
+    
+    def handle(self, service_name: str, arguments: List[Any], context: Any) -> Any:
+        """处理服务调用"""
+        self.call_history.append({
+            "service": service_name,
+            "args": list(arguments)
+        })
+        return {"服务": service_name, "参数": [str(arg) for arg in arguments]}
+
+
+def random_conversation(interpreter, session_id: str, seed: int, turns: int = 30,
+                        initial_variables: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    随机对话驱动
+    按固定随机种子从可用意图、静默和无关输入中选择用户输入，
+    返回每一轮的输出快照，用于比较不同执行后端
+    """
+    rng = random.Random(seed)
+    transcript = []
+    
+    def snapshot(output):
+        context = interpreter.get_session(session_id)
+        return {
+            "message": output.message,
+            "state": output.state,
+            "waiting_for_input": output.waiting_for_input,
+            "available_intents": list(output.available_intents),
+            "current_step": context.current_step if context else None,
+            "variables": dict(context.variables) if context else None,
+        }
+    
+    interpreter.create_session(session_id, initial_variables or {"name": "测试用户"})
+    output = interpreter.start(session_id)
+    transcript.append(snapshot(output))
+    
+    for _ in range(turns):
+        if not output.waiting_for_input:
+            break
+        choices = list(output.available_intents) + ["", "随便说点什么"]
+        output = interpreter.process_input(session_id, rng.choice(choices))
+        transcript.append(snapshot(output))
+    
+    return transcript
+
+
+def intent_library_inputs(intent_dicts: List[Dict[str, Dict]], seed: int = 0,
+                          count: int = 300) -> List[str]:
+    """
+    意图识别输入语料
+    包含意图库中的全部关键词、同义词和示例句，以及按固定随机种子拼接的
+    组合输入和随机字符输入，用于比较识别器不同实现的结果
+    """
+    rng = random.Random(seed)
+    pieces = []
+    for intents in intent_dicts:
+        for name, config in intents.items():
+            pieces.append(name)
+            pieces.extend(config.get('keywords', []))
+            pieces.extend(config.get('examples', []))
+            for word, synonyms in config.get('synonyms', {}).items():
+                pieces.append(word)
+                pieces.extend(synonyms)
+    
+    chars = sorted(set(''.join(pieces))) + list("，。！？ ok123")
+    inputs = list(dict.fromkeys(pieces))
+    for _ in range(count):
+        if rng.random() < 0.5:
+            inputs.append(''.join(rng.choice(pieces) for _ in range(rng.randint(2, 4))))
+        else:
+            inputs.append(''.join(rng.choice(chars) for _ in range(rng.randint(1, 12))))
+    return inputs
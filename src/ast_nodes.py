@@ -159,6 +159,8 @@ class Step:
     silence_handler: Optional[str] = None
     default_handler: Optional[str] = None
     is_exit: bool = False
+    line: int = 0         # Step关键字所在行列（用于报告链接错误）
+    column: int = 0
 
 
 @dataclass
@@ -181,6 +183,14 @@ class Script:
         if self.steps:
             return next(iter(self.steps.values()))
         return None
+    
+    def __getstate__(self):
+        """序列化时去掉运行期缓存（编译、字节码和链接结果）"""
+        state = self.__dict__.copy()
+        state.pop('_compiled', None)
+        state.pop('_bytecode', None)
+        state.pop('_linked', None)
+        return state
 
 
 # ============ 辅助类 ============
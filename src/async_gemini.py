@@ -0,0 +1,228 @@
+"""
+Gemini异步客户端
+在独立的事件循环线程中发送请求：连接池复用keep-alive连接，
+相同提示词的并发请求合并为一次API调用
+"""
+
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .intent_recognizer import (LLMError, RateLimitExceeded, CircuitBreaker,
+                               build_request_payload, extract_response_text)
+from .rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+
+try:
+    import aiohttp
+except ImportError:  # 未安装aiohttp时在线程池中使用requests连接池发送
+    aiohttp = None
+
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+
+
+class AsyncGeminiClient:
+    """
+    Gemini异步客户端
+    
+    generate() 是协程，需要在客户端自己的事件循环中运行；同步代码通过
+    generate_sync() 把请求提交到该循环并等待结果。进行中的请求按提示词登记，
+    相同提示词的后续调用等待同一个请求（single-flight）。传入熔断器时，
+    熔断判断和结果记录都在发出请求的一方完成，合并的调用方共享同一结果，
+    一次上游失败只计一次。
+    """
+    
+    def __init__(self,
+                 api_key: str,
+                 model: str = "gemini-2.0-flash",
+                 base_url: str = DEFAULT_BASE_URL,
+                 pool_size: int = 10,
+                 timeout: float = 30,
+                 max_retries: int = 3,
+                 retry_delay: float = 1.0,
+                 max_backoff: float = 30.0,
+                 rate_limiter: Optional[TokenBucket] = None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay  # 退避基数（秒），第n次重试最多等待 retry_delay * 2**n
+        self.max_backoff = max_backoff  # 单次退避超过该时长时放弃重试
+        self.rate_limiter = rate_limiter  # 令牌桶（可选）；事件循环中不能阻塞，取不到令牌立即失败
+        
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._session = None       # aiohttp.ClientSession，在事件循环中创建
+        self._executor = None      # 未安装aiohttp时发送请求的线程池
+        self._requests_session = None
+        
+        # 统计信息
+        self.requests_sent = 0
+        self.coalesced = 0
+    
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/{self.model}:generateContent?key={self.api_key}"
+    
+    # ==================== 异步接口 ====================
+    
+    async def generate(self, prompt: str, circuit_breaker: Optional[CircuitBreaker] = None) -> str:
+        """发送提示词并返回生成的文本，相同提示词的进行中请求只发送一次"""
+        task = self._inflight.get(prompt)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._guarded_request(prompt, circuit_breaker))
+            self._inflight[prompt] = task
+            task.add_done_callback(lambda _: self._inflight.pop(prompt, None))
+        # 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+    
+    async def _guarded_request(self, prompt: str, circuit_breaker: Optional[CircuitBreaker]) -> str:
+        if circuit_breaker is None:
+            return await self._request_with_retry(prompt)
+        with circuit_breaker.guard():
+            return await self._request_with_retry(prompt)
+    
+    async def _request_with_retry(self, prompt: str) -> str:
+        payload = build_request_payload(prompt)
+        for attempt in range(self.max_retries):
+            if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+                raise RateLimitExceeded("请求过于频繁，已触发本地限流")
+            self.requests_sent += 1
+            try:
+                status, body, retry_after = await self._post(payload)
+            except asyncio.TimeoutError:
+                if attempt < self.max_retries - 1:
+                    await self._sleep_before_retry(attempt)
+                    continue
+                raise LLMError("API请求超时")
+            
+            if status == 200:
+                try:
+                    return extract_response_text(json.loads(body))
+                except ValueError as e:
+                    raise LLMError(f"API响应格式错误: {e}")
+            elif status == 429:
+                # 速率限制：带抖动的指数退避，服务器给出Retry-After时遵循
+                if attempt < self.max_retries - 1:
+                    await self._sleep_before_retry(attempt, parse_retry_after(retry_after))
+                continue
+            else:
+                raise LLMError(f"API请求失败: {status} - {body}")
+        
+        raise LLMError("达到最大重试次数")
+    
+    async def _sleep_before_retry(self, attempt: int, retry_after: Optional[float] = None):
+        """重试前退避等待，需要等待过久时放弃重试"""
+        delay = backoff_delay(attempt, base=self.retry_delay, cap=self.max_backoff,
+                              retry_after=retry_after)
+        if delay > self.max_backoff:
+            raise LLMError(f"API速率限制，需等待 {delay:.0f} 秒")
+        await asyncio.sleep(delay)
+    
+    async def _post(self, payload: Dict[str, Any]) -> Tuple[int, str, Optional[str]]:
+        """发送POST请求，返回 (状态码, 响应正文, Retry-After头)；超时抛出asyncio.TimeoutError"""
+        if aiohttp is not None:
+            if self._session is None:
+                self._session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(limit=self.pool_size),
+                    timeout=aiohttp.ClientTimeout(total=self.timeout)
+                )
+            try:
+                async with self._session.post(self.url, json=payload) as response:
+                    return (response.status, await response.text(),
+                            response.headers.get("Retry-After"))
+            except asyncio.TimeoutError:
+                raise
+            except aiohttp.ClientError as e:
+                raise LLMError(f"网络错误: {str(e)}")
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                thread_name_prefix="gemini-http")
+            self._requests_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            self._requests_session.mount("https://", adapter)
+            self._requests_session.mount("http://", adapter)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._blocking_post, payload)
+    
+    def _blocking_post(self, payload: Dict[str, Any]) -> Tuple[int, str, Optional[str]]:
+        try:
+            response = self._requests_session.post(self.url, json=payload, timeout=self.timeout)
+            return response.status_code, response.text, response.headers.get("Retry-After")
+        except requests.exceptions.Timeout:
+            raise asyncio.TimeoutError()
+        except requests.exceptions.RequestException as e:
+            raise LLMError(f"网络错误: {str(e)}")
+    
+    # ==================== 同步桥接 ====================
+    
+    def start(self):
+        """启动事件循环线程（generate_sync首次调用时自动启动）"""
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+            
+            self._thread = threading.Thread(target=run, name="gemini-async", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+    
+    def generate_sync(self, prompt: str, timeout: Optional[float] = None,
+                      circuit_breaker: Optional[CircuitBreaker] = None) -> str:
+        """在同步代码中调用generate，阻塞直到得到结果"""
+        loop = self._loop
+        if loop is None:
+            self.start()
+            loop = self._loop
+        future = asyncio.run_coroutine_threadsafe(self.generate(prompt, circuit_breaker), loop)
+        return future.result(timeout)
+    
+    def close(self):
+        """关闭连接池并停止事件循环线程"""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            
+            async def shutdown():
+                if self._session is not None:
+                    await self._session.close()
+                    self._session = None
+            
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._requests_session.close()
+                self._executor = None
+                self._requests_session = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取请求统计"""
+        return {
+            'transport': 'aiohttp' if aiohttp is not None else 'requests',
+            'requests_sent': self.requests_sent,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight),
+        }
@@ -0,0 +1,103 @@
+"""
+级联意图识别器
+先用本地规则快速识别，只有本地无法确定时才请求大模型
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from .intent_cache import normalize_input
+from .intent_recognizer import IntentResult
+from .local_intent_recognizer import LocalIntentRecognizer, create_local_recognizer
+
+
+class CascadeIntentRecognizer:
+    """
+    级联意图识别器，提供与GeminiIntentRecognizer相同的recognize_intent接口
+    
+    识别顺序：
+    1. exact: 归一化后的输入与某个可用意图名完全相同
+    2. local: 本地识别器的置信度不低于 local_threshold
+    3. llm:   交给大模型识别器（未配置时返回本地识别结果）
+    """
+    
+    TIERS = ('silence', 'exact', 'local', 'llm', 'unmatched')
+    
+    def __init__(self,
+                 llm_recognizer: Any = None,
+                 local_recognizer: Optional[LocalIntentRecognizer] = None,
+                 local_threshold: float = 0.4):
+        self.llm_recognizer = llm_recognizer
+        self.local_recognizer = local_recognizer or create_local_recognizer()
+        self.local_threshold = local_threshold
+        self._counts = dict.fromkeys(self.TIERS, 0)
+        self._lock = threading.Lock()
+    
+    def recognize_intent(self,
+                         user_input: str,
+                         available_intents: List[str],
+                         context: Optional[Dict[str, Any]] = None) -> IntentResult:
+        """
+        识别用户意图
+        
+        Args:
+            user_input: 用户输入的文本
+            available_intents: 可用的意图列表
+            context: 上下文信息（可选，只传给大模型识别器）
+        
+        Returns:
+            IntentResult: 意图识别结果
+        """
+        if not user_input or user_input.strip() == "":
+            self._count('silence')
+            return IntentResult(
+                intent="",
+                confidence=0.0,
+                entities={},
+                raw_response="",
+                is_silence=True
+            )
+        
+        # 第一级：输入就是意图名
+        normalized = normalize_input(user_input)
+        for intent in available_intents:
+            if normalize_input(intent) == normalized:
+                self._count('exact')
+                return IntentResult(intent=intent, confidence=1.0, entities={},
+                                    raw_response="exact_match")
+        
+        # 第二级：本地识别器
+        local = self.local_recognizer.recognize(user_input, available_intents)
+        local_matched = local.intent in available_intents
+        if local_matched and local.confidence >= self.local_threshold:
+            self._count('local')
+            return IntentResult(intent=local.intent, confidence=local.confidence,
+                                entities={}, raw_response=f"local:{local.match_strategy}")
+        
+        # 第三级：大模型
+        if self.llm_recognizer is not None:
+            self._count('llm')
+            return self.llm_recognizer.recognize_intent(user_input, available_intents, context)
+        
+        if local_matched:
+            self._count('local')
+            return IntentResult(intent=local.intent, confidence=local.confidence,
+                                entities={}, raw_response=f"local:{local.match_strategy}")
+        
+        self._count('unmatched')
+        return IntentResult(intent="", confidence=0.0, entities={}, raw_response="no_match")
+    
+    def _count(self, tier: str):
+        with self._lock:
+            self._counts[tier] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各级识别的决策次数"""
+        with self._lock:
+            counts = dict(self._counts)
+        decided = sum(counts.values()) - counts['silence']
+        return {
+            'counts': counts,
+            'total': sum(counts.values()),
+            'llm_rate': counts['llm'] / decided if decided else 0.0,
+        }
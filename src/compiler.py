@@ -0,0 +1,276 @@
+"""
+AST闭包编译器
+在加载脚本时把每个Step的语句和表达式编译成预绑定的Python闭包，
+运行时不再需要isinstance分派和操作符字符串比较
+"""
+
+from typing import Dict, List, Any, Callable, Optional
+from .ast_nodes import (
+    Script, Step, Statement, Expression,
+    SpeakStatement, ListenStatement, GotoStatement,
+    SetStatement, IfStatement, WhileStatement, CallStatement,
+    StringLiteral, NumberLiteral, Variable, BinaryOp, UnaryOp, FunctionCall
+)
+from .linker import link_script, LinkedScript, UNSET
+from .operators import BINARY_OPERATORS, UNARY_OPERATORS
+from .optimizer import Constant, Template, optimize_expression
+
+
+# 闭包签名: fn(interpreter, context) -> Any
+# 语句闭包的返回值: None、Speak输出的str，或需要向上传递的控制流结果
+CompiledExpression = Callable[[Any, Any], Any]
+CompiledStatement = Callable[[Any, Any], Any]
+
+# While循环的最大迭代次数（与解释执行保持一致）
+MAX_LOOP_ITERATIONS = 1000
+
+
+class StepJump:
+    """Goto跳转标记：由解释器的步骤循环处理，不在语句内递归执行目标步骤"""
+    
+    __slots__ = ('target', 'index')
+    
+    def __init__(self, target: str, index: Optional[int] = None):
+        self.target = target
+        self.index = index  # 链接后的目标步骤下标
+    
+    def __repr__(self):
+        return f"StepJump({self.target!r})"
+
+
+class CompiledStep:
+    """编译后的步骤"""
+    
+    __slots__ = ('name', 'step', 'body', 'has_listen')
+    
+    def __init__(self, step: Step, body: List[CompiledStatement], has_listen: bool):
+        self.name = step.name
+        self.step = step
+        self.body = tuple(body)
+        self.has_listen = has_listen
+
+
+# ============ 表达式编译 ============
+
+def compile_expression(expr: Expression, slots: Optional[Dict[str, int]] = None) -> CompiledExpression:
+    """将表达式优化（常量折叠、拼接模板）后编译为闭包（slots: 变量名 -> 槽位下标）"""
+    return _compile_expression(optimize_expression(expr), slots or {})
+
+
+def _compile_expression(expr: Expression, slots: Dict[str, int]) -> CompiledExpression:
+    if isinstance(expr, (Constant, StringLiteral, NumberLiteral)):
+        value = expr.value
+        return lambda interp, ctx: value
+    
+    if isinstance(expr, Template):
+        return _compile_template(expr, slots)
+    
+    if isinstance(expr, Variable):
+        return _compile_load(expr.name, slots)
+    
+    if isinstance(expr, BinaryOp):
+        return _compile_binary(expr, slots)
+    
+    if isinstance(expr, UnaryOp):
+        operand = _compile_expression(expr.operand, slots)
+        op = UNARY_OPERATORS.get(expr.operator)
+        if op is None:
+            def unknown_unary(interp, ctx):
+                operand(interp, ctx)
+                return None
+            return unknown_unary
+        return lambda interp, ctx: op(operand(interp, ctx))
+    
+    if isinstance(expr, FunctionCall):
+        name = expr.name
+        args = tuple(_compile_expression(arg, slots) for arg in expr.arguments)
+        return lambda interp, ctx: interp._call_builtin_function(
+            name, [arg(interp, ctx) for arg in args], ctx)
+    
+    return lambda interp, ctx: None
+
+
+def _compile_load(name: str, slots: Dict[str, int]) -> CompiledExpression:
+    """编译变量读取：脚本变量按槽位下标直接取值，未赋值时为空字符串"""
+    slot = slots.get(name)
+    if slot is None:
+        return lambda interp, ctx: ctx.get_variable(name, "")
+    
+    def load(interp, ctx):
+        value = ctx.values[slot]
+        return "" if value is UNSET else value
+    return load
+
+
+def _compile_store(name: str, slots: Dict[str, int]) -> Callable[[Any, Any], None]:
+    """编译变量赋值，返回 fn(ctx, value)"""
+    slot = slots.get(name)
+    if slot is None:
+        return lambda ctx, value: ctx.set_variable(name, value)
+    
+    def store(ctx, value):
+        ctx.values[slot] = value
+    return store
+
+
+def _compile_binary(expr: BinaryOp, slots: Dict[str, int]) -> CompiledExpression:
+    """编译二元操作"""
+    left = _compile_expression(expr.left, slots)
+    right = _compile_expression(expr.right, slots)
+    op = BINARY_OPERATORS.get(expr.operator)
+    
+    if op is None:
+        # 未知操作符：两侧仍然求值，结果为None
+        def unknown_binary(interp, ctx):
+            left(interp, ctx)
+            right(interp, ctx)
+            return None
+        return unknown_binary
+    
+    return lambda interp, ctx: op(left(interp, ctx), right(interp, ctx))
+
+
+def _compile_template(expr: Template, slots: Dict[str, int]) -> CompiledExpression:
+    """编译字符串模板：常量部分直接使用，其余部分求值后str()，一次join"""
+    parts = tuple(part.value if isinstance(part, Constant) else _compile_expression(part, slots)
+                  for part in expr.parts)
+    
+    def template(interp, ctx):
+        return ''.join([part if part.__class__ is str else str(part(interp, ctx)) for part in parts])
+    return template
+
+
+# ============ 语句编译 ============
+
+def compile_statement(stmt: Statement,
+                      linked: Optional[LinkedScript] = None) -> Optional[CompiledStatement]:
+    """
+    将语句编译为闭包，无运行时效果的语句返回None
+    
+    给出链接结果时Goto携带目标步骤下标，变量按槽位下标读写。
+    """
+    slots = linked.layout.slots if linked is not None else {}
+    
+    if isinstance(stmt, SpeakStatement):
+        optimized = optimize_expression(stmt.expression)
+        if isinstance(optimized, Constant):
+            # 纯字面量：输出在编译期确定
+            message = str(optimized.value)
+            
+            def speak_constant(interp, ctx):
+                ctx.last_speak_output = message
+                return message
+            return speak_constant
+        
+        expr = _compile_expression(optimized, slots)
+        
+        def speak(interp, ctx):
+            message = str(expr(interp, ctx))
+            ctx.last_speak_output = message
+            return message
+        return speak
+    
+    if isinstance(stmt, SetStatement):
+        store = _compile_store(stmt.variable, slots)
+        expr = compile_expression(stmt.expression, slots)
+        
+        def assign(interp, ctx):
+            store(ctx, expr(interp, ctx))
+        return assign
+    
+    if isinstance(stmt, GotoStatement):
+        jump = StepJump(stmt.target_step, linked.index.get(stmt.target_step) if linked is not None else None)
+        return lambda interp, ctx: jump
+    
+    if isinstance(stmt, IfStatement):
+        return _compile_if(stmt, linked)
+    
+    if isinstance(stmt, WhileStatement):
+        return _compile_while(stmt, linked)
+    
+    if isinstance(stmt, CallStatement):
+        return _compile_call(stmt, slots)
+    
+    # Listen / Exit 在步骤级别处理
+    return None
+
+
+def compile_block(statements: List[Statement],
+                  linked: Optional[LinkedScript] = None) -> List[CompiledStatement]:
+    """编译语句块，去掉无运行时效果的语句"""
+    compiled = (compile_statement(stmt, linked) for stmt in statements)
+    return [fn for fn in compiled if fn is not None]
+
+
+def _run_block(block, interp, ctx):
+    """执行嵌套语句块：Speak输出被丢弃，只向上传递控制流结果"""
+    for fn in block:
+        result = fn(interp, ctx)
+        if result is not None and result.__class__ is not str:
+            return result
+    return None
+
+
+def _compile_if(stmt: IfStatement, linked: Optional[LinkedScript] = None) -> CompiledStatement:
+    condition = compile_expression(stmt.condition, linked.layout.slots if linked is not None else None)
+    then_block = tuple(compile_block(stmt.then_block, linked))
+    else_block = tuple(compile_block(stmt.else_block, linked)) if stmt.else_block else ()
+    
+    def run_if(interp, ctx):
+        if condition(interp, ctx):
+            return _run_block(then_block, interp, ctx)
+        return _run_block(else_block, interp, ctx)
+    return run_if
+
+
+def _compile_while(stmt: WhileStatement, linked: Optional[LinkedScript] = None) -> CompiledStatement:
+    condition = compile_expression(stmt.condition, linked.layout.slots if linked is not None else None)
+    body = tuple(compile_block(stmt.body, linked))
+    
+    def run_while(interp, ctx):
+        iterations = 0
+        while condition(interp, ctx):
+            iterations += 1
+            if iterations > MAX_LOOP_ITERATIONS:
+                raise RuntimeError("循环超过最大迭代次数")
+            result = _run_block(body, interp, ctx)
+            if result is not None:
+                return result
+        return None
+    return run_while
+
+
+def _compile_call(stmt: CallStatement, slots: Dict[str, int]) -> CompiledStatement:
+    service_name = stmt.service_name
+    args = tuple(compile_expression(arg, slots) for arg in stmt.arguments)
+    store = _compile_store(stmt.result_var, slots) if stmt.result_var else None
+    
+    def call(interp, ctx):
+        values = [arg(interp, ctx) for arg in args]
+        result = interp.service_handler.handle(service_name, values, ctx)
+        if store is not None:
+            store(ctx, result)
+    return call
+
+
+# ============ 步骤和脚本编译 ============
+
+def compile_step(step: Step, linked: Optional[LinkedScript] = None) -> CompiledStep:
+    """编译单个步骤"""
+    has_listen = any(isinstance(s, ListenStatement) for s in step.statements)
+    return CompiledStep(step, compile_block(step.statements, linked), has_listen)
+
+
+def compile_script(script: Script) -> Dict[str, CompiledStep]:
+    """
+    编译整个脚本
+    
+    编译结果缓存在Script对象上，同一个Script只编译一次，
+    可被多个解释器实例共享（闭包不持有解释器或会话状态）。
+    """
+    compiled = script.__dict__.get('_compiled')
+    if compiled is None:
+        linked = link_script(script)
+        compiled = {name: compile_step(step, linked) for name, step in script.steps.items()}
+        script.__dict__['_compiled'] = compiled
+    return compiled
@@ -0,0 +1,175 @@
+"""
+意图识别结果缓存
+缓存LLM意图识别结果，相同输入在相同意图集合下不再重复请求API
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .intent_recognizer import IntentResult
+
+
+# 持久化文件格式版本
+CACHE_FORMAT_VERSION = 1
+
+# 归一化时去掉的首尾标点
+_TRIM_CHARS = " \t\r\n。，、！？；：…,.!?;:~～"
+
+
+def normalize_input(text: str) -> str:
+    """归一化用户输入：全半角统一、小写、合并空白、去掉首尾标点"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = " ".join(text.split())
+    return text.strip(_TRIM_CHARS)
+
+
+class IntentCache:
+    """
+    意图识别结果的LRU缓存
+    
+    缓存键 = 归一化输入 + 排序去重后的可用意图 + 进入提示词的变量及其值。
+    与提示词构建一致：context 给出 step_variables 时只取这些变量，否则取全部变量；
+    对话历史等易变上下文不进入缓存键。
+    """
+    
+    def __init__(self,
+                 max_size: int = 1024,
+                 ttl: float = 3600,
+                 persist_path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, IntentResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if persist_path:
+            self.load()
+    
+    def make_key(self,
+                 user_input: str,
+                 available_intents: List[str],
+                 context: Optional[Dict[str, Any]] = None) -> str:
+        """计算缓存键"""
+        context = context or {}
+        variables = context.get('variables') or {}
+        names = context.get('step_variables')
+        if names is None:
+            names = sorted(variables)
+        relevant = [[name, variables[name]] for name in names if name in variables]
+        return json.dumps(
+            [normalize_input(user_input), sorted(set(available_intents)), relevant],
+            ensure_ascii=False, sort_keys=True, default=str
+        )
+    
+    def get(self, key: str) -> Optional[IntentResult]:
+        """读取缓存，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        result = entry[1]
+        return replace(result, entities=dict(result.entities))
+    
+    def put(self, key: str, result: IntentResult):
+        """写入缓存"""
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def load(self) -> int:
+        """从文件加载未过期的条目，返回加载数量"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return 0
+        
+        try:
+            with open(self.persist_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != CACHE_FORMAT_VERSION:
+                return 0
+            now = self._clock()
+            entries = [(key, expires_at, IntentResult(**result))
+                       for key, expires_at, result in data.get('entries', [])
+                       if expires_at > now]
+        except Exception as e:
+            print(f"警告: 无法加载意图缓存 {self.persist_path}: {e}")
+            return 0
+        
+        with self._lock:
+            for key, expires_at, result in entries[-self.max_size:]:
+                self._entries[key] = (expires_at, result)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return len(entries)
+    
+    def save(self):
+        """将未过期的条目写入文件（先写临时文件再原子替换）"""
+        if not self.persist_path:
+            return
+        
+        now = self._clock()
+        with self._lock:
+            entries = [[key, expires_at, asdict(result)]
+                       for key, (expires_at, result) in self._entries.items()
+                       if expires_at > now]
+        
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': CACHE_FORMAT_VERSION, 'entries': entries},
+                              f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            print(f"警告: 无法保存意图缓存 {self.persist_path}: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
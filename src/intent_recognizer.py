@@ -5,11 +5,21 @@ LLM意图识别模块
 
 import json
 import re
+from contextlib import contextmanager
 import requests
-from typing import List, Dict, Optional, Any
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Optional, Any, Callable, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
+import threading
 import time
 
+from .rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from .prompt_builder import IntentPromptBuilder
+
+if TYPE_CHECKING:
+    from .intent_cache import IntentCache
+    from .async_gemini import AsyncGeminiClient
+
 
 @dataclass
 class IntentResult:
@@ -26,55 +36,257 @@ class LLMError(Exception):
     pass
 
 
+class RateLimitExceeded(LLMError):
+    """本地令牌桶已空，请求没有发出"""
+    pass
+
+
+class CircuitOpen(LLMError):
+    """熔断器打开，请求没有发出"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    LLM调用熔断器（closed / open / half_open）
+    
+    连续失败 failure_threshold 次后打开，打开期间请求直接被拒绝；经过
+    reset_timeout 秒进入半开状态，只放行一个探测请求：探测成功则关闭，
+    失败则重新打开并重新计时。
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if failure_threshold < 1 or reset_timeout < 0:
+            raise ValueError("failure_threshold 必须为正整数，reset_timeout 不能为负数")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0           # 连续失败次数
+        self._opened_at = 0.0
+        self._probing = False        # 半开状态下探测请求是否在途
+        
+        # 统计信息
+        self.opened = 0              # 打开次数
+        self.rejected = 0            # 被直接拒绝的请求数
+        self.last_error = ""
+    
+    @property
+    def state(self) -> str:
+        """当前状态（打开且已到重试时间时报告为半开）"""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+    
+    def allow_request(self) -> bool:
+        """是否放行本次请求；放行的请求之后必须调用 record_success/record_failure/release 之一"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """请求成功：关闭熔断器"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+    
+    def record_failure(self, error: str = ""):
+        """请求失败：达到阈值或探测失败时打开熔断器"""
+        with self._lock:
+            self.last_error = error
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+            self._probing = False
+    
+    def release(self):
+        """放行的请求没有真正发出（如被本地限流），归还探测名额，不改变状态"""
+        with self._lock:
+            self._probing = False
+    
+    @contextmanager
+    def guard(self):
+        """
+        用熔断器包裹一次上游请求
+        
+        不放行时抛出 CircuitOpen；请求被本地限流时归还名额，其余异常记为失败，
+        正常结束记为成功。
+        """
+        if not self.allow_request():
+            raise CircuitOpen("Gemini API不可用，熔断器已打开")
+        try:
+            yield
+        except RateLimitExceeded:
+            self.release()
+            raise
+        except Exception as e:
+            self.record_failure(str(e))
+            raise
+        self.record_success()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取熔断器状态和统计"""
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+            return {
+                'state': state,
+                'failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'retry_in': round(retry_in, 3),
+                'opened': self.opened,
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+            }
+
+
+# 进程内共享的熔断器
+_circuit_breaker: Optional[CircuitBreaker] = None
+
+
+def init_circuit_breaker(failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """按配置初始化全局熔断器"""
+    global _circuit_breaker
+    _circuit_breaker = CircuitBreaker(failure_threshold, reset_timeout)
+    return _circuit_breaker
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """获取全局熔断器实例"""
+    global _circuit_breaker
+    if _circuit_breaker is None:
+        _circuit_breaker = CircuitBreaker()
+    return _circuit_breaker
+
+
+def build_request_payload(prompt: str) -> Dict[str, Any]:
+    """构建generateContent请求体"""
+    return {
+        "contents": [{
+            "parts": [{"text": prompt}]
+        }],
+        "generationConfig": {
+            "temperature": 0.1,
+            "maxOutputTokens": 500,
+        }
+    }
+
+
+def extract_response_text(result: Dict[str, Any]) -> str:
+    """从generateContent响应中取出第一个候选的文本"""
+    if "candidates" in result and result["candidates"]:
+        content = result["candidates"][0].get("content", {})
+        parts = content.get("parts", [])
+        if parts:
+            return parts[0].get("text", "")
+    return ""
+
+
 class GeminiIntentRecognizer:
     """使用Gemini进行意图识别"""
     
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
+    def __init__(self, api_key: str, model: str = "gemini-2.0-flash", pool_size: int = 10,
+                 cache: Optional['IntentCache'] = None,
+                 async_client: Optional['AsyncGeminiClient'] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 fallback_recognizer: Any = None,
+                 max_backoff: float = 30.0,
+                 prompt_builder: Optional[IntentPromptBuilder] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         self.api_key = api_key
         self.model = model
+        self.cache = cache  # 识别结果缓存（可选）
+        self.async_client = async_client  # 异步客户端（可选，设置后请求经由其事件循环发送）
+        self.rate_limiter = rate_limiter  # 令牌桶（可选，为空时不排队，直接降级）
+        self.rate_limit_wait = 0.0        # 令牌不足时最多等待的秒数
+        self.fallback_recognizer = fallback_recognizer  # 被限流或熔断时使用的识别器（可选）
+        self.max_backoff = max_backoff    # 单次退避超过该时长时放弃重试
+        self.prompt_builder = prompt_builder or IntentPromptBuilder()  # 提示词构建（带token预算）
+        # 熔断器：默认使用进程内共享实例，所有识别器一起感知API故障
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else get_circuit_breaker()
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
-        self.session = requests.Session()
+        # 连接池：识别器在多个场景、多个请求线程间共享，复用到API的keep-alive连接；
+        # 使用异步客户端时请求走其连接池，不创建同步会话
+        self.session: Optional[requests.Session] = None
+        if async_client is None:
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        # 降级次数：令牌桶不排队，被限流或熔断的请求不会等待，而是直接降级
+        self._degraded = {'rate_limited': 0, 'circuit_open': 0}
+        self._stats_lock = threading.Lock()
+    
+    def _record_degraded(self, error: LLMError, count: int = 1):
+        reason = 'circuit_open' if isinstance(error, CircuitOpen) else 'rate_limited'
+        with self._stats_lock:
+            self._degraded[reason] += count
+    
+    def get_degraded_stats(self) -> Dict[str, int]:
+        """获取因限流或熔断而降级的识别次数"""
+        with self._stats_lock:
+            stats = dict(self._degraded)
+        stats['total'] = sum(stats.values())
+        return stats
     
     def _make_request(self, prompt: str, max_retries: int = 3) -> str:
-        """发送请求到Gemini API"""
+        """发送请求到Gemini API（经过熔断器）"""
+        if self.async_client is not None:
+            # 相同提示词的并发请求会被合并，由实际发出请求的一方记录一次结果
+            return self.async_client.generate_sync(prompt, circuit_breaker=self.circuit_breaker)
+        with self.circuit_breaker.guard():
+            return self._send_request(prompt, max_retries)
+    
+    def _send_request(self, prompt: str, max_retries: int = 3) -> str:
+        """发送请求到Gemini API（带重试）"""
         url = f"{self.base_url}/{self.model}:generateContent?key={self.api_key}"
-        
-        payload = {
-            "contents": [{
-                "parts": [{"text": prompt}]
-            }],
-            "generationConfig": {
-                "temperature": 0.1,
-                "maxOutputTokens": 500,
-            }
-        }
+        payload = build_request_payload(prompt)
         
         headers = {
             "Content-Type": "application/json"
         }
         
         for attempt in range(max_retries):
+            if self.rate_limiter is not None and not self.rate_limiter.acquire(timeout=self.rate_limit_wait):
+                raise RateLimitExceeded("请求过于频繁，已触发本地限流")
             try:
                 response = self.session.post(url, json=payload, headers=headers, timeout=30)
                 
                 if response.status_code == 200:
-                    result = response.json()
-                    if "candidates" in result and result["candidates"]:
-                        content = result["candidates"][0].get("content", {})
-                        parts = content.get("parts", [])
-                        if parts:
-                            return parts[0].get("text", "")
-                    return ""
+                    return extract_response_text(response.json())
                 elif response.status_code == 429:
-                    # 速率限制，等待后重试
-                    time.sleep(2 ** attempt)
+                    # 速率限制：带抖动的指数退避，服务器给出Retry-After时遵循
+                    if attempt < max_retries - 1:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        self._sleep_before_retry(attempt, retry_after)
                     continue
                 else:
                     raise LLMError(f"API请求失败: {response.status_code} - {response.text}")
             
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
-                    time.sleep(1)
+                    self._sleep_before_retry(attempt)
                     continue
                 raise LLMError("API请求超时")
             except requests.exceptions.RequestException as e:
@@ -82,6 +294,13 @@ class GeminiIntentRecognizer:
         
         raise LLMError("达到最大重试次数")
     
+    def _sleep_before_retry(self, attempt: int, retry_after: Optional[float] = None):
+        """重试前退避等待，需要等待过久时放弃重试"""
+        delay = backoff_delay(attempt, retry_after=retry_after, cap=self.max_backoff)
+        if delay > self.max_backoff:
+            raise LLMError(f"API速率限制，需等待 {delay:.0f} 秒")
+        time.sleep(delay)
+    
     def recognize_intent(self, 
                         user_input: str, 
                         available_intents: List[str],
@@ -106,48 +325,183 @@ class GeminiIntentRecognizer:
                 is_silence=True
             )
         
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(user_input, available_intents, context)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        return self._recognize_uncached(user_input, available_intents, context, cache_key)
+    
+    def _recognize_uncached(self,
+                            user_input: str,
+                            available_intents: List[str],
+                            context: Optional[Dict[str, Any]],
+                            cache_key: Optional[str]) -> IntentResult:
+        """调用API识别单条输入（调用方已查过缓存），成功时按 cache_key 写入缓存"""
         # 构建提示词
         prompt = self._build_intent_prompt(user_input, available_intents, context)
         
         try:
             response = self._make_request(prompt)
-            return self._parse_intent_response(response, available_intents)
+            result = self._parse_intent_response(response, available_intents)
+            # 只缓存API实际返回的结果，请求失败时的回退匹配不缓存
+            if cache_key is not None and response:
+                self.cache.put(cache_key, result)
+            return result
+        except (RateLimitExceeded, CircuitOpen) as e:
+            # 令牌桶已空或熔断器打开：不排队等待，直接降级
+            self._record_degraded(e)
+            if self.fallback_recognizer is not None:
+                return self.fallback_recognizer.recognize_intent(user_input, available_intents, context)
+            return self._fallback_intent_match(user_input, available_intents)
         except LLMError as e:
             # 如果LLM调用失败，尝试使用简单的关键词匹配
             return self._fallback_intent_match(user_input, available_intents)
     
+    def recognize_batch(self,
+                        inputs: List[str],
+                        available_intents_list: List[List[str]],
+                        context: Optional[Dict[str, Any]] = None,
+                        batch_size: int = 20) -> List[IntentResult]:
+        """
+        批量识别多条用户输入
+        
+        多条输入打包进一个提示词，模型返回JSON数组并逐条校验。返回的数组格式
+        不正确时把该批拆成两半分别重试，拆到单条时按单条提示词识别。
+        
+        Args:
+            inputs: 用户输入列表
+            available_intents_list: 每条输入对应的可用意图列表
+            context: 上下文信息（可选，所有输入共用）
+            batch_size: 每个提示词最多包含的输入条数
+        
+        Returns:
+            List[IntentResult]: 与输入一一对应的识别结果
+        """
+        if len(inputs) != len(available_intents_list):
+            raise ValueError("inputs 与 available_intents_list 长度不一致")
+        
+        results: List[Optional[IntentResult]] = [None] * len(inputs)
+        cache_keys: Dict[int, str] = {}
+        pending = []
+        for index, (user_input, available_intents) in enumerate(zip(inputs, available_intents_list)):
+            if not user_input or user_input.strip() == "":
+                results[index] = IntentResult(
+                    intent="",
+                    confidence=0.0,
+                    entities={},
+                    raw_response="",
+                    is_silence=True
+                )
+                continue
+            if self.cache is not None:
+                cache_keys[index] = self.cache.make_key(user_input, available_intents, context)
+                cached = self.cache.get(cache_keys[index])
+                if cached is not None:
+                    results[index] = cached
+                    continue
+            pending.append(index)
+        
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            self._recognize_chunk(chunk, inputs, available_intents_list, context, results, cache_keys)
+        
+        return results
+    
+    def _recognize_chunk(self,
+                         chunk: List[int],
+                         inputs: List[str],
+                         available_intents_list: List[List[str]],
+                         context: Optional[Dict[str, Any]],
+                         results: List[Optional[IntentResult]],
+                         cache_keys: Dict[int, str]):
+        """识别一批输入，结果写入 results"""
+        if len(chunk) == 1:
+            index = chunk[0]
+            # recognize_batch 已经查过缓存，这里不再重复查找
+            results[index] = self._recognize_uncached(inputs[index], available_intents_list[index],
+                                                      context, cache_keys.get(index))
+            return
+        
+        prompt = self._build_batch_prompt([(inputs[i], available_intents_list[i]) for i in chunk], context)
+        try:
+            response = self._make_request(prompt)
+        except (RateLimitExceeded, CircuitOpen) as e:
+            self._record_degraded(e, len(chunk))
+            for index in chunk:
+                if self.fallback_recognizer is not None:
+                    results[index] = self.fallback_recognizer.recognize_intent(
+                        inputs[index], available_intents_list[index], context)
+                else:
+                    results[index] = self._fallback_intent_match(inputs[index], available_intents_list[index])
+            return
+        except LLMError:
+            for index in chunk:
+                results[index] = self._fallback_intent_match(inputs[index], available_intents_list[index])
+            return
+        
+        parsed = self._parse_batch_response(response, [available_intents_list[i] for i in chunk])
+        if parsed is None:
+            # 数组格式不正确：拆成两半分别请求
+            middle = len(chunk) // 2
+            self._recognize_chunk(chunk[:middle], inputs, available_intents_list, context, results, cache_keys)
+            self._recognize_chunk(chunk[middle:], inputs, available_intents_list, context, results, cache_keys)
+            return
+        
+        for index, result in zip(chunk, parsed):
+            results[index] = result
+            if index in cache_keys and response:
+                self.cache.put(cache_keys[index], result)
+    
+    def _build_batch_prompt(self,
+                            items: List[Tuple[str, List[str]]],
+                            context: Optional[Dict[str, Any]] = None) -> str:
+        """构建批量意图识别提示词"""
+        return self.prompt_builder.build_batch(items, context)
+    
+    def _parse_batch_response(self,
+                              response: str,
+                              available_intents_list: List[List[str]]) -> Optional[List[IntentResult]]:
+        """解析批量识别响应，数组格式不正确时返回None"""
+        start, end = response.find('['), response.rfind(']')
+        if start < 0 or end < start:
+            return None
+        try:
+            items = json.loads(response[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(items, list) or len(items) != len(available_intents_list):
+            return None
+        
+        # 按id对齐；没有id时按顺序
+        if all(isinstance(item, dict) and "id" in item for item in items):
+            try:
+                by_id = {item["id"]: item for item in items}
+            except TypeError:
+                return None
+            if set(by_id) != set(range(len(items))):
+                return None
+            items = [by_id[i] for i in range(len(items))]
+        
+        results = []
+        for item, available_intents in zip(items, available_intents_list):
+            if not isinstance(item, dict):
+                return None
+            try:
+                results.append(self._intent_result_from_data(
+                    item, available_intents, json.dumps(item, ensure_ascii=False)))
+            except (ValueError, TypeError, AttributeError):
+                return None
+        return results
+    
     def _build_intent_prompt(self, 
                             user_input: str, 
                             available_intents: List[str],
                             context: Optional[Dict[str, Any]] = None) -> str:
         """构建意图识别提示词"""
-        
-        intent_list = "\n".join([f"- {intent}" for intent in available_intents])
-        
-        context_str = ""
-        if context:
-            context_str = f"\n当前对话上下文:\n{json.dumps(context, ensure_ascii=False, indent=2)}\n"
-        
-        prompt = f"""你是一个智能客服意图识别系统。请分析用户的输入，识别其意图。
-
-可用的意图类别:
-{intent_list}
-{context_str}
-用户输入: "{user_input}"
-
-请以JSON格式返回识别结果，格式如下:
-{{
-    "intent": "识别出的意图（必须是上述意图列表中的一个，如果都不匹配则返回空字符串）",
-    "confidence": 0.0到1.0之间的置信度,
-    "entities": {{提取的相关实体，如数量、名称等}}
-}}
-
-注意：
-1. intent必须完全匹配上述意图列表中的某一项
-2. 如果用户输入与任何意图都不相关，intent返回空字符串
-3. 只返回JSON，不要有其他文字"""
-        
-        return prompt
+        return self.prompt_builder.build(user_input, available_intents, context)
     
     def _parse_intent_response(self, 
                               response: str, 
@@ -158,34 +512,40 @@ class GeminiIntentRecognizer:
             json_match = re.search(r'\{[^{}]*\}', response, re.DOTALL)
             if json_match:
                 result = json.loads(json_match.group())
-                
-                intent = result.get("intent", "")
-                confidence = float(result.get("confidence", 0.0))
-                entities = result.get("entities", {})
-                
-                # 验证意图是否在可用列表中
-                if intent and intent not in available_intents:
-                    # 尝试模糊匹配
-                    for available in available_intents:
-                        if intent.lower() in available.lower() or available.lower() in intent.lower():
-                            intent = available
-                            break
-                    else:
-                        intent = ""
-                        confidence = 0.0
-                
-                return IntentResult(
-                    intent=intent,
-                    confidence=min(max(confidence, 0.0), 1.0),
-                    entities=entities if isinstance(entities, dict) else {},
-                    raw_response=response
-                )
+                return self._intent_result_from_data(result, available_intents, response)
         except (json.JSONDecodeError, ValueError, KeyError):
             pass
         
         # 解析失败，使用回退方法
         return self._fallback_intent_match(response, available_intents)
     
+    def _intent_result_from_data(self,
+                                 result: Dict[str, Any],
+                                 available_intents: List[str],
+                                 response: str) -> IntentResult:
+        """校验模型返回的单条识别结果"""
+        intent = result.get("intent", "")
+        confidence = float(result.get("confidence", 0.0))
+        entities = result.get("entities", {})
+        
+        # 验证意图是否在可用列表中
+        if intent and intent not in available_intents:
+            # 尝试模糊匹配
+            for available in available_intents:
+                if intent.lower() in available.lower() or available.lower() in intent.lower():
+                    intent = available
+                    break
+            else:
+                intent = ""
+                confidence = 0.0
+        
+        return IntentResult(
+            intent=intent,
+            confidence=min(max(confidence, 0.0), 1.0),
+            entities=entities if isinstance(entities, dict) else {},
+            raw_response=response
+        )
+    
     def _fallback_intent_match(self, 
                               text: str, 
                               available_intents: List[str]) -> IntentResult:
@@ -337,20 +697,42 @@ class MockIntentRecognizer:
             entities={},
             raw_response="no_match"
         )
+    
+    def recognize_batch(self,
+                        inputs: List[str],
+                        available_intents_list: List[List[str]],
+                        context: Optional[Dict[str, Any]] = None) -> List[IntentResult]:
+        """模拟批量意图识别"""
+        if len(inputs) != len(available_intents_list):
+            raise ValueError("inputs 与 available_intents_list 长度不一致")
+        return [self.recognize_intent(user_input, available_intents, context)
+                for user_input, available_intents in zip(inputs, available_intents_list)]
 
 
 def create_intent_recognizer(api_key: Optional[str] = None, 
-                            use_mock: bool = False) -> 'GeminiIntentRecognizer | MockIntentRecognizer':
+                            use_mock: bool = False,
+                            cache: Optional['IntentCache'] = None,
+                            async_client: Optional['AsyncGeminiClient'] = None,
+                            rate_limiter: Optional[TokenBucket] = None,
+                            fallback_recognizer: Any = None,
+                            prompt_builder: Optional[IntentPromptBuilder] = None) -> 'GeminiIntentRecognizer | MockIntentRecognizer':
     """
     创建意图识别器
     
     Args:
         api_key: Gemini API密钥
         use_mock: 是否使用模拟识别器
+        cache: Gemini识别结果缓存（可选）
+        async_client: Gemini异步客户端（可选）
+        rate_limiter: 令牌桶（可选）
+        fallback_recognizer: 被限流或熔断时使用的识别器（可选）
+        prompt_builder: 提示词构建器（可选）
     
     Returns:
         意图识别器实例
     """
     if use_mock or not api_key:
         return MockIntentRecognizer()
-    return GeminiIntentRecognizer(api_key)
+    return GeminiIntentRecognizer(api_key, cache=cache, async_client=async_client,
+                                  rate_limiter=rate_limiter, fallback_recognizer=fallback_recognizer,
+                                  prompt_builder=prompt_builder)
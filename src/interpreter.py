@@ -4,7 +4,8 @@ DSL脚本解释器
 """
 
 import time
-from typing import Dict, Any, Optional, List, Callable
+from collections.abc import MutableMapping
+from typing import Dict, Any, Optional, List, Callable, Sequence, Iterator, Tuple
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from .ast_nodes import (
@@ -15,6 +16,10 @@ from .ast_nodes import (
     StringLiteral, NumberLiteral, Variable, BinaryOp, UnaryOp, FunctionCall
 )
 from .intent_recognizer import GeminiIntentRecognizer, IntentResult, create_intent_recognizer
+from .compiler import compile_script, StepJump
+from .vm import compile_bytecode, execute as execute_bytecode
+from .linker import link_script, step_variables, LinkedStep, VariableLayout, EMPTY_LAYOUT, UNSET
+from .session_store import SessionStore, InMemorySessionStore
 
 
 class InterpreterState(Enum):
@@ -26,33 +31,181 @@ class InterpreterState(Enum):
     ERROR = auto()         # 错误
 
 
-@dataclass
+# 每个会话保留的对话历史条数
+DEFAULT_HISTORY_SIZE = 50
+
+
+class VariableMap(MutableMapping):
+    """会话变量的字典视图：槽位中的脚本变量和溢出字典中的动态变量"""
+    
+    __slots__ = ('_context',)
+    
+    def __init__(self, context: 'ExecutionContext'):
+        self._context = context
+    
+    def __getitem__(self, name: str) -> Any:
+        value = self._context.get_variable(name, UNSET)
+        if value is UNSET:
+            raise KeyError(name)
+        return value
+    
+    def __setitem__(self, name: str, value: Any):
+        self._context.set_variable(name, value)
+    
+    def __delitem__(self, name: str):
+        if not self._context.del_variable(name):
+            raise KeyError(name)
+    
+    def __iter__(self) -> Iterator[str]:
+        context = self._context
+        for name, value in zip(context.layout.names, context.values):
+            if value is not UNSET:
+                yield name
+        if context.extra:
+            yield from list(context.extra)
+    
+    def __len__(self) -> int:
+        context = self._context
+        count = sum(1 for value in context.values if value is not UNSET)
+        return count + (len(context.extra) if context.extra else 0)
+    
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
 class ExecutionContext:
-    """执行上下文 - 每个对话会话一个"""
-    variables: Dict[str, Any] = field(default_factory=dict)
-    current_step: Optional[str] = None
-    state: InterpreterState = InterpreterState.IDLE
-    conversation_history: List[Dict[str, str]] = field(default_factory=list)
-    last_speak_output: str = ""
-    available_intents: List[str] = field(default_factory=list)
-    error_message: Optional[str] = None
-    session_id: str = ""
+    """
+    执行上下文 - 每个对话会话一个
+    
+    使用 __slots__ 且不保留实例字典。脚本中出现的变量按编译期分配的槽位存放在
+    values 列表里（layout 由同一脚本的所有会话共享），其余变量放在按需创建的
+    extra 字典中；对话历史是定长环形缓冲区，元素为 (角色, 内容, 时间戳) 元组。
+    variables 属性保留原来的字典形式的读写方式；conversation_history 是只读的元组，
+    追加历史只能通过 add_to_history。
+    """
+    
+    __slots__ = ('layout', 'values', 'extra', 'current_step', 'state',
+                 'history', 'history_head', 'history_size',
+                 'last_speak_output', 'available_intents', 'error_message', 'session_id')
+    
+    def __init__(self,
+                 variables: Optional[Dict[str, Any]] = None,
+                 current_step: Optional[str] = None,
+                 state: InterpreterState = InterpreterState.IDLE,
+                 conversation_history: Optional[List[Dict[str, Any]]] = None,
+                 last_speak_output: str = "",
+                 available_intents: Sequence[str] = (),
+                 error_message: Optional[str] = None,
+                 session_id: str = "",
+                 layout: VariableLayout = EMPTY_LAYOUT,
+                 history_size: int = DEFAULT_HISTORY_SIZE):
+        self.layout = layout
+        self.values: List[Any] = [UNSET] * len(layout)
+        self.extra: Optional[Dict[str, Any]] = None  # 不在槽位表中的变量
+        self.current_step = current_step
+        self.state = state
+        # 环形缓冲区：未满时按顺序追加，写满后从 history_head 处覆盖最早的记录
+        self.history: List[Tuple[str, str, float]] = []
+        self.history_head = 0
+        self.history_size = history_size
+        self.last_speak_output = last_speak_output
+        self.available_intents = available_intents
+        self.error_message = error_message
+        self.session_id = session_id
+        if variables:
+            self.variables.update(variables)
+        for entry in conversation_history or ():
+            self._append_history((entry.get("role", ""), entry.get("content", ""),
+                                  entry.get("timestamp", 0.0)))
+    
+    # ---------- 变量 ----------
     
     def set_variable(self, name: str, value: Any):
         """设置变量"""
-        self.variables[name] = value
+        slot = self.layout.slots.get(name)
+        if slot is not None:
+            self.values[slot] = value
+        elif self.extra is None:
+            self.extra = {name: value}
+        else:
+            self.extra[name] = value
     
     def get_variable(self, name: str, default: Any = None) -> Any:
         """获取变量"""
-        return self.variables.get(name, default)
+        slot = self.layout.slots.get(name)
+        if slot is not None:
+            value = self.values[slot]
+            return default if value is UNSET else value
+        if self.extra:
+            return self.extra.get(name, default)
+        return default
+    
+    def del_variable(self, name: str) -> bool:
+        """删除变量，变量不存在时返回False"""
+        slot = self.layout.slots.get(name)
+        if slot is not None:
+            if self.values[slot] is UNSET:
+                return False
+            self.values[slot] = UNSET
+            return True
+        if self.extra and name in self.extra:
+            del self.extra[name]
+            return True
+        return False
+    
+    @property
+    def variables(self) -> VariableMap:
+        """变量的字典视图（读写都会反映到上下文）"""
+        return VariableMap(self)
+    
+    @variables.setter
+    def variables(self, variables: Dict[str, Any]):
+        self.values = [UNSET] * len(self.layout)
+        self.extra = None
+        for name, value in variables.items():
+            self.set_variable(name, value)
+    
+    def relayout(self, layout: VariableLayout):
+        """换用另一个槽位表（如会话交给其他脚本的解释器处理），变量值保持不变"""
+        if layout is self.layout:
+            return
+        variables = dict(self.variables.items())
+        self.layout = layout
+        self.variables = variables
+    
+    # ---------- 对话历史 ----------
+    
+    def _append_history(self, entry: Tuple[str, str, float]):
+        history = self.history
+        if len(history) < self.history_size:
+            history.append(entry)
+        elif self.history_size > 0:
+            history[self.history_head] = entry
+            self.history_head = (self.history_head + 1) % self.history_size
     
     def add_to_history(self, role: str, content: str):
-        """添加到对话历史"""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": time.time()
-        })
+        """添加到对话历史（超出容量时覆盖最早的记录）"""
+        self._append_history((role, content, time.time()))
+    
+    def history_entries(self) -> List[Tuple[str, str, float]]:
+        """按时间顺序排列的 (角色, 内容, 时间戳) 列表"""
+        head = self.history_head
+        return self.history[head:] + self.history[:head] if head else list(self.history)
+    
+    def recent_history(self, count: int) -> List[Dict[str, Any]]:
+        """最近 count 条对话历史"""
+        entries = self.history_entries()
+        return [{"role": role, "content": content, "timestamp": timestamp}
+                for role, content, timestamp in entries[max(len(entries) - count, 0):]]
+    
+    @property
+    def conversation_history(self) -> Tuple[Dict[str, Any], ...]:
+        """对话历史（只读元组，对它调用append会直接报错而不是静默丢失）"""
+        return tuple(self.recent_history(len(self.history)))
+    
+    def __repr__(self):
+        return (f"ExecutionContext(session_id={self.session_id!r}, current_step={self.current_step!r}, "
+                f"state={self.state}, variables={self.variables!r})")
 
 
 @dataclass
@@ -61,7 +214,7 @@ class InterpreterOutput:
     message: str                          # 输出消息
     state: InterpreterState               # 当前状态
     waiting_for_input: bool = False       # 是否等待输入
-    available_intents: List[str] = field(default_factory=list)  # 可用意图
+    available_intents: Sequence[str] = ()  # 可用意图
     context: Dict[str, Any] = field(default_factory=dict)       # 上下文数据
 
 
@@ -130,37 +283,59 @@ class DefaultServiceHandler(ExternalServiceHandler):
 class Interpreter:
     """DSL解释器"""
     
+    # 执行后端：closure 为预编译闭包，vm 为字节码虚拟机，tree 为逐节点遍历AST（参考实现）
+    BACKENDS = ('closure', 'tree', 'vm')
+    
     def __init__(self, 
                  script: Script, 
                  intent_recognizer = None,
-                 service_handler: Optional[ExternalServiceHandler] = None):
+                 service_handler: Optional[ExternalServiceHandler] = None,
+                 backend: str = 'closure',
+                 session_store: Optional[SessionStore] = None,
+                 max_step_hops: int = 1000):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"未知的执行后端: {backend}")
         self.script = script
         self.intent_recognizer = intent_recognizer
         self.service_handler = service_handler or DefaultServiceHandler()
-        self.contexts: Dict[str, ExecutionContext] = {}
+        self.backend = backend
+        self.max_step_hops = max_step_hops  # 单轮对话内Goto跳转次数上限，防止跳转成环
+        # 会话存储自带锁，解释器可被多个请求线程共享
+        self.contexts: SessionStore = session_store if session_store is not None else InMemorySessionStore()
+        # 链接后的步骤图：运行时沿预先解析的下标跳转，不按名称查找步骤
+        self._linked = link_script(script)
+        self._compiled = compile_script(script) if backend == 'closure' else None
+        self._bytecode = compile_bytecode(script) if backend == 'vm' else None
+        # 按链接下标排列的编译结果（不存在的目标步骤为None）
+        self._compiled_steps = tuple(self._compiled.get(node.name) if self._compiled is not None else None
+                                     for node in self._linked.steps)
+        # 每个步骤引用的变量名：意图识别提示词只携带这些变量
+        self._step_variables = {name: step_variables(step) for name, step in script.steps.items()}
     
     def create_session(self, session_id: str, initial_variables: Optional[Dict[str, Any]] = None) -> ExecutionContext:
         """创建新的执行会话"""
-        context = ExecutionContext(session_id=session_id)
+        context = ExecutionContext(session_id=session_id, layout=self._linked.layout)
         if initial_variables:
             context.variables.update(initial_variables)
         
-        entry_step = self.script.get_entry_step()
-        if entry_step:
-            context.current_step = entry_step.name
+        if self._linked.entry is not None:
+            context.current_step = self._linked.steps[self._linked.entry].name
         context.state = InterpreterState.IDLE
         
-        self.contexts[session_id] = context
+        self.contexts.put(session_id, context)
         return context
     
     def get_session(self, session_id: str) -> Optional[ExecutionContext]:
-        """获取会话上下文"""
+        """获取会话上下文（已过期或被淘汰的会话返回None）"""
         return self.contexts.get(session_id)
     
     def remove_session(self, session_id: str):
         """移除会话"""
-        if session_id in self.contexts:
-            del self.contexts[session_id]
+        self.contexts.remove(session_id)
+    
+    def session_count(self) -> int:
+        """当前会话数"""
+        return len(self.contexts)
     
     def start(self, session_id: str) -> InterpreterOutput:
         """启动解释器"""
@@ -196,25 +371,21 @@ class Interpreter:
         intent_result = self._recognize_intent(user_input, context.available_intents, context)
         
         # 根据意图决定下一步
-        current_step = self.script.get_step(context.current_step)
-        if not current_step:
+        current = self._linked.node(context.current_step)
+        if current is None or current.step is None:
             return InterpreterOutput(
                 message="步骤不存在",
                 state=InterpreterState.ERROR
             )
         
-        next_step_name = self._determine_next_step(intent_result, current_step, context)
+        next_index = self._determine_next_step(intent_result, current, context)
         
-        if next_step_name:
-            context.current_step = next_step_name
-            context.state = InterpreterState.RUNNING
-            return self._execute_current_step(context)
+        if next_index is not None:
+            return self._enter_step(self._linked.steps[next_index], context)
         else:
             # 没有匹配的分支，检查默认处理
-            if current_step.default_handler:
-                context.current_step = current_step.default_handler
-                context.state = InterpreterState.RUNNING
-                return self._execute_current_step(context)
+            if current.default is not None:
+                return self._enter_step(self._linked.steps[current.default], context)
             else:
                 return InterpreterOutput(
                     message="抱歉，我没有理解您的意思。请重新输入。",
@@ -223,30 +394,84 @@ class Interpreter:
                     available_intents=context.available_intents
                 )
     
-    def _execute_current_step(self, context: ExecutionContext) -> InterpreterOutput:
-        """执行当前步骤"""
-        step = self.script.get_step(context.current_step)
-        if not step:
-            context.state = InterpreterState.ERROR
-            context.error_message = f"步骤不存在: {context.current_step}"
-            return InterpreterOutput(
-                message=f"错误: 步骤 '{context.current_step}' 不存在",
-                state=InterpreterState.ERROR
-            )
-        
-        output_messages = []
-        
-        for stmt in step.statements:
-            result = self._execute_statement(stmt, context)
+    def _enter_step(self, node: LinkedStep, context: ExecutionContext) -> InterpreterOutput:
+        """沿已链接的边进入下一个步骤"""
+        context.current_step = node.name
+        context.state = InterpreterState.RUNNING
+        return self._execute_current_step(context, node)
+    
+    def _execute_current_step(self,
+                              context: ExecutionContext,
+                              node: Optional[LinkedStep] = None) -> InterpreterOutput:
+        """执行当前步骤（Goto在此循环中逐个跳转，不递归）"""
+        if context.layout is not self._linked.layout:
+            # 不是由本解释器创建的上下文：按本脚本的槽位表重新存放变量
+            context.relayout(self._linked.layout)
+        if node is None:
+            node = self._linked.node(context.current_step)
+        hops = 0
+        while True:
+            if node is None or node.step is None:
+                context.state = InterpreterState.ERROR
+                context.error_message = f"步骤不存在: {context.current_step}"
+                return InterpreterOutput(
+                    message=f"错误: 步骤 '{context.current_step}' 不存在",
+                    state=InterpreterState.ERROR
+                )
             
-            if isinstance(result, InterpreterOutput):
+            result = self._run_step(node, context)
+            if not isinstance(result, StepJump):
                 return result
             
-            if result:
-                output_messages.append(str(result))
+            hops += 1
+            if hops > self.max_step_hops:
+                context.state = InterpreterState.ERROR
+                context.error_message = f"跳转次数超过上限: {self.max_step_hops}"
+                return InterpreterOutput(
+                    message=f"错误: 步骤跳转次数超过上限 ({self.max_step_hops})，脚本可能存在跳转循环",
+                    state=InterpreterState.ERROR
+                )
+            context.current_step = result.target
+            if result.index is not None:
+                node = self._linked.steps[result.index]
+            else:
+                node = self._linked.node(result.target)
+    
+    def _run_step(self, node: LinkedStep, context: ExecutionContext):
+        """执行单个步骤的语句，返回输出或Goto跳转标记"""
+        step = node.step
+        output_messages = []
         
-        # 收集可用意图
-        context.available_intents = [branch.intent for branch in step.branches]
+        if self._bytecode is not None:
+            code = self._bytecode.steps[node.index]
+            result = execute_bytecode(code, self._bytecode.jumps, self, context, output_messages)
+            if result is not None:
+                return result
+            has_listen = code.has_listen
+        elif self._compiled is not None:
+            compiled = self._compiled_steps[node.index]
+            for run in compiled.body:
+                result = run(self, context)
+                
+                if isinstance(result, StepJump):
+                    return result
+                
+                if result:
+                    output_messages.append(result)
+            has_listen = compiled.has_listen
+        else:
+            for stmt in step.statements:
+                result = self._execute_statement(stmt, context)
+                
+                if isinstance(result, StepJump):
+                    return result
+                
+                if result:
+                    output_messages.append(str(result))
+            has_listen = any(isinstance(s, ListenStatement) for s in step.statements)
+        
+        # 可用意图（链接时已生成）
+        context.available_intents = node.intents
         
         # 检查是否是退出步骤
         if step.is_exit:
@@ -259,7 +484,6 @@ class Interpreter:
             )
         
         # 检查是否需要等待输入
-        has_listen = any(isinstance(s, ListenStatement) for s in step.statements)
         has_branches = bool(step.branches) or step.silence_handler or step.default_handler
         
         if has_listen or has_branches:
@@ -319,10 +543,9 @@ class Interpreter:
         context.set_variable(stmt.variable, value)
         return None
     
-    def _execute_goto(self, stmt: GotoStatement, context: ExecutionContext) -> InterpreterOutput:
-        """执行Goto语句"""
-        context.current_step = stmt.target_step
-        return self._execute_current_step(context)
+    def _execute_goto(self, stmt: GotoStatement, context: ExecutionContext) -> StepJump:
+        """执行Goto语句（返回跳转标记，由步骤循环完成跳转）"""
+        return StepJump(stmt.target_step, self._linked.index.get(stmt.target_step))
     
     def _execute_if(self, stmt: IfStatement, context: ExecutionContext):
         """执行If语句"""
@@ -331,12 +554,12 @@ class Interpreter:
         if condition_result:
             for s in stmt.then_block:
                 result = self._execute_statement(s, context)
-                if isinstance(result, InterpreterOutput):
+                if isinstance(result, StepJump):
                     return result
         elif stmt.else_block:
             for s in stmt.else_block:
                 result = self._execute_statement(s, context)
-                if isinstance(result, InterpreterOutput):
+                if isinstance(result, StepJump):
                     return result
         return None
     
@@ -352,7 +575,7 @@ class Interpreter:
             
             for s in stmt.body:
                 result = self._execute_statement(s, context)
-                if isinstance(result, InterpreterOutput):
+                if isinstance(result, StepJump):
                     return result
         return None
     
@@ -453,7 +676,9 @@ class Interpreter:
             return self.intent_recognizer.recognize_intent(
                 user_input, 
                 available_intents,
-                {"variables": context.variables, "history": context.conversation_history[-5:]}
+                {"variables": dict(context.variables),
+                 "step_variables": self._step_variables.get(context.current_step, ()),
+                 "history": context.recent_history(5)}
             )
         
         # 如果没有意图识别器，使用简单的关键词匹配
@@ -476,22 +701,22 @@ class Interpreter:
     
     def _determine_next_step(self, 
                             intent_result: IntentResult, 
-                            current_step: Step,
-                            context: ExecutionContext) -> Optional[str]:
-        """根据意图确定下一步"""
+                            current: LinkedStep,
+                            context: ExecutionContext) -> Optional[int]:
+        """根据意图确定下一步，返回目标步骤的链接下标"""
         # 检查静默
-        if intent_result.is_silence and current_step.silence_handler:
-            return current_step.silence_handler
+        if intent_result.is_silence and current.silence is not None:
+            return current.silence
         
-        # 检查意图分支
+        # 检查意图分支（查表，重复意图以第一个分支为准）
         if intent_result.intent:
-            for branch in current_step.branches:
-                if branch.intent == intent_result.intent:
-                    # 保存识别的实体
-                    if intent_result.entities:
-                        for key, value in intent_result.entities.items():
-                            context.set_variable(key, value)
-                    return branch.target_step
+            target = current.dispatch.get(intent_result.intent)
+            if target is not None:
+                # 保存识别的实体
+                if intent_result.entities:
+                    for key, value in intent_result.entities.items():
+                        context.set_variable(key, value)
+                return target
         
         # 没有匹配，返回默认处理
-        return current_step.default_handler
+        return current.default
@@ -87,9 +87,31 @@ class LexerError(Exception):
         super().__init__(f"词法错误 (行 {line}, 列 {column}): {message}")
 
 
+# 正则扫描后端使用的主正则：每类Token一个命名分组，按优先级排列
+_MASTER_PATTERN = re.compile(r'''
+    (?P<WS>[ \t\r]+)
+  | (?P<NEWLINE>\n)
+  | (?P<COMMENT>\#[^\n]*)
+  | (?P<STRING>"(?:[^"\\\n]|\\[\s\S])*"|'(?:[^'\\\n]|\\[\s\S])*')
+  | (?P<QUOTE>["'])
+  | (?P<NUMBER>\d+(?:\.\d*)?)
+  | (?P<VARIABLE>\$\w*)
+  | (?P<IDENTIFIER>[^\W\d]\w*)
+  | (?P<OPERATOR>==|!=|>=|<=|[-+*/><=])
+  | (?P<DELIMITER>[,:()\[\]{}])
+''', re.VERBOSE)
+
+# 字符串转义序列
+_ESCAPE_PATTERN = re.compile(r'\\([\s\S])')
+_ESCAPES = {'n': '\n', 't': '\t'}
+
+
 class Lexer:
     """词法分析器"""
     
+    # 可选的扫描后端：char 为逐字符扫描，regex 为基于主正则的单遍扫描
+    BACKENDS = ('char', 'regex')
+    
     # 关键字映射
     KEYWORDS = {
         'Step': TokenType.STEP,
@@ -139,8 +161,11 @@ class Lexer:
         '}': TokenType.RBRACE,
     }
     
-    def __init__(self, source: str):
+    def __init__(self, source: str, backend: str = 'char'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"未知的词法分析后端: {backend}")
         self.source = source
+        self.backend = backend
         self.pos = 0
         self.line = 1
         self.column = 1
@@ -237,6 +262,9 @@ class Lexer:
     
     def tokenize(self) -> List[Token]:
         """执行词法分析"""
+        if self.backend == 'regex':
+            return self._tokenize_regex()
+        
         self.tokens = []
         
         while self.pos < len(self.source):
@@ -312,9 +340,85 @@ class Lexer:
         self.tokens.append(Token(TokenType.EOF, None, self.line, self.column))
         
         return self.tokens
+    
+    def _tokenize_regex(self) -> List[Token]:
+        """
+        基于主正则的单遍扫描
+        
+        每次匹配一个完整Token，行列号只在生成Token时根据偏移量计算，
+        不再逐字符维护。产生的Token序列与逐字符扫描完全一致。
+        """
+        source = self.source
+        length = len(source)
+        match = _MASTER_PATTERN.match
+        keywords = self.KEYWORDS
+        operators = self.OPERATORS
+        delimiters = self.DELIMITERS
+        tokens: List[Token] = []
+        append = tokens.append
+        
+        pos = 0
+        line = 1
+        line_start = 0  # 当前行首的偏移量
+        
+        while pos < length:
+            m = match(source, pos)
+            if m is None:
+                raise LexerError(f"未知字符: {source[pos]}", line, pos - line_start + 1)
+            
+            kind = m.lastgroup
+            end = m.end()
+            column = pos - line_start + 1
+            
+            if kind == 'WS' or kind == 'COMMENT':
+                pass
+            elif kind == 'NEWLINE':
+                append(Token(TokenType.NEWLINE, '\\n', line, column))
+                line += 1
+                line_start = end
+            elif kind == 'IDENTIFIER':
+                value = m.group()
+                if not (value[0].isalpha() or value[0] == '_'):
+                    raise LexerError(f"未知字符: {value[0]}", line, column)
+                append(Token(keywords.get(value, TokenType.IDENTIFIER), value, line, column))
+            elif kind == 'STRING':
+                body = source[pos + 1:end - 1]
+                if '\\' in body:
+                    body = _ESCAPE_PATTERN.sub(
+                        lambda e: _ESCAPES.get(e.group(1), e.group(1)), body)
+                append(Token(TokenType.STRING, body, line, column))
+                # 转义的换行符会推进行号
+                newlines = source.count('\n', pos, end)
+                if newlines:
+                    line += newlines
+                    line_start = source.rfind('\n', pos, end) + 1
+            elif kind == 'VARIABLE':
+                append(Token(TokenType.VARIABLE, m.group()[1:], line, column))
+            elif kind == 'NUMBER':
+                text = m.group()
+                value = float(text) if '.' in text else int(text)
+                append(Token(TokenType.NUMBER, value, line, column))
+            elif kind == 'OPERATOR':
+                text = m.group()
+                append(Token(operators[text], text, line, column))
+            elif kind == 'DELIMITER':
+                text = m.group()
+                append(Token(delimiters[text], text, line, column))
+            else:  # QUOTE: 没有匹配到完整字符串
+                raise LexerError("字符串未闭合", line, column)
+            
+            pos = end
+        
+        tokens.append(Token(TokenType.EOF, None, line, length - line_start + 1))
+        
+        self.pos = length
+        self.line = line
+        self.column = length - line_start + 1
+        self.tokens = tokens
+        return tokens
 
 
-def tokenize(source: str) -> List[Token]:
+def tokenize(source: str, backend: str = 'char') -> List[Token]:
     """便捷函数：对源代码进行词法分析"""
-    lexer = Lexer(source)
+    lexer = Lexer(source, backend)
     return lexer.tokenize()
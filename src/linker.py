@@ -0,0 +1,207 @@
+"""
+步骤图链接
+解析完成后把 Branch / Silence / Default / Goto 的目标步骤名一次性解析为整数下标，
+并校验所有目标都存在；解释器运行时沿预先解析好的边跳转，不再按名称查找步骤。
+同时收集脚本中出现的变量，为每个变量分配固定槽位
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+from .ast_nodes import (
+    Script, Step, Statement, Expression,
+    SpeakStatement, ListenStatement, SetStatement, IfStatement, WhileStatement, CallStatement,
+    GotoStatement, Variable, BinaryOp, UnaryOp, FunctionCall, ParseError
+)
+
+
+# ============ 步骤引用的变量 ============
+
+def _expression_variables(expr: Optional[Expression], names: List[str]):
+    if isinstance(expr, Variable):
+        names.append(expr.name)
+    elif isinstance(expr, BinaryOp):
+        _expression_variables(expr.left, names)
+        _expression_variables(expr.right, names)
+    elif isinstance(expr, UnaryOp):
+        _expression_variables(expr.operand, names)
+    elif isinstance(expr, FunctionCall):
+        for arg in expr.arguments:
+            _expression_variables(arg, names)
+
+
+def _statement_variables(statements: Iterable[Statement], names: List[str]):
+    for stmt in statements:
+        if isinstance(stmt, SpeakStatement):
+            _expression_variables(stmt.expression, names)
+        elif isinstance(stmt, ListenStatement):
+            _expression_variables(stmt.begin_timeout, names)
+            _expression_variables(stmt.end_timeout, names)
+        elif isinstance(stmt, SetStatement):
+            names.append(stmt.variable)
+            _expression_variables(stmt.expression, names)
+        elif isinstance(stmt, IfStatement):
+            _expression_variables(stmt.condition, names)
+            _statement_variables(stmt.then_block, names)
+            _statement_variables(stmt.else_block or [], names)
+        elif isinstance(stmt, WhileStatement):
+            _expression_variables(stmt.condition, names)
+            _statement_variables(stmt.body, names)
+        elif isinstance(stmt, CallStatement):
+            for arg in stmt.arguments:
+                _expression_variables(arg, names)
+            if stmt.result_var:
+                names.append(stmt.result_var)
+
+
+def step_variables(step: Step) -> Tuple[str, ...]:
+    """步骤语句中引用或赋值的变量名（按首次出现顺序，去重）"""
+    names: List[str] = []
+    _statement_variables(step.statements, names)
+    return tuple(dict.fromkeys(names))
+
+
+class _Unset:
+    """未赋值槽位的标记（复制、序列化后仍是同一个对象）"""
+    
+    __slots__ = ()
+    
+    def __repr__(self):
+        return "UNSET"
+    
+    def __reduce__(self):
+        return "UNSET"
+
+
+UNSET = _Unset()
+
+class VariableLayout:
+    """
+    变量槽位表
+    
+    脚本中出现的每个变量在编译期分配一个下标，会话上下文按下标把变量值存在
+    定长列表里；运行时才出现的变量（如意图识别提取的实体）存放在溢出字典中。
+    """
+    
+    __slots__ = ('names', 'slots')
+    
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: Tuple[str, ...] = tuple(dict.fromkeys(names))
+        self.slots: Dict[str, int] = {name: index for index, name in enumerate(self.names)}
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def __repr__(self):
+        return f"VariableLayout({list(self.names)!r})"
+
+
+# 没有脚本变量的布局（直接构造的上下文使用）
+EMPTY_LAYOUT = VariableLayout()
+
+
+class LinkedStep:
+    """
+    链接后的步骤节点
+    
+    step 为None表示脚本中不存在的目标步骤：链接时已报告错误，运行时跳转到这里
+    会得到“步骤不存在”的错误，与按名称查找时的行为一致。
+    """
+    
+    __slots__ = ('name', 'index', 'step', 'branches', 'dispatch', 'intents', 'silence', 'default')
+    
+    def __init__(self, name: str, index: int, step: Optional[Step]):
+        self.name = name
+        self.index = index
+        self.step = step
+        self.branches: Tuple[Tuple[str, int], ...] = ()  # (意图, 目标下标)，按声明顺序
+        self.dispatch: Dict[str, int] = {}               # 意图 -> 目标下标，重复意图以第一个分支为准
+        self.intents: Tuple[str, ...] = ()               # 可用意图（去重，保持声明顺序）
+        self.silence: Optional[int] = None
+        self.default: Optional[int] = None
+    
+    def __repr__(self):
+        return f"LinkedStep({self.name!r}, {self.index})"
+
+
+class LinkedScript:
+    """链接后的步骤图"""
+    
+    __slots__ = ('steps', 'index', 'entry', 'errors', 'layout')
+    
+    def __init__(self):
+        self.steps: List[LinkedStep] = []
+        self.index: Dict[str, int] = {}     # 步骤名 -> 下标（会话恢复时使用）
+        self.entry: Optional[int] = None
+        self.errors: List[ParseError] = []
+        self.layout: VariableLayout = EMPTY_LAYOUT
+    
+    def node(self, name: Optional[str]) -> Optional[LinkedStep]:
+        """按名称取节点（只在每轮对话开始时使用一次）"""
+        index = self.index.get(name)
+        return self.steps[index] if index is not None else None
+
+
+def goto_targets(statements: Iterable[Statement]) -> List[str]:
+    """语句块（含嵌套的If/While）中所有Goto的目标步骤名"""
+    targets = []
+    for stmt in statements:
+        if isinstance(stmt, GotoStatement):
+            targets.append(stmt.target_step)
+        elif isinstance(stmt, IfStatement):
+            targets.extend(goto_targets(stmt.then_block))
+            targets.extend(goto_targets(stmt.else_block or []))
+        elif isinstance(stmt, WhileStatement):
+            targets.extend(goto_targets(stmt.body))
+    return targets
+
+
+def _resolve(linked: LinkedScript, source: Step, kind: str, target: str) -> int:
+    """解析目标步骤名，不存在时记录错误并创建占位节点"""
+    index = linked.index.get(target)
+    if index is None or linked.steps[index].step is None:
+        linked.errors.append(ParseError(
+            f"步骤 '{source.name}' 的 {kind} 目标步骤 '{target}' 不存在", source.line, source.column))
+        if index is None:
+            index = len(linked.steps)
+            linked.index[target] = index
+            linked.steps.append(LinkedStep(target, index, None))
+    return index
+
+
+def link_script(script: Script) -> LinkedScript:
+    """
+    链接整个脚本
+    
+    链接结果缓存在Script对象上，同一个Script只链接一次，可被多个解释器实例共享。
+    """
+    linked = script.__dict__.get('_linked')
+    if linked is not None:
+        return linked
+    
+    linked = LinkedScript()
+    for index, (name, step) in enumerate(script.steps.items()):
+        linked.index[name] = index
+        linked.steps.append(LinkedStep(name, index, step))
+    
+    for node in list(linked.steps):
+        step = node.step
+        node.branches = tuple((branch.intent, _resolve(linked, step, "Branch", branch.target_step))
+                              for branch in step.branches)
+        for intent, target in node.branches:
+            node.dispatch.setdefault(intent, target)
+        node.intents = tuple(node.dispatch)
+        if step.silence_handler:
+            node.silence = _resolve(linked, step, "Silence", step.silence_handler)
+        if step.default_handler:
+            node.default = _resolve(linked, step, "Default", step.default_handler)
+        for target in goto_targets(step.statements):
+            _resolve(linked, step, "Goto", target)
+    
+    linked.layout = VariableLayout(name for step in script.steps.values()
+                                   for name in step_variables(step))
+    
+    entry = script.get_entry_step()
+    if entry is not None:
+        linked.entry = linked.index[entry.name]
+    
+    script.__dict__['_linked'] = linked
+    return linked
@@ -15,11 +15,18 @@
 
 import re
 import math
-from typing import List, Dict, Optional, Tuple, Set
+import threading
+from functools import lru_cache
+from typing import Any, List, Dict, Optional, Tuple, Set
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:  # 未安装NumPy时逐个意图计算余弦相似度
+    np = None
+
 
 class MatchStrategy(Enum):
     """匹配策略"""
@@ -52,6 +59,43 @@ class RecognitionResult:
     details: Dict = field(default_factory=dict)  # 详细信息
 
 
+@dataclass
+class AnalyzedText:
+    """一次识别调用内共享的文本分析结果，由TextPreprocessor.analyze生成"""
+    text: str                             # 预处理后的文本
+    lower: str                            # 小写文本（关键词匹配使用）
+    tokens: List[str]                     # 小写文本的分词结果（模糊匹配使用）
+    keywords: List[str]                   # 去停用词后的关键词（TF-IDF使用）
+    keyword_set: frozenset                # 关键词集合（示例相似度使用）
+    chars: frozenset                      # 分词结果中出现的字符（模糊匹配预筛使用）
+
+
+# 依赖分组编号或分组名的正则（反向引用、条件分组）不能合并进同一个表达式
+_UNMERGEABLE_REGEX = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+
+@dataclass
+class CompiledPatterns:
+    """意图正则表达式的预编译结果"""
+    total: int                                   # 模式总数（含无效模式，计算得分时作为分母）
+    compiled: List[Tuple[str, re.Pattern]]       # 有效模式 (原始模式串, 编译结果)，保持原顺序
+    merged: Optional[re.Pattern] = None          # 有效模式合并成的命名分组交替式
+    
+    def search_all(self, text: str) -> List[str]:
+        """返回在文本中能匹配上的所有模式串（与逐个re.search的结果一致）"""
+        if self.merged is None:
+            return [raw for raw, regex in self.compiled if regex.search(text)]
+        
+        # 一次扫描：没有任何模式匹配时直接返回；否则最左匹配的分组已确认，
+        # 其余模式可能在文本别处匹配，逐个确认
+        match = self.merged.search(text)
+        if match is None:
+            return []
+        first = int(match.lastgroup[1:])
+        return [raw for index, (raw, regex) in enumerate(self.compiled)
+                if index == first or regex.search(text)]
+
+
 class TextPreprocessor:
     """文本预处理器"""
     
@@ -125,6 +169,22 @@ class TextPreprocessor:
         """提取关键词"""
         tokens = cls.tokenize(text)
         return cls.remove_stopwords(tokens)
+    
+    @classmethod
+    def analyze(cls, text: str) -> AnalyzedText:
+        """一次性完成预处理、分词和关键词提取"""
+        text = cls.preprocess(text)
+        lower = text.lower()
+        tokens = cls.tokenize(lower)
+        keywords = cls.remove_stopwords(tokens if lower == text else cls.tokenize(text))
+        return AnalyzedText(
+            text=text,
+            lower=lower,
+            tokens=tokens,
+            keywords=keywords,
+            keyword_set=frozenset(keywords),
+            chars=frozenset(''.join(tokens))
+        )
 
 
 class SimilarityCalculator:
@@ -152,6 +212,62 @@ class SimilarityCalculator:
         
         return previous_row[-1]
     
+    @staticmethod
+    def bounded_levenshtein(s1: str, s2: str, max_distance: int) -> int:
+        """
+        带上限的编辑距离（Myers/Hyyrö位并行算法）
+        
+        s1 的每个字符对应一个比特位，每处理 s2 的一个字符只做常数次整数位运算。
+        距离不超过 max_distance 时返回准确值，否则返回 max_distance + 1。
+        """
+        m, n = len(s1), len(s2)
+        if abs(m - n) > max_distance:
+            return max_distance + 1
+        if m == 0 or n == 0:
+            return max(m, n)
+        
+        peq = _char_masks(s1)
+        full = (1 << m) - 1
+        high = 1 << (m - 1)
+        pv, mv = full, 0
+        score = m
+        
+        for j, char in enumerate(s2):
+            eq = peq.get(char, 0)
+            xv = eq | mv
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | (~(xh | pv) & full)
+            mh = pv & xh
+            if ph & high:
+                score += 1
+            elif mh & high:
+                score -= 1
+            # 剩余的每个字符最多使距离减少1
+            if score - (n - j - 1) > max_distance:
+                return max_distance + 1
+            ph = ((ph << 1) | 1) & full
+            mh = (mh << 1) & full
+            pv = mh | (~(xv | ph) & full)
+            mv = ph & xv
+        
+        return score if score <= max_distance else max_distance + 1
+    
+    @staticmethod
+    def max_distance_for(len1: int, len2: int, threshold: float) -> int:
+        """使 edit_distance_similarity >= threshold 成立的最大编辑距离，不存在时返回-1"""
+        return _max_distance(max(len1, len2), threshold)
+    
+    @staticmethod
+    def is_similar(s1: str, s2: str, threshold: float) -> bool:
+        """等价于 edit_distance_similarity(s1, s2) >= threshold，超出距离上限时提前结束"""
+        if not s1 or not s2:
+            return (1.0 if not s1 and not s2 else 0.0) >= threshold
+        
+        max_distance = _max_distance(max(len(s1), len(s2)), threshold)
+        if max_distance < 0:
+            return False
+        return SimilarityCalculator.bounded_levenshtein(s1, s2, max_distance) <= max_distance
+    
     @staticmethod
     def edit_distance_similarity(s1: str, s2: str) -> float:
         """基于编辑距离的相似度 (0-1)"""
@@ -195,6 +311,106 @@ class SimilarityCalculator:
         return dot_product / (norm1 * norm2)
 
 
+class AhoCorasickAutomaton:
+    """
+    Aho-Corasick多模式匹配自动机
+    一次扫描文本即可找出所有出现过的模式串，耗时与模式数量无关
+    """
+    
+    def __init__(self, patterns: List[str] = None):
+        self._goto: List[Dict[str, int]] = [{}]    # 状态转移
+        self._fail: List[int] = [0]                 # 失配指针
+        self._output: List[Tuple[str, ...]] = [()]  # 到达该状态时匹配到的模式串
+        self._match_empty = False                   # 空串出现在任何文本中
+        
+        for pattern in patterns or []:
+            self.add(pattern)
+        self.build()
+    
+    def add(self, pattern: str):
+        """添加模式串（添加完成后需调用build）"""
+        if not pattern:
+            self._match_empty = True
+            return
+        
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        if pattern not in self._output[state]:
+            self._output[state] += (pattern,)
+    
+    def build(self):
+        """按广度优先顺序计算失配指针，并合并失配链上的输出"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                if self._output[fail]:
+                    self._output[next_state] += self._output[fail]
+    
+    def find_all(self, text: str) -> Set[str]:
+        """返回文本中出现过的所有模式串"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found: Set[str] = {''} if self._match_empty else set()
+        
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        
+        return found
+
+
+@lru_cache(maxsize=4096)
+def _char_masks(pattern: str) -> Dict[str, int]:
+    """位并行编辑距离的字符位掩码：字符 -> 它在模式串中出现位置的比特集合"""
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+@lru_cache(maxsize=4096)
+def _max_distance(max_len: int, threshold: float) -> int:
+    """
+    满足 1 - d / max_len >= threshold 的最大d（-1表示不存在）
+    
+    使用与 edit_distance_similarity 相同的浮点表达式逐个判断边界，
+    保证提前剪枝的结果与完整计算相似度后再比较完全一致。
+    """
+    def passes(d: int) -> bool:
+        return 1 - (d / max_len) >= threshold
+    
+    d = min(max(int((1 - threshold) * max_len), 0), max_len)
+    while d > 0 and not passes(d):
+        d -= 1
+    if not passes(d):
+        return -1
+    while d < max_len and passes(d + 1):
+        d += 1
+    return d
+
+
 class TFIDFVectorizer:
     """TF-IDF向量化器"""
     
@@ -217,7 +433,10 @@ class TFIDFVectorizer:
     
     def transform(self, text: str) -> Dict[str, float]:
         """转换为TF-IDF向量"""
-        tokens = TextPreprocessor.extract_keywords(text)
+        return self.transform_tokens(TextPreprocessor.extract_keywords(text))
+    
+    def transform_tokens(self, tokens: List[str]) -> Dict[str, float]:
+        """将已提取的关键词转换为TF-IDF向量"""
         if not tokens:
             return {}
         
@@ -240,6 +459,63 @@ class TFIDFVectorizer:
         return tfidf
 
 
+@dataclass
+class RecognizerView:
+    """固定候选意图集合下预先整理好的识别数据，同一分支意图集合的步骤共用"""
+    candidates: Dict[str, IntentPattern]  # 候选意图（保持意图库中的顺序）
+    automaton: AhoCorasickAutomaton       # 只含候选意图关键词和同义词的自动机
+    matrix_intents: List[str]             # 在意图矩阵中有对应行的候选意图
+    matrix: Any = None                    # 上述意图对应的矩阵行
+
+
+class ExampleIndex:
+    """
+    示例句子的倒排索引：关键词 -> [(意图, 示例序号)]
+    
+    只有与输入至少共享一个关键词的示例才参与计算，结果与逐个示例计算Jaccard相似度一致。
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self.sizes: Dict[str, List[int]] = {}
+        # 含有无关键词示例的意图（空输入与空示例的Jaccard相似度为1）
+        self.empty_intents: Set[str] = set()
+    
+    def fit(self, example_keywords: Dict[str, List[frozenset]]):
+        """由每个意图的示例关键词集合构建索引"""
+        self.postings.clear()
+        self.sizes.clear()
+        self.empty_intents.clear()
+        
+        for intent, examples in example_keywords.items():
+            self.sizes[intent] = [len(tokens) for tokens in examples]
+            for index, tokens in enumerate(examples):
+                if not tokens:
+                    self.empty_intents.add(intent)
+                for token in tokens:
+                    self.postings[token].append((intent, index))
+    
+    def scores(self, tokens: frozenset) -> Dict[str, float]:
+        """返回每个意图示例相似度的最大值，得分为0的意图不出现在结果中"""
+        if not tokens:
+            return dict.fromkeys(self.empty_intents, 1.0)
+        
+        # 统计每个示例与输入的公共关键词数
+        overlaps: Dict[Tuple[str, int], int] = defaultdict(int)
+        for token in tokens:
+            for posting in self.postings.get(token, ()):
+                overlaps[posting] += 1
+        
+        scores: Dict[str, float] = {}
+        text_size = len(tokens)
+        for (intent, index), intersection in overlaps.items():
+            union = text_size + self.sizes[intent][index] - intersection
+            similarity = intersection / union
+            if similarity > scores.get(intent, 0.0):
+                scores[intent] = similarity
+        return scores
+
+
 class LocalIntentRecognizer:
     """本地意图识别器"""
     
@@ -249,6 +525,25 @@ class LocalIntentRecognizer:
         self.intent_vectors: Dict[str, Dict[str, float]] = {}
         self._trained = False
         
+        # 意图×词项TF-IDF矩阵，每行已按L2范数归一化（train时构建，需要NumPy）
+        self._intent_matrix = None
+        self._intent_rows: Dict[str, int] = {}
+        self._term_index: Dict[str, int] = {}
+        
+        # 所有意图的关键词和同义词构成的自动机（train时构建）
+        self._compiled_patterns: Dict[str, CompiledPatterns] = {}
+        self._keyword_automaton: Optional[AhoCorasickAutomaton] = None
+        # 意图 -> (同义词集合, [(关键词, 小写关键词)])
+        self._keyword_index: Dict[str, Tuple[frozenset, List[Tuple[str, str]]]] = {}
+        # 意图 -> 每个示例句子的关键词集合（train时预先分词）
+        self._example_keywords: Dict[str, List[frozenset]] = {}
+        self._example_index = ExampleIndex()
+        
+        # 可用意图集合 -> 识别器视图（LRU，train时清空）
+        self._views: "OrderedDict[Optional[frozenset], RecognizerView]" = OrderedDict()
+        self._views_lock = threading.Lock()
+        self.max_views = 256
+        
         # 默认配置
         self.config = {
             'keyword_weight': 0.4,        # 关键词匹配权重
@@ -296,9 +591,125 @@ class LocalIntentRecognizer:
         for intent, pattern in self.intent_patterns.items():
             combined_text = ' '.join(pattern.keywords + pattern.examples)
             self.intent_vectors[intent] = self.tfidf.transform(combined_text)
+        self._build_intent_matrix()
+        
+        # 构建关键词自动机：关键词按小写匹配，同义词按原样匹配（与_keyword_match一致）
+        automaton_patterns = []
+        self._keyword_index = {}
+        for intent, pattern in self.intent_patterns.items():
+            keywords = [(keyword, keyword.lower()) for keyword in pattern.keywords]
+            synonyms = frozenset(s for group in pattern.synonyms.values() for s in group)
+            automaton_patterns.extend(keyword_lower for _, keyword_lower in keywords)
+            automaton_patterns.extend(synonyms)
+            self._keyword_index[intent] = (synonyms, keywords)
+        self._keyword_automaton = AhoCorasickAutomaton(automaton_patterns)
+        
+        # 示例句子预先分词
+        self._example_keywords = {
+            intent: [frozenset(TextPreprocessor.extract_keywords(example))
+                     for example in pattern.examples]
+            for intent, pattern in self.intent_patterns.items()
+        }
+        self._example_index.fit(self._example_keywords)
+        
+        with self._views_lock:
+            self._views.clear()
+        
+        # 编译正则表达式
+        self._compiled_patterns = {
+            intent: self._compile_patterns(pattern)
+            for intent, pattern in self.intent_patterns.items()
+        }
         
         self._trained = True
     
+    def _compile_patterns(self, pattern: IntentPattern) -> CompiledPatterns:
+        """编译意图的正则表达式，无效的模式在加载时报告并忽略"""
+        compiled = []
+        mergeable = True
+        for regex_pattern in pattern.patterns:
+            try:
+                regex = re.compile(regex_pattern, re.IGNORECASE)
+            except re.error as e:
+                print(f"警告: 意图 '{pattern.intent}' 的正则表达式无效，已忽略: {regex_pattern!r} ({e})")
+                continue
+            if regex.groupindex or _UNMERGEABLE_REGEX.search(regex_pattern):
+                mergeable = False
+            compiled.append((regex_pattern, regex))
+        
+        merged = None
+        if mergeable and len(compiled) > 1:
+            source = '|'.join(f'(?P<p{index}>{raw})' for index, (raw, _) in enumerate(compiled))
+            try:
+                merged = re.compile(source, re.IGNORECASE)
+            except re.error:
+                # 单独有效但无法合并（如位于中间的全局内联标志），逐个匹配
+                merged = None
+        
+        return CompiledPatterns(total=len(pattern.patterns), compiled=compiled, merged=merged)
+    
+    def _build_intent_matrix(self):
+        """由意图向量构建词项索引和按行归一化的意图×词项矩阵"""
+        self._intent_matrix = None
+        self._intent_rows = {}
+        self._term_index = {}
+        if np is None:
+            return
+        
+        for vector in self.intent_vectors.values():
+            for term in vector:
+                self._term_index.setdefault(term, len(self._term_index))
+        
+        matrix = np.zeros((len(self.intent_vectors), max(len(self._term_index), 1)))
+        for row, (intent, vector) in enumerate(self.intent_vectors.items()):
+            self._intent_rows[intent] = row
+            norm = math.sqrt(sum(v ** 2 for v in vector.values()))
+            if norm == 0:
+                continue
+            for term, value in vector.items():
+                matrix[row, self._term_index[term]] = value / norm
+        self._intent_matrix = matrix
+    
+    def _get_view(self, available_intents: Optional[List[str]]) -> RecognizerView:
+        """获取可用意图集合对应的视图，未缓存时构建"""
+        key = frozenset(available_intents) if available_intents else None
+        with self._views_lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                return view
+        
+        view = self._build_view(key)
+        with self._views_lock:
+            self._views[key] = view
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        return view
+    
+    def _build_view(self, intents: Optional[frozenset]) -> RecognizerView:
+        """按候选意图集合筛选意图模式、关键词自动机和意图矩阵行"""
+        if intents is None:
+            candidates = self.intent_patterns
+            automaton = self._keyword_automaton
+        else:
+            candidates = {k: v for k, v in self.intent_patterns.items() if k in intents}
+            automaton_patterns = []
+            for intent in candidates:
+                synonyms, keywords = self._keyword_index[intent]
+                automaton_patterns.extend(keyword_lower for _, keyword_lower in keywords)
+                automaton_patterns.extend(synonyms)
+            automaton = AhoCorasickAutomaton(automaton_patterns)
+        
+        view = RecognizerView(
+            candidates=candidates,
+            automaton=automaton,
+            matrix_intents=[intent for intent in candidates if intent in self._intent_rows]
+        )
+        if self._intent_matrix is not None:
+            rows = [self._intent_rows[intent] for intent in view.matrix_intents]
+            view.matrix = self._intent_matrix[rows]
+        return view
+    
     def _expand_synonyms(self, text: str, pattern: IntentPattern) -> str:
         """扩展同义词"""
         expanded = text
@@ -308,22 +719,47 @@ class LocalIntentRecognizer:
                     expanded = expanded.replace(synonym, word)
         return expanded
     
-    def _keyword_match(self, text: str, pattern: IntentPattern) -> Tuple[float, List[str]]:
-        """关键词匹配"""
-        text_lower = text.lower()
+    def _keyword_match(self,
+                       text: str,
+                       pattern: IntentPattern,
+                       hits: Optional[Set[str]] = None,
+                       analyzed: Optional[AnalyzedText] = None) -> Tuple[float, List[str]]:
+        """
+        关键词匹配
+        
+        hits 为自动机在 text.lower() 中找到的模式串集合。若文本中没有出现该意图的任何
+        同义词，同义词扩展不会改变文本，包含判断直接查 hits；否则按原方式扩展后逐个判断。
+        analyzed 为 text 的分析结果，扩展后文本不变时模糊匹配直接复用其分词。
+        """
+        text_lower = analyzed.lower if analyzed is not None else text.lower()
         matched = []
+        tokens, chars = None, None
         
-        # 扩展同义词
-        expanded_text = self._expand_synonyms(text_lower, pattern)
+        index = self._keyword_index.get(pattern.intent) if hits is not None else None
+        if index is not None and index[0].isdisjoint(hits):
+            expanded_text = text_lower
+            contained = hits            # 集合成员判断
+            keywords = index[1]
+        else:
+            # 扩展同义词
+            expanded_text = self._expand_synonyms(text_lower, pattern)
+            contained = expanded_text   # 子串判断
+            keywords = [(keyword, keyword.lower()) for keyword in pattern.keywords]
         
-        for keyword in pattern.keywords:
-            keyword_lower = keyword.lower()
+        for keyword, keyword_lower in keywords:
             # 精确包含匹配
-            if keyword_lower in expanded_text:
-                matched.append(keyword)
-            # 模糊匹配
-            elif self._fuzzy_match(keyword_lower, expanded_text):
+            if keyword_lower in contained:
                 matched.append(keyword)
+            else:
+                # 模糊匹配：同一意图的所有关键词共用一次分词
+                if tokens is None:
+                    if analyzed is not None and expanded_text == analyzed.lower:
+                        tokens, chars = analyzed.tokens, analyzed.chars
+                    else:
+                        tokens = TextPreprocessor.tokenize(expanded_text)
+                        chars = frozenset(''.join(tokens))
+                if self._fuzzy_match(keyword_lower, expanded_text, tokens, chars):
+                    matched.append(keyword)
         
         if not pattern.keywords:
             return 0.0, []
@@ -331,17 +767,43 @@ class LocalIntentRecognizer:
         score = len(matched) / len(pattern.keywords)
         return score, matched
     
-    def _fuzzy_match(self, keyword: str, text: str) -> bool:
-        """模糊匹配"""
+    def _fuzzy_match(self,
+                     keyword: str,
+                     text: str,
+                     tokens: Optional[List[str]] = None,
+                     chars: Optional[frozenset] = None) -> bool:
+        """
+        模糊匹配
+        
+        tokens、chars 为 text 的分词结果及其字符集合，未提供时现场计算。
+        """
         # 检查文本中是否有与关键词相似的部分
-        tokens = TextPreprocessor.tokenize(text)
+        if tokens is None:
+            tokens = TextPreprocessor.tokenize(text)
+        if chars is None:
+            chars = frozenset(''.join(tokens))
+        threshold = self.config['fuzzy_threshold']
+        keyword_len = len(keyword)
+        
+        # 字符预筛：关键词中能在文本里找到的字符数是任一片段与关键词公共子序列长度的上界，
+        # 编辑距离至少为 max(关键词长, 片段长) 减去该数；L - _max_distance(L) 随 L 不减，
+        # 因此在 L = 关键词长 时仍超出允许距离就不可能有片段满足阈值
+        if keyword_len:
+            common = sum(1 for char in keyword if char in chars)
+            if keyword_len - common > _max_distance(keyword_len, threshold):
+                return False
         
         for i in range(len(tokens)):
             # 尝试不同长度的组合
+            segment_len = 0
             for j in range(i + 1, min(i + len(keyword) + 2, len(tokens) + 1)):
+                segment_len += len(tokens[j - 1])
+                # 由阈值换算出允许的最大编辑距离，长度差超过它的片段无需计算
+                max_distance = _max_distance(max(keyword_len, segment_len), threshold)
+                if abs(segment_len - keyword_len) > max_distance:
+                    continue
                 segment = ''.join(tokens[i:j])
-                similarity = SimilarityCalculator.edit_distance_similarity(keyword, segment)
-                if similarity >= self.config['fuzzy_threshold']:
+                if SimilarityCalculator.bounded_levenshtein(keyword, segment, max_distance) <= max_distance:
                     return True
         
         return False
@@ -351,6 +813,11 @@ class LocalIntentRecognizer:
         if not pattern.patterns:
             return 0.0, []
         
+        compiled = self._compiled_patterns.get(pattern.intent)
+        if compiled is not None and compiled.total == len(pattern.patterns):
+            matched = compiled.search_all(text)
+            return len(matched) / compiled.total, matched
+        
         matched = []
         for regex_pattern in pattern.patterns:
             try:
@@ -372,16 +839,72 @@ class LocalIntentRecognizer:
         
         return SimilarityCalculator.cosine_similarity(text_vector, intent_vector)
     
-    def _example_similarity(self, text: str, pattern: IntentPattern) -> float:
+    def _similarity_scores(self,
+                           text: str,
+                           intents: List[str],
+                           analyzed: Optional[AnalyzedText] = None,
+                           view: Optional[RecognizerView] = None) -> Dict[str, float]:
+        """
+        批量计算文本与多个意图的余弦相似度（结果与逐个调用_similarity_match一致）
+        
+        文本只向量化一次；意图向量的范数已在训练时除掉，候选意图对应的行与
+        文本中出现的词项列组成子矩阵，一次矩阵向量乘得到全部得分。
+        提供 view 时直接使用其预先取出的矩阵行（intents 应为 view 的候选意图）。
+        """
+        if self._intent_matrix is None or not self._trained:
+            return {intent: self._similarity_match(text, intent) for intent in intents}
+        
+        scores = dict.fromkeys(intents, 0.0)
+        if analyzed is not None:
+            text_vector = self.tfidf.transform_tokens(analyzed.keywords)
+        else:
+            text_vector = self.tfidf.transform(text)
+        if not text_vector:
+            return scores
+        
+        # 文本向量的范数包含词表外的词项
+        text_norm = math.sqrt(sum(v ** 2 for v in text_vector.values()))
+        columns, values = [], []
+        for term, value in text_vector.items():
+            column = self._term_index.get(term)
+            if column is not None:
+                columns.append(column)
+                values.append(value)
+        
+        if view is not None and view.matrix is not None:
+            known = view.matrix_intents
+            if not columns or not known:
+                return scores
+            products = view.matrix[:, columns] @ np.array(values)
+        else:
+            known = [intent for intent in intents if intent in self._intent_rows]
+            if not columns or not known:
+                return scores
+            rows = [self._intent_rows[intent] for intent in known]
+            products = self._intent_matrix[np.ix_(rows, columns)] @ np.array(values)
+        scores.update(zip(known, (product / text_norm for product in products.tolist())))
+        return scores
+    
+    def _example_similarity(self,
+                            text: str,
+                            pattern: IntentPattern,
+                            analyzed: Optional[AnalyzedText] = None) -> float:
         """与示例句子的相似度"""
         if not pattern.examples:
             return 0.0
         
         max_similarity = 0.0
-        text_tokens = set(TextPreprocessor.extract_keywords(text))
+        if analyzed is not None:
+            text_tokens = analyzed.keyword_set
+        else:
+            text_tokens = set(TextPreprocessor.extract_keywords(text))
+        
+        example_keywords = self._example_keywords.get(pattern.intent)
+        if example_keywords is None or len(example_keywords) != len(pattern.examples):
+            example_keywords = [set(TextPreprocessor.extract_keywords(example))
+                                for example in pattern.examples]
         
-        for example in pattern.examples:
-            example_tokens = set(TextPreprocessor.extract_keywords(example))
+        for example_tokens in example_keywords:
             similarity = SimilarityCalculator.jaccard_similarity(text_tokens, example_tokens)
             max_similarity = max(max_similarity, similarity)
         
@@ -399,51 +922,156 @@ class LocalIntentRecognizer:
             RecognitionResult: 识别结果
         """
         if not text or not text.strip():
-            return RecognitionResult(
-                intent="silence",
-                confidence=1.0,
-                matched_keywords=[],
-                match_strategy="empty_input",
-                details={"reason": "用户输入为空"}
-            )
+            return self._empty_input_result()
         
         # 确保已训练
         if not self._trained:
             self.train()
         
-        # 预处理文本
-        processed_text = TextPreprocessor.preprocess(text)
+        # 预处理文本（分词和关键词提取结果在各评分方法间共享）
+        analyzed = TextPreprocessor.analyze(text)
         
-        # 确定候选意图
-        if available_intents:
-            candidates = {k: v for k, v in self.intent_patterns.items() if k in available_intents}
-        else:
-            candidates = self.intent_patterns
+        # 确定候选意图（相同可用意图集合的视图已缓存）
+        view = self._get_view(available_intents)
+        if not view.candidates:
+            return self._no_candidates_result()
         
-        if not candidates:
-            return RecognitionResult(
-                intent="default",
-                confidence=0.0,
-                matched_keywords=[],
-                match_strategy="no_candidates",
-                details={"reason": "没有可用的意图候选"}
-            )
+        # 一次矩阵运算得到所有候选意图的TF-IDF相似度
+        similarity_scores = self._similarity_scores(analyzed.text, list(view.candidates), analyzed, view)
+        return self._score_candidates(text, analyzed, view, similarity_scores)
+    
+    def recognize_batch(self,
+                        texts: List[str],
+                        available_intents_list: Optional[List[Optional[List[str]]]] = None) -> List[RecognitionResult]:
+        """
+        批量识别多条输入
+        
+        可用意图集合相同的输入归为一组，组内所有输入的TF-IDF相似度由一次
+        矩阵乘法得到；结果与逐条调用recognize一致（相似度只有浮点舍入差异）。
+        
+        Args:
+            texts: 用户输入文本列表
+            available_intents_list: 每条输入的可用意图列表（为空时所有输入都在全部意图中识别）
+        
+        Returns:
+            List[RecognitionResult]: 与输入一一对应的识别结果
+        """
+        if available_intents_list is None:
+            available_intents_list = [None] * len(texts)
+        if len(texts) != len(available_intents_list):
+            raise ValueError("texts 与 available_intents_list 长度不一致")
+        
+        if not self._trained:
+            self.train()
+        
+        results: List[Optional[RecognitionResult]] = [None] * len(texts)
+        groups: Dict[Optional[frozenset], List[int]] = defaultdict(list)
+        for index, (text, available_intents) in enumerate(zip(texts, available_intents_list)):
+            if not text or not text.strip():
+                results[index] = self._empty_input_result()
+            else:
+                groups[frozenset(available_intents) if available_intents else None].append(index)
+        
+        for indices in groups.values():
+            view = self._get_view(available_intents_list[indices[0]])
+            if not view.candidates:
+                for index in indices:
+                    results[index] = self._no_candidates_result()
+                continue
+            
+            analyzed_list = [TextPreprocessor.analyze(texts[index]) for index in indices]
+            similarity_list = self._similarity_scores_batch(analyzed_list, view)
+            for index, analyzed, similarity_scores in zip(indices, analyzed_list, similarity_list):
+                results[index] = self._score_candidates(texts[index], analyzed, view, similarity_scores)
+        
+        return results
+    
+    def _similarity_scores_batch(self,
+                                 analyzed_list: List[AnalyzedText],
+                                 view: RecognizerView) -> List[Dict[str, float]]:
+        """一次矩阵乘法计算多条文本与视图中候选意图的余弦相似度"""
+        intents = list(view.candidates)
+        if view.matrix is None or not self._trained:
+            return [self._similarity_scores(analyzed.text, intents, analyzed, view)
+                    for analyzed in analyzed_list]
+        
+        # 每条文本的 (列, 值) 与范数（范数包含词表外的词项）
+        entries, norms, columns = [], [], {}
+        for analyzed in analyzed_list:
+            text_vector = self.tfidf.transform_tokens(analyzed.keywords)
+            norms.append(math.sqrt(sum(v ** 2 for v in text_vector.values())))
+            row = []
+            for term, value in text_vector.items():
+                column = self._term_index.get(term)
+                if column is not None:
+                    row.append((columns.setdefault(column, len(columns)), value))
+            entries.append(row)
+        
+        scores_list = [dict.fromkeys(intents, 0.0) for _ in analyzed_list]
+        if not columns or not view.matrix_intents:
+            return scores_list
+        
+        text_matrix = np.zeros((len(analyzed_list), len(columns)))
+        for row, row_entries in enumerate(entries):
+            for column, value in row_entries:
+                text_matrix[row, column] = value
+        products = text_matrix @ view.matrix[:, list(columns)].T
+        
+        for scores, row_products, norm, row_entries in zip(scores_list, products.tolist(), norms, entries):
+            if row_entries:
+                scores.update(zip(view.matrix_intents, (product / norm for product in row_products)))
+        return scores_list
+    
+    @staticmethod
+    def _empty_input_result() -> RecognitionResult:
+        return RecognitionResult(
+            intent="silence",
+            confidence=1.0,
+            matched_keywords=[],
+            match_strategy="empty_input",
+            details={"reason": "用户输入为空"}
+        )
+    
+    @staticmethod
+    def _no_candidates_result() -> RecognitionResult:
+        return RecognitionResult(
+            intent="default",
+            confidence=0.0,
+            matched_keywords=[],
+            match_strategy="no_candidates",
+            details={"reason": "没有可用的意图候选"}
+        )
+    
+    def _score_candidates(self,
+                          text: str,
+                          analyzed: AnalyzedText,
+                          view: RecognizerView,
+                          similarity_scores: Dict[str, float]) -> RecognitionResult:
+        """对视图中的候选意图综合评分并选出最佳意图"""
+        processed_text = analyzed.text
+        candidates = view.candidates
+        
+        # 一次扫描找出所有关键词和同义词
+        keyword_hits = view.automaton.find_all(analyzed.lower)
+        
+        # 通过倒排索引只计算与输入有公共关键词的示例
+        example_scores = self._example_index.scores(analyzed.keyword_set)
         
         # 计算每个意图的得分
         scores: List[Tuple[str, float, Dict]] = []
         
         for intent, pattern in candidates.items():
             # 关键词匹配
-            keyword_score, matched_keywords = self._keyword_match(processed_text, pattern)
+            keyword_score, matched_keywords = self._keyword_match(processed_text, pattern, keyword_hits, analyzed)
             
             # 正则匹配
             pattern_score, matched_patterns = self._pattern_match(text, pattern)
             
             # 相似度匹配
-            similarity_score = self._similarity_match(processed_text, intent)
+            similarity_score = similarity_scores[intent]
             
             # 示例相似度
-            example_score = self._example_similarity(processed_text, pattern)
+            example_score = example_scores.get(intent, 0.0)
             
             # 综合得分
             combined_score = (
@@ -0,0 +1,49 @@
+"""
+DSL操作符语义
+二元和一元操作符到Python函数的映射，供闭包编译器和常量折叠共用
+"""
+
+import operator
+from typing import Any, Callable, Dict
+
+
+def _add(left, right):
+    """加法：任一侧为字符串时做字符串拼接"""
+    if isinstance(left, str) or isinstance(right, str):
+        return str(left) + str(right)
+    return left + right
+
+
+def _divide(left, right):
+    """除法：除数为0时返回0"""
+    return left / right if right != 0 else 0
+
+
+def _logical_and(left, right):
+    return bool(left) and bool(right)
+
+
+def _logical_or(left, right):
+    return bool(left) or bool(right)
+
+
+# 操作符 -> 函数，编译期一次解析
+BINARY_OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    '+': _add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': _divide,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    'and': _logical_and,
+    'or': _logical_or,
+}
+
+UNARY_OPERATORS: Dict[str, Callable[[Any], Any]] = {
+    '-': operator.neg,
+    'not': operator.not_,
+}
@@ -0,0 +1,130 @@
+"""
+表达式优化
+编译前对表达式做常量折叠，并把字符串拼接链展开为一个模板，
+运行时纯字面量不再求值，拼接只做一次 ''.join。优化生成新的节点，不修改原AST
+"""
+
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+from .ast_nodes import Expression, StringLiteral, NumberLiteral, BinaryOp, UnaryOp, FunctionCall
+from .operators import BINARY_OPERATORS, UNARY_OPERATORS
+
+
+@dataclass
+class Constant(Expression):
+    """折叠后的常量（可能是字符串、数字或布尔值）"""
+    value: Any
+
+
+@dataclass
+class Template(Expression):
+    """字符串模板：各部分转为字符串后依次拼接，常量部分已预先合并"""
+    parts: Tuple[Expression, ...]
+
+
+def _is_constant(expr: Expression) -> bool:
+    return isinstance(expr, (Constant, StringLiteral, NumberLiteral))
+
+
+def _is_string(expr: Expression) -> bool:
+    if isinstance(expr, Template):
+        return True
+    return _is_constant(expr) and isinstance(expr.value, str)
+
+
+def _concat_operands(expr: Expression) -> List[Expression]:
+    """沿左侧展开 + 链：((a + b) + c) -> [a, b, c]"""
+    operands = []
+    while isinstance(expr, BinaryOp) and expr.operator == '+':
+        operands.append(expr.right)
+        expr = expr.left
+    operands.append(expr)
+    operands.reverse()
+    return operands
+
+
+def _fold_binary(operator: str, left: Expression, right: Expression) -> Expression:
+    """两侧都是常量时在编译期求值；求值出错时保留到运行时再报错"""
+    if _is_constant(left) and _is_constant(right):
+        try:
+            return Constant(BINARY_OPERATORS[operator](left.value, right.value))
+        except Exception:
+            pass
+    return BinaryOp(left, operator, right)
+
+
+def _optimize_concat(expr: BinaryOp) -> Expression:
+    """
+    优化 + 链
+    
+    + 链从左到右求值，一旦累积结果是字符串，后面每一步都是 str() 后拼接。
+    第一个字符串操作数之前的部分保持原来的加法（可能是数值相加），之后的部分
+    展开为模板；相邻常量在编译期合并。
+    """
+    operands = [optimize_expression(operand) for operand in _concat_operands(expr)]
+    
+    # 第一个必为字符串的操作数（字符串常量或模板）：从它参与的那一步加法开始结果必为字符串
+    first = next((i for i, operand in enumerate(operands) if _is_string(operand)), None)
+    if first is None:
+        head = operands[0]
+        for operand in operands[1:]:
+            head = _fold_binary('+', head, operand)
+        return head
+    
+    split = max(first, 1)
+    head = operands[0]
+    for operand in operands[1:split]:
+        head = _fold_binary('+', head, operand)
+    
+    parts: List[Expression] = []
+    for part in [head] + operands[split:]:
+        if isinstance(part, Template):
+            # 括号内的拼接同样展开
+            for inner in part.parts:
+                if isinstance(inner, Constant) and parts and isinstance(parts[-1], Constant):
+                    parts[-1] = Constant(parts[-1].value + inner.value)
+                else:
+                    parts.append(inner)
+        elif _is_constant(part):
+            text = str(part.value)
+            if parts and isinstance(parts[-1], Constant):
+                parts[-1] = Constant(parts[-1].value + text)
+            else:
+                parts.append(Constant(text))
+        else:
+            parts.append(part)
+    
+    if len(parts) == 1 and isinstance(parts[0], Constant):
+        return parts[0]
+    return Template(tuple(parts))
+
+
+def optimize_expression(expr: Expression) -> Expression:
+    """返回优化后的表达式（新节点，原表达式不变）"""
+    if isinstance(expr, (StringLiteral, NumberLiteral)):
+        return Constant(expr.value)
+    
+    if isinstance(expr, BinaryOp):
+        if expr.operator == '+':
+            return _optimize_concat(expr)
+        left = optimize_expression(expr.left)
+        right = optimize_expression(expr.right)
+        if expr.operator not in BINARY_OPERATORS:
+            return BinaryOp(left, expr.operator, right)
+        return _fold_binary(expr.operator, left, right)
+    
+    if isinstance(expr, UnaryOp):
+        operand = optimize_expression(expr.operand)
+        op = UNARY_OPERATORS.get(expr.operator)
+        if op is not None and _is_constant(operand):
+            try:
+                return Constant(op(operand.value))
+            except Exception:
+                pass
+        return UnaryOp(expr.operator, operand)
+    
+    if isinstance(expr, FunctionCall):
+        # 内置函数由解释器在运行时分派，不做折叠
+        return FunctionCall(expr.name, [optimize_expression(arg) for arg in expr.arguments])
+    
+    return expr
@@ -13,6 +13,7 @@ from .ast_nodes import (
     StringLiteral, NumberLiteral, Variable, BinaryOp, UnaryOp, FunctionCall,
     ParseError
 )
+from .linker import link_script
 
 
 class ParserError(Exception):
@@ -90,13 +91,15 @@ class Parser:
             
             self.skip_newlines()
         
+        # 链接步骤图：解析跳转目标并校验目标步骤存在
+        self.errors.extend(link_script(script).errors)
         return script
     
     def parse_step(self) -> Step:
         """解析Step"""
-        self.expect(TokenType.STEP)
+        step_token = self.expect(TokenType.STEP)
         name_token = self.expect(TokenType.IDENTIFIER, "期望步骤名称")
-        step = Step(name=name_token.value)
+        step = Step(name=name_token.value, line=step_token.line, column=step_token.column)
         
         self.skip_newlines()
         
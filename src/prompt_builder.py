@@ -0,0 +1,186 @@
+"""
+意图识别提示词构建
+静态指令前导只生成一次；上下文只保留当前步骤引用的变量和去掉时间戳的
+最近对话，按紧凑JSON输出并受token预算约束，每次构建记录提示词大小
+"""
+
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 静态指令前导：放在提示词开头，所有请求共用同一前缀
+INTENT_PREAMBLE = """你是一个智能客服意图识别系统。请分析用户的输入，识别其意图。
+
+请以JSON格式返回识别结果，格式如下:
+{"intent": "识别出的意图（必须是可用意图列表中的一个，如果都不匹配则返回空字符串）", "confidence": 0.0到1.0之间的置信度, "entities": {提取的相关实体，如数量、名称等}}
+
+注意：
+1. intent必须完全匹配可用意图列表中的某一项
+2. 如果用户输入与任何意图都不相关，intent返回空字符串
+3. 只返回JSON，不要有其他文字
+"""
+
+BATCH_PREAMBLE = """你是一个智能客服意图识别系统。下面是多条待识别的用户输入，每条给出了可用的意图类别。
+
+请按相同顺序返回JSON数组，每条输入对应一个元素，格式如下:
+[{"id": 输入的id, "intent": "识别出的意图（必须是该条可用意图中的一个，都不匹配则返回空字符串）", "confidence": 0.0到1.0之间的置信度, "entities": {提取的相关实体}}]
+
+注意：
+1. 数组长度必须与输入条数相同
+2. intent必须完全匹配该条输入的可用意图之一
+3. 只返回JSON数组，不要有其他文字
+"""
+
+COMPACT_SEPARATORS = (',', ':')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中日韩字符按每字1个，其余字符按每4个1个"""
+    wide = sum(1 for ch in text if ord(ch) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=COMPACT_SEPARATORS, default=str)
+
+
+# ============ 提示词构建 ============
+
+class IntentPromptBuilder:
+    """
+    带token预算的意图识别提示词构建器
+    
+    context 中的 step_variables 给出当前步骤引用的变量名，只有这些变量进入提示词
+    （没有给出时保留全部变量）；history 只保留最近 history_turns 条的角色和内容。
+    超出 max_tokens 时先丢弃最早的历史，再从后往前丢弃变量；用户输入和可用意图
+    始终保留。
+    """
+    
+    def __init__(self, max_tokens: int = 600, history_turns: int = 5, max_value_chars: int = 200):
+        self.max_tokens = max_tokens
+        self.history_turns = history_turns
+        self.max_value_chars = max_value_chars  # 单个变量值序列化后的最大长度
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.calls = 0
+        self.total_chars = 0
+        self.total_tokens = 0
+        self.over_budget = 0      # 裁剪后仍超出预算的次数
+        self.last: Dict[str, Any] = {}
+    
+    # ---------- 上下文压缩 ----------
+    
+    def _compact_variables(self, context: Dict[str, Any]) -> List[Tuple[str, Any]]:
+        variables = context.get('variables') or {}
+        names = context.get('step_variables')
+        if names is None:
+            names = variables.keys()
+        items = []
+        for name in names:
+            if name not in variables:
+                continue
+            value = variables[name]
+            if not isinstance(value, (int, float, bool)) and value is not None:
+                text = value if isinstance(value, str) else _dumps(value)
+                if len(text) > self.max_value_chars:
+                    value = text[:self.max_value_chars] + "…"
+            items.append((name, value))
+        return items
+    
+    def _compact_history(self, context: Dict[str, Any]) -> List[List[str]]:
+        history = context.get('history') or []
+        if self.history_turns <= 0:
+            return []
+        return [[entry.get('role', ''), entry.get('content', '')]
+                for entry in history[-self.history_turns:] if isinstance(entry, dict)]
+    
+    @staticmethod
+    def _context_block(variables: List[Tuple[str, Any]], history: List[List[str]]) -> str:
+        compact = {}
+        if variables:
+            compact['variables'] = dict(variables)
+        if history:
+            compact['history'] = history
+        if not compact:
+            return ""
+        return f"当前对话上下文:\n{_dumps(compact)}\n"
+    
+    def _fit(self, fixed_tokens: int, context: Optional[Dict[str, Any]]) -> Tuple[str, int, int]:
+        """在预算内生成上下文块，返回 (上下文块, 丢弃的历史条数, 丢弃的变量数)"""
+        if not context:
+            return "", 0, 0
+        variables = self._compact_variables(context)
+        history = self._compact_history(context)
+        dropped_history = dropped_variables = 0
+        
+        block = self._context_block(variables, history)
+        while block and fixed_tokens + estimate_tokens(block) > self.max_tokens:
+            if history:
+                history.pop(0)
+                dropped_history += 1
+            elif variables:
+                variables.pop()
+                dropped_variables += 1
+            block = self._context_block(variables, history)
+        return block, dropped_history, dropped_variables
+    
+    def _finish(self, prompt: str, dropped_history: int, dropped_variables: int) -> str:
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls += 1
+            self.total_chars += len(prompt)
+            self.total_tokens += tokens
+            if tokens > self.max_tokens:
+                self.over_budget += 1
+            self.last = {
+                'chars': len(prompt),
+                'tokens': tokens,
+                'dropped_history': dropped_history,
+                'dropped_variables': dropped_variables,
+            }
+        return prompt
+    
+    # ---------- 构建 ----------
+    
+    def build(self,
+              user_input: str,
+              available_intents: List[str],
+              context: Optional[Dict[str, Any]] = None) -> str:
+        """构建单条意图识别提示词"""
+        intent_list = "\n".join(f"- {intent}" for intent in available_intents)
+        body = f"\n可用的意图类别:\n{intent_list}\n"
+        tail = f"\n用户输入: \"{user_input}\""
+        fixed = estimate_tokens(INTENT_PREAMBLE) + estimate_tokens(body) + estimate_tokens(tail)
+        
+        block, dropped_history, dropped_variables = self._fit(fixed, context)
+        if block:
+            body += "\n" + block
+        return self._finish(INTENT_PREAMBLE + body + tail, dropped_history, dropped_variables)
+    
+    def build_batch(self,
+                    items: List[Tuple[str, List[str]]],
+                    context: Optional[Dict[str, Any]] = None) -> str:
+        """构建批量意图识别提示词"""
+        requests_json = _dumps([{"id": i, "input": user_input, "intents": list(intents)}
+                                for i, (user_input, intents) in enumerate(items)])
+        tail = f"\n待识别输入(JSON数组):\n{requests_json}\n"
+        fixed = estimate_tokens(BATCH_PREAMBLE) + estimate_tokens(tail)
+        
+        block, dropped_history, dropped_variables = self._fit(fixed, context)
+        prefix = BATCH_PREAMBLE + ("\n" + block if block else "")
+        return self._finish(prefix + tail, dropped_history, dropped_variables)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取提示词大小统计"""
+        with self._lock:
+            return {
+                'max_tokens': self.max_tokens,
+                'calls': self.calls,
+                'total_chars': self.total_chars,
+                'total_tokens': self.total_tokens,
+                'avg_tokens': self.total_tokens / self.calls if self.calls else 0.0,
+                'over_budget': self.over_budget,
+                'last': dict(self.last),
+            }
@@ -0,0 +1,145 @@
+"""
+LLM请求限流
+进程内共享的令牌桶，以及带抖动、遵循Retry-After的指数退避
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+
+# 默认配额：每分钟请求数和突发容量
+DEFAULT_RPM = 60
+DEFAULT_BURST = 10
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+    
+    每秒补充 rate 个令牌，最多积累 capacity 个。acquire 在令牌不足时最多等待
+    timeout 秒，timeout 为0时立即返回，调用方据此降级而不是排队。
+    """
+    
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate 和 capacity 必须为正数")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._cond = threading.Condition()
+        
+        # 统计信息
+        self.granted = 0
+        self.rejected = 0         # 没有取到令牌的次数（不排队时即被降级的请求数）
+    
+    @classmethod
+    def per_minute(cls, rpm: float, burst: float = DEFAULT_BURST, **kwargs) -> 'TokenBucket':
+        """按每分钟请求数创建"""
+        return cls(rpm / 60.0, burst, **kwargs)
+    
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+    
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """立即尝试取令牌"""
+        return self.acquire(tokens, timeout=0)
+    
+    def acquire(self, tokens: float = 1.0, timeout: float = 0) -> bool:
+        """取令牌，最多等待 timeout 秒；超时返回False"""
+        with self._cond:
+            deadline = self._clock() + timeout
+            while True:
+                now = self._clock()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.granted += 1
+                    return True
+                
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.rejected += 1
+                    return False
+                
+                self._cond.wait(min(remaining, (tokens - self._tokens) / self.rate))
+    
+    @property
+    def available(self) -> float:
+        """当前可用令牌数"""
+        with self._cond:
+            self._refill(self._clock())
+            return self._tokens
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计"""
+        tokens = self.available
+        with self._cond:
+            total = self.granted + self.rejected
+            return {
+                'rate_per_minute': self.rate * 60,
+                'capacity': self.capacity,
+                'tokens': round(tokens, 3),
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'reject_rate': self.rejected / total if total else 0.0,
+            }
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+    return max(when - (time.time() if now is None else now), 0.0)
+
+
+def backoff_delay(attempt: int,
+                  base: float = 1.0,
+                  cap: float = 30.0,
+                  retry_after: Optional[float] = None,
+                  rng: random.Random = random) -> float:
+    """
+    第 attempt 次重试前的等待时间（full jitter）
+    
+    在 [0, min(cap, base * 2**attempt)] 中随机取值，避免多个请求同时重试；
+    服务器给出Retry-After时至少等待该时长，再加上不超过 base 的随机抖动。
+    """
+    if retry_after is not None:
+        return retry_after + rng.uniform(0, base)
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# 全局令牌桶
+_rate_limiter: Optional[TokenBucket] = None
+
+
+def init_rate_limiter(rpm: float = DEFAULT_RPM, burst: float = DEFAULT_BURST) -> TokenBucket:
+    """按配额初始化全局令牌桶"""
+    global _rate_limiter
+    _rate_limiter = TokenBucket.per_minute(rpm, burst)
+    return _rate_limiter
+
+
+def get_rate_limiter() -> TokenBucket:
+    """获取全局令牌桶实例"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TokenBucket.per_minute(DEFAULT_RPM, DEFAULT_BURST)
+    return _rate_limiter
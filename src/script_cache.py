@@ -0,0 +1,196 @@
+"""
+脚本编译缓存
+将解析后的Script持久化到磁盘，按源码的SHA-256与语法版本索引，
+进程重启或新的worker进程可直接加载，无需重新词法/语法分析；
+使用vm后端时可把脚本的字节码与Script一起保存，加载后无需重新编译
+"""
+
+import os
+import pickle
+import hashlib
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .lexer import Lexer
+from .parser import Parser
+from .ast_nodes import Script, ParseError
+from .vm import compile_bytecode, attach_bytecode, dumps as dump_bytecode, loads as load_bytecode
+
+
+# 语法版本号：修改DSL语法或AST结构时递增
+GRAMMAR_VERSION = 1
+
+# 参与语法指纹计算的模块，任一文件变化都会使已有缓存失效（含字节码编译相关模块）
+GRAMMAR_MODULES = ('lexer.py', 'parser.py', 'ast_nodes.py', 'linker.py',
+                   'operators.py', 'optimizer.py', 'vm.py')
+
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_fingerprint: Optional[str] = None
+
+
+def grammar_fingerprint() -> str:
+    """计算语法指纹（语法版本号 + 语法相关模块的源码哈希）"""
+    global _fingerprint
+    if _fingerprint is None:
+        digest = hashlib.sha256(f"grammar-v{GRAMMAR_VERSION}".encode('utf-8'))
+        for module in GRAMMAR_MODULES:
+            with open(os.path.join(_SRC_DIR, module), 'rb') as f:
+                digest.update(f.read())
+        _fingerprint = digest.hexdigest()
+    return _fingerprint
+
+
+class ScriptCache:
+    """
+    磁盘脚本缓存
+    
+    缓存目录结构: <cache_dir>/<语法指纹前16位>/<源码哈希>.pickle
+    语法变化后指纹改变，旧目录中的条目不会再被读取。
+    store_bytecode 为True时（使用vm后端）写入条目时同时编译并保存字节码。
+    """
+    
+    def __init__(self, cache_dir: str = None, fingerprint: str = None, store_bytecode: bool = False):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(_SRC_DIR), 'data', 'script_cache')
+        
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint or grammar_fingerprint()
+        self.entry_dir = os.path.join(cache_dir, self.fingerprint[:16])
+        self.store_bytecode = store_bytecode
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+    
+    def cache_key(self, source: str) -> str:
+        """计算源码的缓存键"""
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+    
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.entry_dir, f"{key}.pickle")
+    
+    def get(self, source: str) -> Optional[Tuple[Script, List[ParseError]]]:
+        """读取缓存，未命中或条目损坏时返回None"""
+        path = self._entry_path(self.cache_key(source))
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self._discard(path)
+            return None
+        
+        if (not isinstance(entry, dict)
+                or entry.get('fingerprint') != self.fingerprint
+                or not isinstance(entry.get('script'), Script)):
+            self._discard(path)
+            return None
+        
+        script = entry['script']
+        bytecode = entry.get('bytecode')
+        if bytecode is not None:
+            try:
+                attach_bytecode(script, load_bytecode(bytecode))
+            except ValueError:
+                pass  # 字节码不可用时由vm后端重新编译
+        return script, entry.get('errors', [])
+    
+    def put(self, source: str, script: Script, errors: List[ParseError] = None):
+        """写入缓存（先写临时文件再原子替换，避免并发进程读到半个文件）"""
+        entry = {
+            'fingerprint': self.fingerprint,
+            'script': script,
+            'errors': list(errors or []),
+        }
+        if self.store_bytecode:
+            entry['bytecode'] = dump_bytecode(compile_bytecode(script))
+        path = self._entry_path(self.cache_key(source))
+        try:
+            os.makedirs(self.entry_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.entry_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            print(f"警告: 无法写入脚本缓存 {path}: {e}")
+    
+    def parse(self, source: str) -> Tuple[Script, List[ParseError]]:
+        """解析源码，优先使用缓存"""
+        cached = self.get(source)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+        
+        with self._lock:
+            self.misses += 1
+        
+        tokens = Lexer(source, backend='regex').tokenize()
+        parser = Parser(tokens)
+        script = parser.parse()
+        self.put(source, script, parser.errors)
+        return script, parser.errors
+    
+    def load_file(self, path: str) -> Script:
+        """加载并解析脚本文件"""
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        script, _ = self.parse(source)
+        return script
+    
+    def _discard(self, path: str):
+        """删除损坏或过期的缓存条目"""
+        with self._lock:
+            self.corrupted += 1
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def prune_stale(self) -> int:
+        """删除其他语法版本遗留的缓存目录，返回删除的目录数"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        
+        removed = 0
+        current = os.path.basename(self.entry_dir)
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name != current and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+    
+    def clear(self):
+        """清空当前语法版本的缓存"""
+        shutil.rmtree(self.entry_dir, ignore_errors=True)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存统计"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'corrupted': self.corrupted,
+        }
+
+
+# 全局脚本缓存实例
+_script_cache: Optional[ScriptCache] = None
+
+
+def get_script_cache() -> ScriptCache:
+    """获取全局脚本缓存实例"""
+    global _script_cache
+    if _script_cache is None:
+        _script_cache = ScriptCache()
+    return _script_cache
@@ -0,0 +1,205 @@
+"""
+会话存储
+保存解释器的执行上下文，支持空闲超时(TTL)、最大会话数和LRU淘汰
+"""
+
+import time
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class SessionStore:
+    """会话存储接口"""
+    
+    def get(self, session_id: str) -> Optional[Any]:
+        """获取会话上下文，不存在时返回None"""
+        raise NotImplementedError
+    
+    def put(self, session_id: str, context: Any):
+        """保存会话上下文"""
+        raise NotImplementedError
+    
+    def remove(self, session_id: str) -> Optional[Any]:
+        """移除会话，返回被移除的上下文"""
+        raise NotImplementedError
+    
+    def __len__(self) -> int:
+        raise NotImplementedError
+    
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        return {'size': len(self)}
+
+
+class InMemorySessionStore(SessionStore):
+    """无上限的内存会话存储（会话只在显式移除时释放）"""
+    
+    def __init__(self):
+        self._sessions: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            return self._sessions.get(session_id)
+    
+    def put(self, session_id: str, context: Any):
+        with self._lock:
+            self._sessions[session_id] = context
+    
+    def remove(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._sessions)
+    
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._sessions))
+
+
+class _Entry:
+    """会话条目"""
+    __slots__ = ('context', 'deadline')
+    
+    def __init__(self, context: Any, deadline: float):
+        self.context = context
+        self.deadline = deadline
+
+
+class BoundedSessionStore(SessionStore):
+    """
+    有界会话存储
+    
+    - 空闲超过 idle_ttl 秒的会话过期
+    - 会话数超过 max_sessions 时淘汰最久未访问的会话(LRU)
+    - 过期时间记录在最小堆中，清理时只弹出堆顶已到期的条目，不扫描全部会话。
+      访问会话只更新条目的截止时间，堆中的旧记录在弹出时按实际截止时间重新入堆。
+    """
+    
+    def __init__(self,
+                 max_sessions: int = 10000,
+                 idle_ttl: float = 1800,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_sessions <= 0:
+            raise ValueError("max_sessions 必须为正数")
+        if idle_ttl <= 0:
+            raise ValueError("idle_ttl 必须为正数")
+        
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._heap: List[Tuple[float, int, str, _Entry]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.removed = 0
+    
+    def get(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            entry.deadline = now + self.idle_ttl
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return entry.context
+    
+    def put(self, session_id: str, context: Any):
+        with self._lock:
+            now = self._clock()
+            self._sweep(now)
+            
+            entry = _Entry(context, now + self.idle_ttl)
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            heapq.heappush(self._heap, (entry.deadline, next(self._counter), session_id, entry))
+            
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            
+            # 被覆盖或淘汰的条目在堆中留有旧记录，数量过多时重建堆
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._rebuild_heap()
+    
+    def remove(self, session_id: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                return None
+            self.removed += 1
+            return entry.context
+    
+    def sweep(self) -> int:
+        """清理已过期的会话，返回清理数量"""
+        with self._lock:
+            return self._sweep(self._clock())
+    
+    def _sweep(self, now: float) -> int:
+        """弹出堆顶所有已到期的记录（调用方持有锁）"""
+        heap = self._heap
+        entries = self._entries
+        count = 0
+        
+        while heap and heap[0][0] <= now:
+            _, _, session_id, entry = heapq.heappop(heap)
+            if entries.get(session_id) is not entry:
+                continue  # 会话已被移除、覆盖或淘汰
+            if entry.deadline > now:
+                # 会话期间被访问过，按新的截止时间重新入堆
+                heapq.heappush(heap, (entry.deadline, next(self._counter), session_id, entry))
+                continue
+            del entries[session_id]
+            self.expired += 1
+            count += 1
+        
+        return count
+    
+    def _rebuild_heap(self):
+        """按当前存活的会话重建过期堆"""
+        self._heap = [(entry.deadline, next(self._counter), session_id, entry)
+                      for session_id, entry in self._entries.items()]
+        heapq.heapify(self._heap)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry is not None and entry.deadline > self._clock()
+    
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._entries))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_sessions': self.max_sessions,
+                'idle_ttl': self.idle_ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'removed': self.removed,
+            }
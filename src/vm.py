@@ -0,0 +1,436 @@
+"""
+字节码虚拟机
+把每个Step编译成扁平的指令数组，由一个基于栈的分派循环执行：
+If/While 编译为条件跳转而不是嵌套调用，变量按链接阶段分配的槽位读写，
+Goto 直接携带目标步骤下标。字节码可用 marshal 紧凑序列化，随脚本缓存一起保存
+"""
+
+import marshal
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+from .ast_nodes import (
+    Script, Step, Statement, Expression,
+    SpeakStatement, ListenStatement, GotoStatement,
+    SetStatement, IfStatement, WhileStatement, CallStatement,
+    Variable, BinaryOp, UnaryOp, FunctionCall
+)
+from .compiler import StepJump, MAX_LOOP_ITERATIONS
+from .linker import link_script, LinkedScript, UNSET
+from .operators import BINARY_OPERATORS, UNARY_OPERATORS
+from .optimizer import Constant, Template, optimize_expression
+
+
+# 字节码格式版本：修改指令集或序列化格式时递增
+BYTECODE_VERSION = 1
+
+# ============ 指令集 ============
+# 每条指令占两个字：操作码 + 参数（不需要参数的指令参数为0）
+
+LOAD_CONST = 0      # 压入 consts[arg]
+LOAD_VAR = 1        # 压入槽位 arg 的变量值（未赋值为空字符串）
+STORE_VAR = 2       # 弹出并写入槽位 arg
+BINARY_OP = 3       # 弹出两个操作数，压入 BINARY_FUNCS[arg](左, 右)
+COMPARE_OP = 4      # 同上，比较操作符
+UNARY_OP = 5        # 弹出一个操作数，压入 UNARY_FUNCS[arg](x)
+CONCAT = 6          # 弹出 arg 个值，转为字符串后拼接
+CALL_FUNCTION = 7   # 内置函数，consts[arg] 为 (函数名, 参数个数)
+CALL_SERVICE = 8    # 外部服务，consts[arg] 为 (服务名, 参数个数)
+POP_TOP = 9         # 弹出并丢弃栈顶
+SPEAK = 10          # 弹出并输出；arg 为0时（嵌套语句块中）只记录不输出
+JUMP = 11           # 跳转到 arg
+JUMP_IF_FALSE = 12  # 弹出，为假时跳转到 arg
+GOTO = 13           # 结束本步骤，跳转到下标为 arg 的步骤
+SETUP_LOOP = 14     # 第 arg 个循环的迭代计数清零
+LOOP_GUARD = 15     # 第 arg 个循环的迭代计数加一，超过上限时报错
+
+OPNAMES = ('LOAD_CONST', 'LOAD_VAR', 'STORE_VAR', 'BINARY_OP', 'COMPARE_OP', 'UNARY_OP',
+           'CONCAT', 'CALL_FUNCTION', 'CALL_SERVICE', 'POP_TOP', 'SPEAK', 'JUMP',
+           'JUMP_IF_FALSE', 'GOTO', 'SETUP_LOOP', 'LOOP_GUARD')
+
+COMPARE_SYMBOLS = ('==', '!=', '>', '<', '>=', '<=')
+BINARY_SYMBOLS = tuple(op for op in BINARY_OPERATORS if op not in COMPARE_SYMBOLS)
+UNARY_SYMBOLS = tuple(UNARY_OPERATORS)
+
+BINARY_FUNCS = tuple(BINARY_OPERATORS[op] for op in BINARY_SYMBOLS)
+COMPARE_FUNCS = tuple(BINARY_OPERATORS[op] for op in COMPARE_SYMBOLS)
+UNARY_FUNCS = tuple(UNARY_OPERATORS[op] for op in UNARY_SYMBOLS)
+
+
+class StepCode:
+    """一个步骤的字节码"""
+    
+    __slots__ = ('name', 'code', 'consts', 'loops', 'has_listen')
+    
+    def __init__(self, name: str, code: Tuple[int, ...], consts: Tuple[Any, ...],
+                 loops: int, has_listen: bool):
+        self.name = name
+        self.code = code
+        self.consts = consts
+        self.loops = loops          # 步骤内While循环的个数（迭代计数器个数）
+        self.has_listen = has_listen
+    
+    def __repr__(self):
+        return f"StepCode({self.name!r}, {len(self.code) // 2} 条指令)"
+
+
+class Bytecode:
+    """
+    整个脚本的字节码
+    
+    steps 按链接下标排列（不存在的目标步骤为None），names 为变量槽位表中的变量名，
+    jumps 是每个步骤预先创建的Goto跳转标记。
+    """
+    
+    __slots__ = ('names', 'step_names', 'steps', 'jumps')
+    
+    def __init__(self, names: Tuple[str, ...], step_names: Tuple[str, ...],
+                 steps: Tuple[Optional[StepCode], ...]):
+        self.names = names
+        self.step_names = step_names
+        self.steps = steps
+        self.jumps = tuple(StepJump(name, index) for index, name in enumerate(step_names))
+    
+    def matches(self, linked: LinkedScript) -> bool:
+        """字节码的槽位和步骤下标是否与链接结果一致"""
+        return (self.names == linked.layout.names
+                and self.step_names == tuple(node.name for node in linked.steps))
+
+
+# ============ 编译 ============
+
+class _Assembler:
+    """单个步骤的指令生成"""
+    
+    def __init__(self, linked: LinkedScript):
+        self.slots = linked.layout.slots
+        self.index = linked.index
+        self.code: List[int] = []
+        self.consts: List[Any] = []
+        self._const_index: Dict[Tuple[type, Any], int] = {}
+        self.loops = 0
+    
+    def emit(self, op: int, arg: int = 0) -> int:
+        """追加一条指令，返回其位置"""
+        self.code.extend((op, arg))
+        return len(self.code) - 2
+    
+    def patch(self, position: int, target: int):
+        """回填跳转目标"""
+        self.code[position + 1] = target
+    
+    def const(self, value: Any) -> int:
+        # 按类型区分，避免 1、1.0、True 合并为同一个常量
+        key = (value.__class__, value)
+        index = self._const_index.get(key)
+        if index is None:
+            index = len(self.consts)
+            self.consts.append(value)
+            self._const_index[key] = index
+        return index
+    
+    # ---------- 表达式 ----------
+    
+    def expression(self, expr: Expression):
+        """生成表达式指令（expr 已经过优化），执行后栈顶为表达式的值"""
+        if isinstance(expr, Constant):
+            self.emit(LOAD_CONST, self.const(expr.value))
+        
+        elif isinstance(expr, Template):
+            for part in expr.parts:
+                self.expression(part)
+            self.emit(CONCAT, len(expr.parts))
+        
+        elif isinstance(expr, Variable):
+            self.emit(LOAD_VAR, self.slots[expr.name])
+        
+        elif isinstance(expr, BinaryOp):
+            self.expression(expr.left)
+            self.expression(expr.right)
+            if expr.operator in COMPARE_SYMBOLS:
+                self.emit(COMPARE_OP, COMPARE_SYMBOLS.index(expr.operator))
+            elif expr.operator in BINARY_SYMBOLS:
+                self.emit(BINARY_OP, BINARY_SYMBOLS.index(expr.operator))
+            else:
+                # 未知操作符：两侧仍然求值，结果为None
+                self.emit(POP_TOP)
+                self.emit(POP_TOP)
+                self.emit(LOAD_CONST, self.const(None))
+        
+        elif isinstance(expr, UnaryOp):
+            self.expression(expr.operand)
+            if expr.operator in UNARY_SYMBOLS:
+                self.emit(UNARY_OP, UNARY_SYMBOLS.index(expr.operator))
+            else:
+                self.emit(POP_TOP)
+                self.emit(LOAD_CONST, self.const(None))
+        
+        elif isinstance(expr, FunctionCall):
+            for arg in expr.arguments:
+                self.expression(arg)
+            self.emit(CALL_FUNCTION, self.const((expr.name, len(expr.arguments))))
+        
+        else:
+            self.emit(LOAD_CONST, self.const(None))
+    
+    # ---------- 语句 ----------
+    
+    def block(self, statements: List[Statement], top_level: bool):
+        for stmt in statements:
+            self.statement(stmt, top_level)
+    
+    def statement(self, stmt: Statement, top_level: bool):
+        if isinstance(stmt, SpeakStatement):
+            optimized = optimize_expression(stmt.expression)
+            if isinstance(optimized, Constant):
+                # 纯字面量：输出在编译期确定
+                self.emit(LOAD_CONST, self.const(str(optimized.value)))
+            else:
+                self.expression(optimized)
+            self.emit(SPEAK, 1 if top_level else 0)
+        
+        elif isinstance(stmt, SetStatement):
+            self.expression(optimize_expression(stmt.expression))
+            self.emit(STORE_VAR, self.slots[stmt.variable])
+        
+        elif isinstance(stmt, GotoStatement):
+            self.emit(GOTO, self.index[stmt.target_step])
+        
+        elif isinstance(stmt, IfStatement):
+            self._if(stmt)
+        
+        elif isinstance(stmt, WhileStatement):
+            self._while(stmt)
+        
+        elif isinstance(stmt, CallStatement):
+            for arg in stmt.arguments:
+                self.expression(optimize_expression(arg))
+            self.emit(CALL_SERVICE, self.const((stmt.service_name, len(stmt.arguments))))
+            if stmt.result_var:
+                self.emit(STORE_VAR, self.slots[stmt.result_var])
+            else:
+                self.emit(POP_TOP)
+        
+        # Listen / Exit 在步骤级别处理，不生成指令
+    
+    def _if(self, stmt: IfStatement):
+        condition = optimize_expression(stmt.condition)
+        if isinstance(condition, Constant):
+            # 条件为常量：只保留会执行的分支
+            self.block(stmt.then_block if condition.value else (stmt.else_block or []), False)
+            return
+        
+        self.expression(condition)
+        jump_else = self.emit(JUMP_IF_FALSE)
+        self.block(stmt.then_block, False)
+        if stmt.else_block:
+            jump_end = self.emit(JUMP)
+            self.patch(jump_else, len(self.code))
+            self.block(stmt.else_block, False)
+            self.patch(jump_end, len(self.code))
+        else:
+            self.patch(jump_else, len(self.code))
+    
+    def _while(self, stmt: WhileStatement):
+        loop = self.loops
+        self.loops += 1
+        self.emit(SETUP_LOOP, loop)
+        top = len(self.code)
+        self.expression(optimize_expression(stmt.condition))
+        jump_end = self.emit(JUMP_IF_FALSE)
+        self.emit(LOOP_GUARD, loop)
+        self.block(stmt.body, False)
+        self.emit(JUMP, top)
+        self.patch(jump_end, len(self.code))
+
+
+def compile_step_bytecode(step: Step, linked: LinkedScript) -> StepCode:
+    """编译单个步骤"""
+    assembler = _Assembler(linked)
+    assembler.block(step.statements, True)
+    has_listen = any(isinstance(s, ListenStatement) for s in step.statements)
+    return StepCode(step.name, tuple(assembler.code), tuple(assembler.consts),
+                    assembler.loops, has_listen)
+
+
+def compile_bytecode(script: Script) -> Bytecode:
+    """
+    编译整个脚本
+    
+    编译结果缓存在Script对象上（也可以由脚本缓存从磁盘恢复），同一个Script只编译一次。
+    """
+    bytecode = script.__dict__.get('_bytecode')
+    if bytecode is None:
+        linked = link_script(script)
+        bytecode = Bytecode(
+            linked.layout.names,
+            tuple(node.name for node in linked.steps),
+            tuple(compile_step_bytecode(node.step, linked) if node.step is not None else None
+                  for node in linked.steps))
+        script.__dict__['_bytecode'] = bytecode
+    return bytecode
+
+
+def attach_bytecode(script: Script, bytecode: Bytecode) -> bool:
+    """把反序列化得到的字节码关联到脚本，与脚本的链接结果不一致时不使用并返回False"""
+    if not bytecode.matches(link_script(script)):
+        return False
+    script.__dict__['_bytecode'] = bytecode
+    return True
+
+
+# ============ 执行 ============
+
+def execute(step: StepCode, jumps: Tuple[StepJump, ...], interp, ctx,
+            messages: List[str]) -> Optional[StepJump]:
+    """
+    执行一个步骤的字节码
+    
+    顶层Speak的输出追加到 messages；遇到Goto时返回跳转标记，否则返回None。
+    """
+    code = step.code
+    consts = step.consts
+    values = ctx.values
+    stack: List[Any] = []
+    push = stack.append
+    pop = stack.pop
+    counters = [0] * step.loops if step.loops else None
+    pc = 0
+    end = len(code)
+    
+    while pc < end:
+        op = code[pc]
+        arg = code[pc + 1]
+        pc += 2
+        
+        if op == LOAD_VAR:
+            value = values[arg]
+            push("" if value is UNSET else value)
+        elif op == LOAD_CONST:
+            push(consts[arg])
+        elif op == STORE_VAR:
+            values[arg] = pop()
+        elif op == CONCAT:
+            parts = stack[-arg:]
+            del stack[-arg:]
+            push(''.join([part if part.__class__ is str else str(part) for part in parts]))
+        elif op == BINARY_OP:
+            right = pop()
+            push(BINARY_FUNCS[arg](pop(), right))
+        elif op == COMPARE_OP:
+            right = pop()
+            push(COMPARE_FUNCS[arg](pop(), right))
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == SPEAK:
+            message = str(pop())
+            ctx.last_speak_output = message
+            if arg and message:
+                messages.append(message)
+        elif op == GOTO:
+            return jumps[arg]
+        elif op == CALL_SERVICE:
+            name, count = consts[arg]
+            args = stack[-count:] if count else []
+            if count:
+                del stack[-count:]
+            push(interp.service_handler.handle(name, args, ctx))
+            values = ctx.values  # 服务可能通过上下文替换了变量存储
+        elif op == POP_TOP:
+            pop()
+        elif op == UNARY_OP:
+            push(UNARY_FUNCS[arg](pop()))
+        elif op == CALL_FUNCTION:
+            name, count = consts[arg]
+            args = stack[-count:] if count else []
+            if count:
+                del stack[-count:]
+            push(interp._call_builtin_function(name, args, ctx))
+            values = ctx.values
+        elif op == LOOP_GUARD:
+            counters[arg] += 1
+            if counters[arg] > MAX_LOOP_ITERATIONS:
+                raise RuntimeError("循环超过最大迭代次数")
+        elif op == SETUP_LOOP:
+            counters[arg] = 0
+        else:
+            raise RuntimeError(f"未知的字节码指令: {op}")
+    return None
+
+
+# ============ 序列化 ============
+
+def dumps(bytecode: Bytecode) -> bytes:
+    """序列化字节码（marshal格式，指令数组按最小的无符号整数宽度存放）"""
+    steps = []
+    for step in bytecode.steps:
+        if step is None:
+            steps.append(None)
+            continue
+        typecode = 'H' if max(step.code, default=0) <= 0xFFFF else 'I'
+        steps.append((step.name, typecode, array(typecode, step.code).tobytes(),
+                      step.consts, step.loops, step.has_listen))
+    return marshal.dumps((BYTECODE_VERSION, bytecode.names, bytecode.step_names, tuple(steps)))
+
+
+def loads(data: bytes) -> Bytecode:
+    """反序列化字节码，数据损坏或版本不符时抛出ValueError"""
+    try:
+        version, names, step_names, raw_steps = marshal.loads(data)
+    except Exception as e:
+        raise ValueError(f"无效的字节码数据: {e}") from e
+    if version != BYTECODE_VERSION:
+        raise ValueError(f"字节码版本不符: {version}（当前 {BYTECODE_VERSION}）")
+    
+    steps = []
+    for raw in raw_steps:
+        if raw is None:
+            steps.append(None)
+            continue
+        name, typecode, code, consts, loops, has_listen = raw
+        steps.append(StepCode(name, tuple(array(typecode, code)), consts, loops, has_listen))
+    return Bytecode(names, step_names, tuple(steps))
+
+
+# ============ 反汇编 ============
+
+def _describe(op: int, arg: int, step: StepCode, bytecode: Bytecode) -> str:
+    """指令参数的可读说明"""
+    if op == LOAD_CONST:
+        return repr(step.consts[arg])
+    if op in (LOAD_VAR, STORE_VAR):
+        return f"${bytecode.names[arg]}"
+    if op == BINARY_OP:
+        return BINARY_SYMBOLS[arg]
+    if op == COMPARE_OP:
+        return COMPARE_SYMBOLS[arg]
+    if op == UNARY_OP:
+        return UNARY_SYMBOLS[arg]
+    if op in (CALL_FUNCTION, CALL_SERVICE):
+        name, count = step.consts[arg]
+        return f"{name}/{count}"
+    if op in (JUMP, JUMP_IF_FALSE):
+        return f"to {arg}"
+    if op == GOTO:
+        return bytecode.step_names[arg]
+    if op == SPEAK:
+        return "output" if arg else "discard"
+    return ""
+
+
+def disassemble(bytecode: Bytecode, step_name: Optional[str] = None) -> str:
+    """反汇编为可读文本（给出步骤名时只输出该步骤）"""
+    lines = []
+    for step in bytecode.steps:
+        if step is None or (step_name is not None and step.name != step_name):
+            continue
+        lines.append(f"Step {step.name}:")
+        for pc in range(0, len(step.code), 2):
+            op, arg = step.code[pc], step.code[pc + 1]
+            description = _describe(op, arg, step, bytecode)
+            line = f"  {pc:>4} {OPNAMES[op]:<14}{arg:>4}"
+            lines.append(f"{line} ({description})" if description else line)
+        lines.append("")
+    return "\n".join(lines)
@@ -4,9 +4,16 @@
 """
 
 import json
-from typing import List, Dict, Any, Optional
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any, Optional, Callable
 from dataclasses import dataclass, field
 
+from src.parser import parse
+from src.interpreter import Interpreter
+from benchmarks.fixtures import DeterministicServiceHandler
+
 
 @dataclass
 class StubResponse:
@@ -82,6 +89,79 @@ class LLMStub:
         self.call_history = []
 
 
+class GeminiStubServer:
+    """
+    Gemini API桩服务器
+    在本机随机端口上模拟generateContent接口，用于离线测试HTTP客户端
+    """
+    
+    def __init__(self, reply: Callable[[str], str] = None, delay: float = 0):
+        self.reply = reply or (lambda prompt: '{"intent": "", "confidence": 0.0}')
+        self.delay = delay                # 每个请求的处理延迟（秒）
+        self.statuses: List[Any] = []     # 依次返回的状态码或 (状态码, 响应头)，用完后返回200
+        self.requests: List[Dict] = []    # 收到的请求：提示词和客户端地址
+        self._lock = threading.Lock()
+        
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持keep-alive
+            
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                prompt = payload["contents"][0]["parts"][0]["text"]
+                with stub._lock:
+                    stub.requests.append({"prompt": prompt, "client": self.client_address})
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                if stub.delay:
+                    time.sleep(stub.delay)
+                
+                status, headers = status if isinstance(status, tuple) else (status, {})
+                if status == 200:
+                    data = {"candidates": [{"content": {"parts": [{"text": stub.reply(prompt)}]}}]}
+                else:
+                    data = {"error": {"code": status}}
+                body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1beta/models"
+    
+    def prompts(self) -> List[str]:
+        """获取收到的所有提示词"""
+        with self._lock:
+            return [r["prompt"] for r in self.requests]
+    
+    def start(self) -> 'GeminiStubServer':
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+
 class ExternalServiceStub:
     """
     外部服务桩
@@ -215,6 +295,30 @@ class OutputCapture:
         self.outputs = []
 
 
+class FakeClock:
+    """可手动推进的时钟（替代 time.monotonic 注入被测对象）"""
+    
+    def __init__(self, now: float = 0.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def run_script(source: str, backend: str, variables: Dict[str, Any] = None):
+    """
+    用指定执行后端运行一段脚本，返回输出和上下文
+    服务调用使用确定性处理器，便于比较不同后端的结果
+    """
+    interpreter = Interpreter(parse(source), service_handler=DeterministicServiceHandler(), backend=backend)
+    context = interpreter.create_session('test', variables)
+    output = interpreter.start('test')
+    return output, context
+
+
 # 预配置的测试场景
 class TestScenarios:
     """预配置的测试场景"""
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Gemini异步客户端测试
+使用本地桩服务器测试请求合并、重试、连接复用以及识别器接入
+"""
+
+import sys
+import os
+import threading
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.async_gemini import AsyncGeminiClient
+from src.intent_recognizer import GeminiIntentRecognizer, LLMError
+from tests.stubs import GeminiStubServer
+
+
+class TestAsyncGeminiClient(unittest.TestCase):
+    """异步客户端测试"""
+    
+    def setUp(self):
+        self.server = GeminiStubServer(reply=lambda prompt: f"回复:{prompt}").start()
+        self.client = AsyncGeminiClient("test-key", base_url=self.server.base_url,
+                                        timeout=5, retry_delay=0.01)
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+    
+    def test_generate_sync(self):
+        """测试同步桥接返回生成文本"""
+        self.assertEqual(self.client.generate_sync("你好"), "回复:你好")
+        self.assertEqual(self.server.prompts(), ["你好"])
+    
+    def test_identical_prompts_coalesced(self):
+        """测试并发的相同提示词只发送一次请求"""
+        self.server.delay = 0.3
+        results = []
+        
+        def call(prompt):
+            results.append(self.client.generate_sync(prompt))
+        
+        threads = [threading.Thread(target=call, args=("挂号",)) for _ in range(5)]
+        threads.append(threading.Thread(target=call, args=("缴费",)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sorted(results), ["回复:挂号"] * 5 + ["回复:缴费"])
+        self.assertEqual(sorted(self.server.prompts()), ["挂号", "缴费"])
+        self.assertEqual(self.client.coalesced, 4)
+        
+        # 完成后不再合并
+        self.client.generate_sync("挂号")
+        self.assertEqual(self.server.prompts().count("挂号"), 2)
+    
+    def test_connection_reused(self):
+        """测试顺序请求复用同一个keep-alive连接"""
+        for i in range(5):
+            self.client.generate_sync(f"第{i}次")
+        clients = {request["client"] for request in self.server.requests}
+        self.assertEqual(len(clients), 1)
+    
+    def test_retry_on_rate_limit(self):
+        """测试429后重试，其他错误抛出LLMError"""
+        self.server.statuses = [429, 429]
+        self.assertEqual(self.client.generate_sync("重试"), "回复:重试")
+        self.assertEqual(self.client.requests_sent, 3)
+        
+        self.server.statuses = [500]
+        with self.assertRaises(LLMError):
+            self.client.generate_sync("失败")
+        
+        self.server.statuses = [429, 429, 429]
+        with self.assertRaises(LLMError):
+            self.client.generate_sync("限流")
+    
+    def test_recognizer_uses_client(self):
+        """测试识别器通过异步客户端请求"""
+        self.server.reply = lambda prompt: '{"intent": "挂号", "confidence": 0.9}'
+        recognizer = GeminiIntentRecognizer("test-key", async_client=self.client)
+        result = recognizer.recognize_intent("我想挂号", ["挂号", "缴费"])
+        self.assertEqual((result.intent, result.confidence), ("挂号", 0.9))
+        self.assertEqual(len(self.server.requests), 1)
+        # 请求走异步客户端的连接池，不创建同步会话
+        self.assertIsNone(recognizer.session)
+        self.assertIsNotNone(GeminiIntentRecognizer("test-key").session)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
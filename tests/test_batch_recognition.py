@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+批量意图识别测试
+测试Gemini批量提示词的解析、逐条校验、格式错误时拆分以及缓存接入
+"""
+
+import sys
+import os
+import re
+import json
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.intent_cache import IntentCache
+from src.intent_recognizer import GeminiIntentRecognizer, MockIntentRecognizer, LLMError
+
+
+def batch_items(prompt: str):
+    """从批量提示词中取出待识别的输入数组"""
+    match = re.search(r'待识别输入\(JSON数组\):\n(\[.*\])\n', prompt)
+    return json.loads(match.group(1)) if match else None
+
+
+class FakeModel:
+    """按输入内容返回识别结果的模拟模型"""
+    
+    def __init__(self, malformed_above: int = None):
+        self.prompts = []
+        self.malformed_above = malformed_above  # 批量超过该条数时返回格式错误的数组
+    
+    def __call__(self, prompt, max_retries=3):
+        self.prompts.append(prompt)
+        items = batch_items(prompt)
+        if items is None:
+            # 单条提示词
+            user_input = re.search(r'用户输入: "(.*)"', prompt).group(1)
+            return json.dumps(self.answer(user_input), ensure_ascii=False)
+        if self.malformed_above is not None and len(items) > self.malformed_above:
+            return '[{"id": 0, "intent": "挂号"'
+        answers = [dict(self.answer(item["input"]), id=item["id"]) for item in reversed(items)]
+        return "```json\n" + json.dumps(answers, ensure_ascii=False) + "\n```"
+    
+    @staticmethod
+    def answer(user_input):
+        if "挂号" in user_input:
+            return {"intent": "挂号", "confidence": 0.9}
+        if "钱" in user_input:
+            return {"intent": "缴费啦", "confidence": 1.5, "entities": {"金额": 50}}
+        return {"intent": "闲聊", "confidence": 0.8}
+
+
+class TestGeminiBatch(unittest.TestCase):
+    """Gemini批量识别测试"""
+    
+    INPUTS = ["我想挂号", "", "交钱", "今天天气不错"]
+    INTENTS = [["挂号", "缴费"]] * 4
+    
+    def setUp(self):
+        self.recognizer = GeminiIntentRecognizer("test-key")
+        self.model = FakeModel()
+        self.recognizer._make_request = self.model
+    
+    def test_one_request_per_batch(self):
+        """测试多条输入打包成一次请求，并逐条校验结果"""
+        results = self.recognizer.recognize_batch(self.INPUTS, self.INTENTS)
+        self.assertEqual(len(self.model.prompts), 1)
+        self.assertEqual(len(batch_items(self.model.prompts[0])), 3)
+        
+        self.assertEqual(results[0].intent, "挂号")
+        self.assertTrue(results[1].is_silence)
+        # 意图名模糊匹配到可用意图，置信度截断到1
+        self.assertEqual((results[2].intent, results[2].confidence, results[2].entities),
+                         ("缴费", 1.0, {"金额": 50}))
+        # 不在可用意图中
+        self.assertEqual((results[3].intent, results[3].confidence), ("", 0.0))
+    
+    def test_batch_size(self):
+        """测试按batch_size分批请求"""
+        self.recognizer.recognize_batch(["挂号"] * 5, [["挂号"]] * 5, batch_size=2)
+        self.assertEqual([len(batch_items(p) or [None]) for p in self.model.prompts], [2, 2, 1])
+    
+    def test_split_on_malformed_array(self):
+        """测试数组格式错误时拆分重试，单条时使用单条提示词"""
+        self.model.malformed_above = 2
+        inputs = ["挂号1", "交钱", "挂号2", "闲聊", "挂号3"]
+        results = self.recognizer.recognize_batch(inputs, [["挂号", "缴费"]] * 5)
+        self.assertEqual([r.intent for r in results], ["挂号", "缴费", "挂号", "", "挂号"])
+        sizes = [len(batch_items(p)) if batch_items(p) else 1 for p in self.model.prompts]
+        self.assertEqual(sizes, [5, 2, 3, 1, 2])
+    
+    def test_parse_batch_response(self):
+        """测试数组长度、id不匹配时视为格式错误"""
+        parse = self.recognizer._parse_batch_response
+        intents = [["挂号"], ["缴费"]]
+        self.assertIsNone(parse('[{"intent": "挂号"}]', intents))
+        self.assertIsNone(parse('[{"id": 0, "intent": "挂号"}, {"id": 0, "intent": "缴费"}]', intents))
+        self.assertIsNone(parse('[{"id": [1], "intent": "挂号"}, {"id": 0}]', intents))
+        self.assertIsNone(parse('[{"intent": "挂号"}, "缴费"]', intents))
+        self.assertIsNone(parse('无法识别', intents))
+        results = parse('[{"intent": "挂号"}, {"intent": "缴费", "confidence": "0.5"}]', intents)
+        self.assertEqual([(r.intent, r.confidence) for r in results], [("挂号", 0.0), ("缴费", 0.5)])
+    
+    def test_request_failure_falls_back(self):
+        """测试请求失败时逐条使用关键词回退"""
+        def failing(prompt, max_retries=3):
+            raise LLMError("API请求超时")
+        self.recognizer._make_request = failing
+        results = self.recognizer.recognize_batch(["我要挂号", "随便"], [["挂号"], ["挂号"]])
+        self.assertEqual([r.intent for r in results], ["挂号", ""])
+    
+    def test_cache(self):
+        """测试批量结果写入缓存，已缓存的输入不再请求"""
+        self.recognizer.cache = IntentCache()
+        self.recognizer.recognize_batch(["我想挂号", "交钱"], [["挂号", "缴费"]] * 2)
+        results = self.recognizer.recognize_batch(["我想挂号。", "交钱", "闲聊"], [["挂号", "缴费"]] * 3)
+        self.assertEqual([r.intent for r in results], ["挂号", "缴费", ""])
+        self.assertEqual(len(self.model.prompts), 2)
+        self.assertIsNone(batch_items(self.model.prompts[1]))
+        stats = self.recognizer.cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 3))
+    
+    def test_split_counts_one_miss_per_input(self):
+        """测试拆分到单条时不再重复查缓存，每条输入只记一次未命中"""
+        self.recognizer.cache = IntentCache()
+        self.model.malformed_above = 1
+        self.recognizer.recognize_batch(["挂号1", "交钱", "挂号2"], [["挂号", "缴费"]] * 3)
+        stats = self.recognizer.cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (0, 3, 3))
+    
+    def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.recognizer.recognize_batch(["挂号"], [])
+
+
+class TestMockBatch(unittest.TestCase):
+    """模拟识别器批量接口测试"""
+    
+    def test_recognize_batch(self):
+        recognizer = MockIntentRecognizer()
+        results = recognizer.recognize_batch(["我要挂号", ""], [["挂号"], ["挂号"]])
+        self.assertEqual(results[0].intent, "挂号")
+        self.assertTrue(results[1].is_silence)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
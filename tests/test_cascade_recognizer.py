@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+级联意图识别器测试
+测试各级识别的决策顺序、计数以及解释器接入
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.interpreter import Interpreter
+from src.intent_recognizer import IntentResult, MockIntentRecognizer
+from src.cascade_recognizer import CascadeIntentRecognizer
+from src.local_intent_recognizer import create_local_recognizer
+
+
+class CountingRecognizer(MockIntentRecognizer):
+    """记录调用次数的模拟大模型识别器"""
+    
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+    
+    def recognize_intent(self, user_input, available_intents, context=None) -> IntentResult:
+        self.calls.append((user_input, list(available_intents), context))
+        return super().recognize_intent(user_input, available_intents, context)
+
+
+class TestCascadeIntentRecognizer(unittest.TestCase):
+    """级联识别测试"""
+    
+    def setUp(self):
+        self.llm = CountingRecognizer()
+        self.recognizer = CascadeIntentRecognizer(self.llm, create_local_recognizer("hospital"))
+    
+    def test_exact_match(self):
+        """测试输入就是意图名时不调用本地和大模型识别"""
+        result = self.recognizer.recognize_intent(" 缴费。", ["挂号", "缴费"])
+        self.assertEqual((result.intent, result.confidence), ("缴费", 1.0))
+        self.assertEqual(self.llm.calls, [])
+        self.assertEqual(self.recognizer.get_stats()['counts']['exact'], 1)
+    
+    def test_local_match(self):
+        """测试本地识别置信度足够时不调用大模型"""
+        result = self.recognizer.recognize_intent("我想挂号看病", ["挂号", "缴费"])
+        self.assertEqual(result.intent, "挂号")
+        self.assertTrue(result.raw_response.startswith("local:"))
+        self.assertEqual(self.llm.calls, [])
+    
+    def test_llm_fallback(self):
+        """测试本地无法确定时交给大模型，并传递上下文"""
+        self.llm.set_response("来个人帮帮忙", "人工客服")
+        context = {"variables": {}, "history": []}
+        result = self.recognizer.recognize_intent("来个人帮帮忙", ["人工客服", "挂号"], context)
+        self.assertEqual(result.intent, "人工客服")
+        self.assertEqual(self.llm.calls, [("来个人帮帮忙", ["人工客服", "挂号"], context)])
+        
+        self.recognizer.local_threshold = 1.1
+        self.recognizer.recognize_intent("我想挂号看病", ["挂号", "缴费"])
+        self.assertEqual(len(self.llm.calls), 2)
+        
+        stats = self.recognizer.get_stats()
+        self.assertEqual(stats['counts']['llm'], 2)
+        self.assertEqual(stats['llm_rate'], 1.0)
+    
+    def test_without_llm(self):
+        """测试未配置大模型时使用本地结果"""
+        recognizer = CascadeIntentRecognizer(None, create_local_recognizer("hospital"),
+                                             local_threshold=1.1)
+        self.assertEqual(recognizer.recognize_intent("我想挂号看病", ["挂号", "缴费"]).intent, "挂号")
+        self.assertEqual(recognizer.recognize_intent("天气不错", ["挂号", "缴费"]).intent, "")
+        self.assertTrue(recognizer.recognize_intent("  ", ["挂号"]).is_silence)
+        self.assertEqual(recognizer.get_stats()['counts'],
+                         {'silence': 1, 'exact': 0, 'local': 1, 'llm': 0, 'unmatched': 1})
+
+
+class TestCascadeWithInterpreter(unittest.TestCase):
+    """解释器接入测试"""
+    
+    SOURCE = '''Step welcome
+    Speak "请问需要什么服务"
+    Listen 5, 30
+    Branch "挂号", register
+    Branch "缴费", payment
+    Default welcome
+
+Step register
+    Speak "挂号成功"
+    Exit
+
+Step payment
+    Speak "缴费成功"
+    Exit'''
+    
+    def test_conversation(self):
+        """测试对话中各级识别决定分支"""
+        llm = CountingRecognizer()
+        recognizer = CascadeIntentRecognizer(llm, create_local_recognizer("hospital"))
+        interpreter = Interpreter(parse(self.SOURCE), recognizer)
+        
+        for session_id, text, expected in (("s1", "缴费", "缴费成功"),
+                                           ("s2", "我想挂号看病", "挂号成功")):
+            interpreter.create_session(session_id)
+            interpreter.start(session_id)
+            self.assertEqual(interpreter.process_input(session_id, text).message, expected)
+        self.assertEqual(llm.calls, [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+LLM调用熔断器测试
+测试状态转换、半开时的单个探测请求以及识别器在熔断时的降级
+"""
+
+import sys
+import os
+import time
+import threading
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.rate_limiter import TokenBucket
+from src.async_gemini import AsyncGeminiClient
+from src.intent_recognizer import (
+    CircuitBreaker, GeminiIntentRecognizer, MockIntentRecognizer, get_circuit_breaker
+)
+from tests.stubs import GeminiStubServer, FakeClock
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """熔断器状态测试"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=self.clock)
+    
+    def trip(self):
+        for _ in range(3):
+            self.assertTrue(self.breaker.allow_request())
+            self.breaker.record_failure("API请求超时")
+    
+    def test_opens_after_consecutive_failures(self):
+        """测试连续失败达到阈值才打开，成功会清零计数"""
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        
+        self.breaker.record_failure()
+        self.breaker.record_failure("API请求超时")
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+        stats = self.breaker.get_stats()
+        self.assertEqual((stats['opened'], stats['rejected'], stats['retry_in']), (1, 1, 10))
+        self.assertEqual(stats['last_error'], "API请求超时")
+    
+    def test_half_open_single_probe(self):
+        """测试到时后只放行一个探测请求，探测结果决定开关"""
+        self.trip()
+        self.clock.now += 10
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+        
+        # 探测失败：重新打开并重新计时
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.get_stats()['opened'], 2)
+        self.clock.now += 5
+        self.assertFalse(self.breaker.allow_request())
+        
+        # 探测成功：关闭
+        self.clock.now += 5
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+    
+    def test_release_probe(self):
+        """测试探测请求没有发出时归还名额"""
+        self.trip()
+        self.clock.now += 10
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.release()
+        self.assertTrue(self.breaker.allow_request())
+    
+    def test_concurrent_probe(self):
+        """测试并发时半开状态只放行一个请求"""
+        self.trip()
+        self.clock.now += 10
+        allowed = []
+        threads = [threading.Thread(target=lambda: allowed.append(self.breaker.allow_request()))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 1)
+    
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(failure_threshold=0)
+
+
+class TestRecognizerCircuitBreaker(unittest.TestCase):
+    """识别器熔断测试"""
+    
+    def setUp(self):
+        self.server = GeminiStubServer(reply=lambda prompt: '{"intent": "挂号", "confidence": 0.9}')
+        self.server.start()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def make_recognizer(self, **kwargs) -> GeminiIntentRecognizer:
+        recognizer = GeminiIntentRecognizer("test-key", circuit_breaker=self.breaker, **kwargs)
+        recognizer.base_url = self.server.base_url
+        return recognizer
+    
+    def test_open_circuit_skips_api(self):
+        """测试熔断后不再请求API，直接降级；探测成功后恢复"""
+        fallback = MockIntentRecognizer()
+        fallback.set_response("我想挂号", "缴费")
+        recognizer = self.make_recognizer(fallback_recognizer=fallback)
+        other = self.make_recognizer()
+        
+        self.server.statuses = [500, 500]
+        recognizer.recognize_intent("我想挂号", ["挂号", "缴费"])
+        other.recognize_intent("我想挂号", ["挂号", "缴费"])
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        
+        start = time.perf_counter()
+        result = recognizer.recognize_intent("我想挂号", ["挂号", "缴费"])
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertEqual(result.intent, "缴费")
+        self.assertEqual(recognizer.get_degraded_stats()['circuit_open'], 1)
+        self.assertEqual(other.recognize_intent("我要挂号", ["挂号"]).raw_response, "fallback_match: 挂号")
+        self.assertEqual(len(self.server.requests), 2)
+        
+        time.sleep(0.25)
+        self.assertEqual(recognizer.recognize_intent("我想挂号", ["挂号", "缴费"]).intent, "挂号")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(len(self.server.requests), 3)
+    
+    def test_rate_limit_not_counted(self):
+        """测试本地限流不计为失败"""
+        recognizer = self.make_recognizer(rate_limiter=TokenBucket(rate=0.01, capacity=1))
+        for _ in range(3):
+            recognizer.recognize_intent("我想挂号", ["挂号"])
+        self.assertEqual(self.breaker.get_stats()['failures'], 0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+    
+    def test_shared_by_default(self):
+        """测试未指定时所有识别器共享同一个熔断器"""
+        first = GeminiIntentRecognizer("test-key")
+        second = GeminiIntentRecognizer("test-key")
+        self.assertIs(first.circuit_breaker, second.circuit_breaker)
+        self.assertIs(first.circuit_breaker, get_circuit_breaker())
+    
+    def test_coalesced_failure_counted_once(self):
+        """测试合并的并发请求失败时熔断器只记录一次"""
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        client = AsyncGeminiClient("test-key", base_url=self.server.base_url, timeout=5, retry_delay=0.01)
+        recognizer = self.make_recognizer(async_client=client)
+        self.server.statuses = [500]
+        self.server.delay = 0.3
+        errors = []
+        
+        def call():
+            try:
+                recognizer._make_request("我想挂号")
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            client.close()
+        
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(client.coalesced, 4)
+        self.assertEqual(self.breaker.get_stats()['failures'], 1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+闭包编译后端测试
+验证预编译闭包与逐节点遍历AST的执行结果完全一致
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.compiler import compile_script
+from src.interpreter import Interpreter, InterpreterState
+from src.intent_recognizer import MockIntentRecognizer
+from benchmarks.fixtures import DeterministicServiceHandler, random_conversation
+from tests.stubs import run_script
+
+
+class TestExpressionSemantics(unittest.TestCase):
+    """表达式语义测试（两种后端结果一致）"""
+    
+    def assertSameResult(self, source: str, variables: dict = None):
+        tree_output, tree_context = run_script(source, 'tree', variables)
+        closure_output, closure_context = run_script(source, 'closure', variables)
+        self.assertEqual(closure_output, tree_output)
+        self.assertEqual(closure_context.variables, tree_context.variables)
+        return closure_output, closure_context
+    
+    def test_arithmetic(self):
+        """测试算术与除零"""
+        _, context = self.assertSameResult('''Step test
+    Set $a = 10 - 4 * 2
+    Set $b = $a / 0
+    Set $c = -$a
+    Exit''')
+        self.assertEqual(context.variables, {'a': 2, 'b': 0, 'c': -2})
+    
+    def test_string_concatenation(self):
+        """测试字符串与数字拼接"""
+        output, _ = self.assertSameResult('''Step test
+    Speak "共" + $n + "件，" + 1.5 + $missing
+    Exit''', {'n': 3})
+        self.assertEqual(output.message, '共3件，1.5')
+    
+    def test_logic_and_comparison(self):
+        """测试逻辑与比较运算"""
+        _, context = self.assertSameResult('''Step test
+    Set $a = 1 < 2 and 3 >= 3
+    Set $b = not $a or 2 == 3
+    Set $c = "x" != "y"
+    Exit''')
+        self.assertEqual(context.variables, {'a': True, 'b': False, 'c': True})
+    
+    def test_builtin_functions(self):
+        """测试内置函数"""
+        _, context = self.assertSameResult('''Step test
+    Set $a = len("挂号") + int("3")
+    Set $b = str(12) + float(1)
+    Exit''')
+        self.assertEqual(context.variables, {'a': 5, 'b': '121.0'})
+    
+    def test_while_loop(self):
+        """测试While循环"""
+        _, context = self.assertSameResult('''Step test
+    Set $i = 0
+    While $i < 5
+        Set $i = $i + 1
+    EndWhile
+    Exit''')
+        self.assertEqual(context.variables['i'], 5)
+    
+    def test_infinite_loop_guard(self):
+        """测试循环次数上限"""
+        source = '''Step test
+    While 1
+        Set $i = 1
+    EndWhile'''
+        for backend in Interpreter.BACKENDS:
+            with self.assertRaises(RuntimeError):
+                run_script(source, backend)
+    
+    def test_goto_inside_if(self):
+        """测试If中的Goto"""
+        output, _ = self.assertSameResult('''Step test
+    Speak "被丢弃的输出"
+    If $vip == 1
+        Goto vip
+    Else
+        Goto normal
+    EndIf
+
+Step vip
+    Speak "贵宾通道"
+    Exit
+
+Step normal
+    Speak "普通通道"
+    Exit''', {'vip': 1})
+        self.assertEqual(output.message, '贵宾通道')
+        self.assertEqual(output.state, InterpreterState.FINISHED)
+
+
+class TestCompiledScript(unittest.TestCase):
+    """编译结果测试"""
+    
+    def test_compiled_once_per_script(self):
+        """测试同一脚本只编译一次"""
+        script = parse('Step a\n    Speak "hi"\n    Listen 5, 30\n    Exit')
+        compiled = compile_script(script)
+        self.assertIs(compile_script(script), compiled)
+        self.assertIs(Interpreter(script)._compiled, compiled)
+        self.assertTrue(compiled['a'].has_listen)
+        # Listen / Exit 不生成闭包
+        self.assertEqual(len(compiled['a'].body), 1)
+    
+    def test_invalid_backend(self):
+        """测试非法后端"""
+        with self.assertRaises(ValueError):
+            Interpreter(parse('Step a\n    Exit'), backend='jit')
+
+
+class TestShippedScripts(unittest.TestCase):
+    """业务脚本等价性测试"""
+    
+    def assert_equivalent(self, name: str):
+        path = os.path.join(project_root, 'scripts', f'{name}.dsl')
+        with open(path, 'r', encoding='utf-8') as f:
+            script = parse(f.read())
+        
+        for seed in range(20):
+            transcripts = []
+            for backend in ('tree', 'closure'):
+                interpreter = Interpreter(script, MockIntentRecognizer(),
+                                          DeterministicServiceHandler(), backend=backend)
+                transcripts.append(random_conversation(interpreter, f's{seed}', seed))
+            self.assertEqual(transcripts[1], transcripts[0], f"{name} seed={seed}")
+    
+    def test_hospital(self):
+        """测试医院脚本"""
+        self.assert_equivalent('hospital')
+    
+    def test_restaurant(self):
+        """测试餐厅脚本"""
+        self.assert_equivalent('restaurant')
+    
+    def test_theater(self):
+        """测试剧院脚本"""
+        self.assert_equivalent('theater')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -6,6 +6,7 @@ DSL Agent 测试套件
 import sys
 import os
 import unittest
+import threading
 from io import StringIO
 
 # 添加项目路径
@@ -99,6 +100,49 @@ Speak "Hello"'''
         self.assertGreaterEqual(newline_count, 2)
 
 
+class TestRegexLexer(unittest.TestCase):
+    """正则扫描后端测试"""
+    
+    def assertSameTokens(self, source):
+        """两种后端产生的Token序列应完全一致"""
+        expected = Lexer(source).tokenize()
+        actual = Lexer(source, backend='regex').tokenize()
+        self.assertEqual(actual, expected)
+    
+    def test_shipped_scripts(self):
+        """测试三个业务脚本"""
+        scripts_dir = os.path.join(os.path.dirname(__file__), '..', 'scripts')
+        for name in ('hospital', 'restaurant', 'theater'):
+            with open(os.path.join(scripts_dir, f'{name}.dsl'), 'r', encoding='utf-8') as f:
+                self.assertSameTokens(f.read())
+    
+    def test_operators_and_numbers(self):
+        """测试操作符与数字"""
+        self.assertSameTokens('If $a >= 1.5 and $b != 2 or not $c <= 3\n    Set $x = -$y * (4 / 2)\nEndIf')
+    
+    def test_escapes_and_positions(self):
+        """测试转义字符与行列号"""
+        self.assertSameTokens('Speak "a\\"b\\n\\tc" + \'d\\\'e\'  # 注释\r\n\tExit')
+        self.assertSameTokens('Speak "跨行\\\n字符串" $v\nGoto next')
+    
+    def test_unterminated_string(self):
+        """测试未闭合字符串"""
+        with self.assertRaises(LexerError) as ctx:
+            Lexer('Step a\nSpeak "abc\nExit', backend='regex').tokenize()
+        self.assertEqual((ctx.exception.line, ctx.exception.column), (2, 7))
+    
+    def test_unknown_character(self):
+        """测试未知字符"""
+        with self.assertRaises(LexerError) as ctx:
+            Lexer('Set $a = 1 ! 2', backend='regex').tokenize()
+        self.assertEqual(ctx.exception.column, 12)
+    
+    def test_invalid_backend(self):
+        """测试非法后端"""
+        with self.assertRaises(ValueError):
+            Lexer('Step a', backend='fast')
+
+
 class TestParser(unittest.TestCase):
     """语法分析器测试"""
     
@@ -239,6 +283,72 @@ Step defaultHandler
         output = interpreter.process_input('test_session', '退出')
         
         self.assertEqual(output.state, InterpreterState.FINISHED)
+    
+    def test_shared_interpreter_sessions(self):
+        """测试多线程共享同一解释器的会话管理"""
+        script = parse(self.simple_script)
+        interpreter = Interpreter(script, MockIntentRecognizer())
+        errors = []
+        
+        def worker(worker_id):
+            try:
+                for i in range(50):
+                    session_id = f'w{worker_id}_{i}'
+                    interpreter.create_session(session_id, {'name': session_id})
+                    output = interpreter.start(session_id)
+                    self.assertIn(session_id, output.message)
+                    output = interpreter.process_input(session_id, '退出')
+                    self.assertEqual(output.state, InterpreterState.FINISHED)
+                    if i % 2:
+                        interpreter.remove_session(session_id)
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(interpreter.session_count(), 8 * 25)
+    
+    def test_long_goto_chain(self):
+        """测试长Goto链不受递归深度限制"""
+        count = 5000
+        lines = []
+        for i in range(count):
+            lines.append(f'Step s{i}\n    Set $n = $n + 1\n    Goto s{i + 1}\n')
+        lines.append(f'Step s{count}\n    Speak "完成" + $n\n    Exit\n')
+        script = parse('\n'.join(lines))
+        
+        for backend in Interpreter.BACKENDS:
+            interpreter = Interpreter(script, MockIntentRecognizer(),
+                                      backend=backend, max_step_hops=count)
+            interpreter.create_session('test', {'n': 0})
+            output = interpreter.start('test')
+            self.assertEqual(output.state, InterpreterState.FINISHED)
+            self.assertEqual(output.message, f'完成{count}')
+    
+    def test_goto_cycle(self):
+        """测试Goto成环时在跳转上限处干净地报错"""
+        script = parse('''Step a
+    Speak "a"
+    Goto b
+
+Step b
+    If 1 == 1
+        Goto a
+    EndIf''')
+        
+        for backend in Interpreter.BACKENDS:
+            interpreter = Interpreter(script, MockIntentRecognizer(),
+                                      backend=backend, max_step_hops=50)
+            context = interpreter.create_session('test')
+            output = interpreter.start('test')
+            self.assertEqual(output.state, InterpreterState.ERROR)
+            self.assertIn('50', output.message)
+            self.assertEqual(context.state, InterpreterState.ERROR)
 
 
 class TestMockIntentRecognizer(unittest.TestCase):
@@ -374,6 +484,7 @@ def run_tests():
     
     # 添加测试类
     suite.addTests(loader.loadTestsFromTestCase(TestLexer))
+    suite.addTests(loader.loadTestsFromTestCase(TestRegexLexer))
     suite.addTests(loader.loadTestsFromTestCase(TestParser))
     suite.addTests(loader.loadTestsFromTestCase(TestInterpreter))
     suite.addTests(loader.loadTestsFromTestCase(TestMockIntentRecognizer))
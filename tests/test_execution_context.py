@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+执行上下文测试
+测试变量槽位与溢出字典、字典视图兼容性、定长对话历史以及编译代码按槽位读写
+"""
+
+import sys
+import os
+import copy
+import json
+import pickle
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.linker import link_script, VariableLayout, UNSET
+from src.interpreter import Interpreter, ExecutionContext
+from src.intent_recognizer import MockIntentRecognizer
+
+
+SOURCE = '''Step welcome
+    Set $次数 = $次数 + 1
+    Speak $name + "，第" + $次数 + "次"
+    Listen 5, 30
+    Default welcome'''
+
+
+class TestVariables(unittest.TestCase):
+    """变量存储测试"""
+    
+    def setUp(self):
+        self.layout = VariableLayout(["a", "b", "a"])
+        self.context = ExecutionContext(layout=self.layout)
+    
+    def test_slots_and_extra(self):
+        """测试脚本变量存放在槽位，其他变量放入溢出字典"""
+        self.assertEqual(self.layout.names, ("a", "b"))
+        self.assertFalse(hasattr(self.context, '__dict__'))
+        
+        self.context.set_variable("b", 2)
+        self.assertEqual(self.context.values, [UNSET, 2])
+        self.assertIsNone(self.context.extra)
+        
+        self.context.set_variable("实体", "挂号")
+        self.assertEqual(self.context.extra, {"实体": "挂号"})
+        self.assertEqual(self.context.get_variable("实体"), "挂号")
+        self.assertIsNone(self.context.get_variable("a"))
+        self.assertEqual(self.context.get_variable("a", 0), 0)
+    
+    def test_mapping_view(self):
+        """测试variables视图与原字典行为一致"""
+        variables = self.context.variables
+        variables.update({"x": 1, "b": None, "a": "文本"})
+        self.assertEqual(variables, {"a": "文本", "b": None, "x": 1})
+        self.assertEqual(list(variables), ["a", "b", "x"])
+        self.assertEqual(len(variables), 3)
+        self.assertIn("b", variables)
+        
+        del variables["a"]
+        del variables["x"]
+        self.assertNotIn("a", variables)
+        with self.assertRaises(KeyError):
+            del variables["a"]
+        with self.assertRaises(KeyError):
+            variables["x"]
+        self.assertEqual(dict(variables), {"b": None})
+        
+        self.context.variables = {"a": 1, "y": 2}
+        self.assertEqual(self.context.values, [1, UNSET])
+        self.assertEqual(self.context.variables, {"a": 1, "y": 2})
+    
+    def test_relayout(self):
+        """测试换用槽位表后变量保持不变"""
+        self.context.variables.update({"a": 1, "c": 3})
+        self.context.relayout(VariableLayout(["c"]))
+        self.assertEqual(self.context.values, [3])
+        self.assertEqual(self.context.extra, {"a": 1})
+        self.assertEqual(self.context.variables, {"a": 1, "c": 3})
+    
+    def test_unset_identity(self):
+        """测试未赋值标记复制、序列化后仍是同一个对象"""
+        self.assertIs(copy.deepcopy(UNSET), UNSET)
+        self.assertIs(pickle.loads(pickle.dumps(UNSET)), UNSET)
+
+
+class TestHistory(unittest.TestCase):
+    """对话历史测试"""
+    
+    def test_ring_buffer(self):
+        """测试超出容量时覆盖最早的记录，读取顺序不变"""
+        context = ExecutionContext(history_size=3)
+        for i in range(7):
+            context.add_to_history("user", f"消息{i}")
+        self.assertEqual(len(context.history), 3)
+        self.assertEqual([content for _, content, _ in context.history_entries()],
+                         ["消息4", "消息5", "消息6"])
+        self.assertEqual([entry["content"] for entry in context.recent_history(2)], ["消息5", "消息6"])
+        self.assertEqual(context.conversation_history[0]["role"], "user")
+        self.assertEqual(tuple(context.recent_history(10)), context.conversation_history)
+        with self.assertRaises(AttributeError):
+            context.conversation_history.append({"role": "user", "content": "丢失"})
+    
+    def test_initial_history(self):
+        """测试构造时传入字典形式的历史"""
+        history = [{"role": "assistant", "content": "您好", "timestamp": 1.0}]
+        context = ExecutionContext(conversation_history=history)
+        self.assertEqual(context.history, [("assistant", "您好", 1.0)])
+        self.assertEqual(list(context.conversation_history), history)
+        
+        context = ExecutionContext(history_size=0)
+        context.add_to_history("user", "你好")
+        self.assertEqual(context.conversation_history, ())
+    
+    def test_session_history_bounded(self):
+        """测试长对话的会话历史有上限"""
+        interpreter = Interpreter(parse(SOURCE), MockIntentRecognizer())
+        context = interpreter.create_session("s1", {"次数": 0})
+        context.history_size = 4
+        interpreter.start("s1")
+        for _ in range(5):
+            interpreter.process_input("s1", "随便说说")
+        self.assertEqual(len(context.history), 4)
+        self.assertEqual(context.conversation_history[-1]["content"], "，第6次")
+    
+    def test_recognizer_context_is_plain(self):
+        """测试传给意图识别器的上下文是普通字典，可直接序列化"""
+        contexts = []
+        
+        class RecordingRecognizer(MockIntentRecognizer):
+            def recognize_intent(self, user_input, available_intents, context=None):
+                contexts.append(json.dumps(context, ensure_ascii=False))
+                return super().recognize_intent(user_input, available_intents, context)
+        
+        interpreter = Interpreter(parse(SOURCE), RecordingRecognizer())
+        interpreter.create_session("s1", {"name": "张三", "次数": 0})
+        interpreter.start("s1")
+        interpreter.process_input("s1", "随便说说")
+        self.assertIn('"name": "张三"', contexts[0])
+
+
+class TestSlotExecution(unittest.TestCase):
+    """按槽位执行测试"""
+    
+    def test_compiled_uses_slots(self):
+        """测试会话按脚本布局分配槽位，两种后端结果一致"""
+        for backend in Interpreter.BACKENDS:
+            script = parse(SOURCE)
+            interpreter = Interpreter(script, MockIntentRecognizer(), backend=backend)
+            context = interpreter.create_session("s1", {"name": "张三", "次数": 0, "来源": "电话"})
+            self.assertIs(context.layout, link_script(script).layout)
+            self.assertEqual(context.extra, {"来源": "电话"})
+            
+            self.assertEqual(interpreter.start("s1").message, "张三，第1次")
+            self.assertEqual(interpreter.process_input("s1", "随便说说").message, "张三，第2次")
+            self.assertEqual(context.values[context.layout.slots["次数"]], 2)
+    
+    def test_foreign_context(self):
+        """测试其他布局的上下文在执行前换用当前脚本的布局"""
+        interpreter = Interpreter(parse(SOURCE), MockIntentRecognizer())
+        context = ExecutionContext(variables={"name": "李四", "次数": 4}, current_step="welcome",
+                                   session_id="s1")
+        interpreter.contexts.put("s1", context)
+        self.assertEqual(interpreter.start("s1").message, "李四，第5次")
+        self.assertIs(context.layout, interpreter._linked.layout)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+意图缓存测试
+测试缓存键归一化、LRU与TTL、持久化以及Gemini识别器接入
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.intent_cache import IntentCache, normalize_input
+from src.intent_recognizer import GeminiIntentRecognizer, IntentResult, LLMError
+from tests.stubs import FakeClock
+
+
+def make_result(intent: str) -> IntentResult:
+    return IntentResult(intent=intent, confidence=0.9, entities={"数量": 2}, raw_response="{}")
+
+
+class TestIntentCache(unittest.TestCase):
+    """意图缓存测试"""
+    
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.cache = IntentCache(max_size=3, ttl=60, clock=self.clock)
+    
+    def test_normalize_input(self):
+        """测试输入归一化"""
+        self.assertEqual(normalize_input("  挂号。"), "挂号")
+        self.assertEqual(normalize_input("ＯＫ  Sure!"), "ok sure")
+    
+    def test_key_ignores_history_and_intent_order(self):
+        """测试缓存键不受历史和意图顺序影响"""
+        key1 = self.cache.make_key("挂号", ["挂号", "缴费"],
+                                   {"variables": {"name": "a"}, "history": [{"content": "1"}]})
+        key2 = self.cache.make_key(" 挂号！", ["缴费", "挂号", "缴费"],
+                                   {"variables": {"name": "a"}, "history": []})
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, self.cache.make_key("挂号", ["挂号"]))
+    
+    def test_prompt_variables_in_key(self):
+        """测试进入提示词的变量及其值参与缓存键，步骤未引用的变量不参与"""
+        def key(variables, step_variables=("stage",)):
+            return self.cache.make_key("好的", ["确认"],
+                                       {"variables": variables, "step_variables": step_variables})
+        self.assertNotEqual(key({"stage": 1, "name": "a"}), key({"stage": 2, "name": "a"}))
+        self.assertEqual(key({"stage": 1, "name": "a"}), key({"stage": 1, "name": "b"}))
+        self.assertNotEqual(key({"stage": 1}), key({}))
+        
+        # 没有给出步骤变量时提示词包含全部变量
+        self.assertNotEqual(key({"stage": 1, "name": "a"}, None), key({"stage": 1, "name": "b"}, None))
+    
+    def test_lru_and_ttl(self):
+        """测试容量淘汰与过期"""
+        for name in ("a", "b", "c"):
+            self.cache.put(name, make_result(name))
+        self.cache.get("a")
+        self.cache.put("d", make_result("d"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a").intent, "a")
+        
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("a"))
+        
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 1)
+    
+    def test_hit_returns_copy(self):
+        """测试命中结果的实体字典不与缓存共享"""
+        self.cache.put("a", make_result("a"))
+        self.cache.get("a").entities["数量"] = 5
+        self.assertEqual(self.cache.get("a").entities, {"数量": 2})
+    
+    def test_persistence(self):
+        """测试写入文件后重新加载"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "intent_cache.json")
+            cache = IntentCache(ttl=60, persist_path=path, clock=self.clock)
+            cache.put("a", make_result("挂号"))
+            cache.put("b", make_result("缴费"))
+            self.clock.now += 30
+            cache.put("c", make_result("取药"))
+            cache.save()
+            
+            self.clock.now += 40
+            restored = IntentCache(ttl=60, persist_path=path, clock=self.clock)
+            self.assertEqual(len(restored), 1)
+            self.assertEqual(restored.get("c"), make_result("取药"))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class TestGeminiCache(unittest.TestCase):
+    """Gemini识别器缓存接入测试"""
+    
+    def setUp(self):
+        self.recognizer = GeminiIntentRecognizer("test-key", cache=IntentCache())
+        self.calls = 0
+    
+    def test_repeated_input_hits_cache(self):
+        """测试重复输入只请求一次API"""
+        def fake_request(prompt, max_retries=3):
+            self.calls += 1
+            return '{"intent": "挂号", "confidence": 0.95}'
+        self.recognizer._make_request = fake_request
+        
+        for text in ("挂号", "挂号。", " 挂号 "):
+            result = self.recognizer.recognize_intent(
+                text, ["挂号", "缴费"], {"variables": {}, "history": [{"content": text}]})
+            self.assertEqual(result.intent, "挂号")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.recognizer.cache.hits, 2)
+    
+    def test_prompt_variable_change_misses(self):
+        """测试提示词中的变量取值不同时不复用缓存结果"""
+        prompts = []
+        def fake_request(prompt, max_retries=3):
+            prompts.append(prompt)
+            return '{"intent": "确认", "confidence": 0.9}'
+        self.recognizer._make_request = fake_request
+        
+        for stage, other in ((1, "a"), (2, "a"), (1, "b")):
+            self.recognizer.recognize_intent(
+                "好的", ["确认"],
+                {"variables": {"stage": stage, "other": other}, "step_variables": ("stage",)})
+        self.assertEqual(len(prompts), 2)
+        self.assertIn('"stage":2', prompts[1])
+        self.assertEqual(self.recognizer.cache.hits, 1)
+    
+    def test_failure_not_cached(self):
+        """测试API失败时的回退结果不缓存"""
+        def failing_request(prompt, max_retries=3):
+            self.calls += 1
+            raise LLMError("API请求超时")
+        self.recognizer._make_request = failing_request
+        
+        self.recognizer.recognize_intent("挂号", ["挂号"])
+        self.recognizer.recognize_intent("挂号", ["挂号"])
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(len(self.recognizer.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+步骤图链接测试
+测试跳转目标解析为下标、缺失目标的校验，以及解释器沿链接边执行
+"""
+
+import sys
+import os
+import pickle
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.lexer import Lexer
+from src.parser import Parser, parse
+from src.linker import link_script
+from src.interpreter import Interpreter, InterpreterState
+from src.intent_recognizer import MockIntentRecognizer
+
+
+SOURCE = '''Step welcome
+    Speak "请问需要什么服务"
+    Listen 5, 30
+    Branch "挂号", register
+    Branch "缴费", payment
+    Silence welcome
+    Default help
+
+Step help
+    If $次数 > 1
+        Goto register
+    EndIf
+    Speak "可以说挂号或缴费"
+    Listen 5, 30
+    Default welcome
+
+Step register
+    Speak "挂号成功"
+    Exit'''
+
+
+def parse_with_errors(source: str):
+    parser = Parser(Lexer(source).tokenize())
+    return parser.parse(), parser.errors
+
+
+class TestLinker(unittest.TestCase):
+    """链接测试"""
+    
+    def test_targets_resolved(self):
+        """测试所有跳转目标解析为下标"""
+        script, errors = parse_with_errors(SOURCE.replace('"缴费", payment', '"缴费", register'))
+        self.assertEqual(errors, [])
+        linked = link_script(script)
+        self.assertIs(link_script(script), linked)
+        self.assertEqual([node.name for node in linked.steps], ["welcome", "help", "register"])
+        self.assertEqual(linked.entry, 0)
+        
+        welcome = linked.steps[0]
+        self.assertIs(welcome.step, script.steps["welcome"])
+        self.assertEqual(welcome.branches, (("挂号", 2), ("缴费", 2)))
+        self.assertEqual((welcome.silence, welcome.default), (0, 1))
+        self.assertIsNone(linked.steps[2].default)
+    
+    def test_missing_targets_reported(self):
+        """测试缺失的目标步骤在解析时报告，并指向所在步骤"""
+        source = SOURCE.replace("Goto register", "Goto regster")
+        script, errors = parse_with_errors(source)
+        messages = [str(e) for e in errors]
+        self.assertEqual(len(messages), 2)
+        self.assertIn("Branch 目标步骤 'payment' 不存在", messages[0])
+        self.assertIn("(行 1,", messages[0])
+        self.assertIn("步骤 'help' 的 Goto 目标步骤 'regster' 不存在", messages[1])
+        self.assertIn("(行 9,", messages[1])
+        
+        linked = link_script(script)
+        self.assertIsNone(linked.steps[linked.index["payment"]].step)
+    
+    def test_dispatch_table(self):
+        """测试意图分发表：重复意图以第一个分支为准，可用意图去重"""
+        script = parse('''Step menu
+    Listen 5, 30
+    Branch "点餐", order
+    Branch "菜单", order
+    Branch "点餐", menu
+    Branch "结账", pay
+
+Step order
+    Exit
+
+Step pay
+    Exit''')
+        menu = link_script(script).steps[0]
+        self.assertEqual(menu.dispatch, {"点餐": 1, "菜单": 1, "结账": 2})
+        self.assertEqual(menu.intents, ("点餐", "菜单", "结账"))
+        
+        interpreter = Interpreter(script, MockIntentRecognizer())
+        interpreter.create_session("s1")
+        self.assertIs(interpreter.start("s1").available_intents, menu.intents)
+        self.assertEqual(interpreter.process_input("s1", "点餐").state, InterpreterState.FINISHED)
+        self.assertEqual(interpreter.get_session("s1").current_step, "order")
+    
+    def test_pickle_drops_links(self):
+        """测试序列化时不保存链接结果，加载后重新链接"""
+        script = parse(SOURCE)
+        link_script(script)
+        restored = pickle.loads(pickle.dumps(script))
+        self.assertNotIn('_linked', restored.__dict__)
+        self.assertEqual(link_script(restored).steps[0].branches, link_script(script).steps[0].branches)
+
+
+class TestLinkedExecution(unittest.TestCase):
+    """解释器沿链接边执行测试"""
+    
+    def test_no_name_lookup(self):
+        """测试对话过程中不再按名称查找步骤"""
+        for backend in Interpreter.BACKENDS:
+            script = parse(SOURCE)
+            interpreter = Interpreter(script, MockIntentRecognizer(), backend=backend)
+            script.get_step = None
+            script.get_entry_step = None
+            
+            interpreter.create_session("s1", {"次数": 2})
+            interpreter.start("s1")
+            # 无法识别 -> Default help -> Goto register
+            output = interpreter.process_input("s1", "随便说说")
+            self.assertEqual(output.message, "挂号成功")
+            self.assertEqual(interpreter.get_session("s1").current_step, "register")
+    
+    def test_missing_target_at_runtime(self):
+        """测试跳转到缺失的步骤时返回错误"""
+        for backend in Interpreter.BACKENDS:
+            interpreter = Interpreter(parse(SOURCE), MockIntentRecognizer(), backend=backend)
+            interpreter.create_session("s1")
+            interpreter.start("s1")
+            output = interpreter.process_input("s1", "我要缴费")
+            self.assertEqual(output.state, InterpreterState.ERROR)
+            self.assertIn("payment", output.message)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -4,9 +4,13 @@
 测试关键词匹配、模糊匹配、相似度计算等功能
 """
 
+import re
 import sys
 import os
+import random
 import unittest
+from io import StringIO
+from contextlib import redirect_stdout
 
 # 添加项目路径
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -14,9 +18,13 @@ sys.path.insert(0, project_root)
 
 from src.local_intent_recognizer import (
     LocalIntentRecognizer, IntentPattern, RecognitionResult,
-    TextPreprocessor, SimilarityCalculator, TFIDFVectorizer,
-    IntentLibrary, create_local_recognizer, LocalIntentRecognizerAdapter
+    TextPreprocessor, SimilarityCalculator, TFIDFVectorizer, AhoCorasickAutomaton,
+    ExampleIndex, IntentLibrary, create_local_recognizer, LocalIntentRecognizerAdapter
 )
+from benchmarks.fixtures import intent_library_inputs
+
+ALL_INTENTS = [IntentLibrary.HOSPITAL_INTENTS, IntentLibrary.RESTAURANT_INTENTS,
+               IntentLibrary.THEATER_INTENTS, IntentLibrary.COMMON_INTENTS]
 
 
 class TestTextPreprocessor(unittest.TestCase):
@@ -70,6 +78,17 @@ class TestTextPreprocessor(unittest.TestCase):
         keywords = TextPreprocessor.extract_keywords(text)
         # 应该去除停用词"我"、"想"
         self.assertNotIn("我", keywords)
+    
+    def test_analyze_matches_separate_calls(self):
+        """测试一次性分析结果与分别调用各预处理方法一致"""
+        for text in ["我想挂号看病", "ＯＫ, Sure！我要 Pay 100元", "", "的了吗"]:
+            analyzed = TextPreprocessor.analyze(text)
+            processed = TextPreprocessor.preprocess(text)
+            self.assertEqual(analyzed.text, processed)
+            self.assertEqual(analyzed.tokens, TextPreprocessor.tokenize(processed.lower()))
+            self.assertEqual(analyzed.keywords, TextPreprocessor.extract_keywords(processed))
+            self.assertEqual(analyzed.keyword_set, set(analyzed.keywords))
+            self.assertEqual(analyzed.chars, set(''.join(analyzed.tokens)))
 
 
 class TestSimilarityCalculator(unittest.TestCase):
@@ -90,6 +109,50 @@ class TestSimilarityCalculator(unittest.TestCase):
         distance = SimilarityCalculator.levenshtein_distance("hello", "")
         self.assertEqual(distance, 5)
     
+    def test_bounded_levenshtein_matches_reference(self):
+        """测试位并行编辑距离与参考实现一致"""
+        rng = random.Random(0)
+        for _ in range(2000):
+            s1 = ''.join(rng.choice('ab挂号c') for _ in range(rng.randint(0, 8)))
+            s2 = ''.join(rng.choice('ab挂号c') for _ in range(rng.randint(0, 8)))
+            max_distance = rng.randint(0, 9)
+            expected = SimilarityCalculator.levenshtein_distance(s1, s2)
+            self.assertEqual(
+                SimilarityCalculator.bounded_levenshtein(s1, s2, max_distance),
+                min(expected, max_distance + 1),
+                (s1, s2, max_distance)
+            )
+    
+    def test_bounded_levenshtein_long_strings(self):
+        """测试超过64个字符的字符串"""
+        rng = random.Random(1)
+        for _ in range(50):
+            s1 = ''.join(rng.choice('ab') for _ in range(rng.randint(60, 100)))
+            s2 = ''.join(rng.choice('ab') for _ in range(rng.randint(60, 100)))
+            expected = SimilarityCalculator.levenshtein_distance(s1, s2)
+            self.assertEqual(SimilarityCalculator.bounded_levenshtein(s1, s2, 100), expected)
+    
+    def test_is_similar_matches_threshold(self):
+        """测试提前剪枝的相似度判断与完整计算后比较阈值一致"""
+        rng = random.Random(2)
+        thresholds = [0.0, 0.25, 1 / 3, 0.5, 0.6, 2 / 3, 0.7, 0.75, 0.8, 1.0, 1.5]
+        for _ in range(2000):
+            s1 = ''.join(rng.choice('abc挂') for _ in range(rng.randint(0, 7)))
+            s2 = ''.join(rng.choice('abc挂') for _ in range(rng.randint(0, 7)))
+            for threshold in thresholds:
+                self.assertEqual(
+                    SimilarityCalculator.is_similar(s1, s2, threshold),
+                    SimilarityCalculator.edit_distance_similarity(s1, s2) >= threshold,
+                    (s1, s2, threshold)
+                )
+    
+    def test_max_distance_for(self):
+        """测试由阈值换算的最大编辑距离"""
+        self.assertEqual(SimilarityCalculator.max_distance_for(2, 2, 0.6), 0)
+        self.assertEqual(SimilarityCalculator.max_distance_for(3, 2, 0.6), 1)
+        self.assertEqual(SimilarityCalculator.max_distance_for(5, 4, 0.6), 2)
+        self.assertEqual(SimilarityCalculator.max_distance_for(5, 5, 1.5), -1)
+    
     def test_edit_distance_similarity_identical(self):
         """测试相同字符串的相似度"""
         similarity = SimilarityCalculator.edit_distance_similarity("挂号", "挂号")
@@ -169,6 +232,69 @@ class TestTFIDFVectorizer(unittest.TestCase):
         self.assertEqual(vector, {})
 
 
+class TestAhoCorasickAutomaton(unittest.TestCase):
+    """多模式匹配自动机测试"""
+    
+    def test_overlapping_patterns(self):
+        """测试重叠和嵌套的模式串"""
+        automaton = AhoCorasickAutomaton(["he", "she", "his", "hers", "挂号", "号"])
+        self.assertEqual(automaton.find_all("ushers"), {"he", "she", "hers"})
+        self.assertEqual(automaton.find_all("我想挂号"), {"挂号", "号"})
+        self.assertEqual(automaton.find_all("hi"), set())
+    
+    def test_empty_pattern(self):
+        """测试空模式串在任何文本中都出现"""
+        automaton = AhoCorasickAutomaton(["", "ab"])
+        self.assertEqual(automaton.find_all(""), {""})
+        self.assertEqual(automaton.find_all("xab"), {"", "ab"})
+    
+    def test_matches_substring_check(self):
+        """测试结果与逐个子串判断一致"""
+        patterns = [kw.lower() for intents in ALL_INTENTS
+                    for config in intents.values() for kw in config['keywords']]
+        automaton = AhoCorasickAutomaton(patterns)
+        for text in intent_library_inputs(ALL_INTENTS, count=100):
+            expected = {p for p in patterns if p in text.lower()}
+            self.assertEqual(automaton.find_all(text.lower()), expected)
+
+
+class TestExampleIndex(unittest.TestCase):
+    """示例倒排索引测试"""
+    
+    def test_scores(self):
+        """测试只返回有公共关键词的意图，空输入匹配空示例"""
+        index = ExampleIndex()
+        index.fit({
+            "挂号": [frozenset({"挂", "号"}), frozenset({"预", "约"})],
+            "确认": [frozenset({"确", "认"}), frozenset()],
+            "缴费": [],
+        })
+        self.assertEqual(index.scores(frozenset({"挂", "号"})), {"挂号": 1.0})
+        self.assertEqual(index.scores(frozenset({"挂", "认"})), {"挂号": 1 / 3, "确认": 1 / 3})
+        self.assertEqual(index.scores(frozenset({"药"})), {})
+        self.assertEqual(index.scores(frozenset()), {"确认": 1.0})
+    
+    def test_large_library_matches_full_scan(self):
+        """测试大量示例时与逐个示例计算Jaccard相似度的结果一致"""
+        rng = random.Random(0)
+        pieces = intent_library_inputs(ALL_INTENTS, count=0)
+        recognizer = LocalIntentRecognizer()
+        recognizer.add_intents_from_dict(IntentLibrary.COMMON_INTENTS)
+        for number in range(100):
+            examples = [''.join(rng.sample(pieces, rng.randint(1, 3))) for _ in range(30)]
+            examples.append(rng.choice(["", "的了", "请问"]))
+            recognizer.add_intent(IntentPattern(intent=f"意图{number}", examples=examples))
+        recognizer.train()
+        
+        for text in intent_library_inputs(ALL_INTENTS, seed=1, count=100) + ["的", "呀呀"]:
+            analyzed = TextPreprocessor.analyze(text)
+            scores = recognizer._example_index.scores(analyzed.keyword_set)
+            for intent, pattern in recognizer.intent_patterns.items():
+                self.assertEqual(scores.get(intent, 0.0),
+                                 recognizer._example_similarity(analyzed.text, pattern),
+                                 (text, intent))
+
+
 class TestLocalIntentRecognizer(unittest.TestCase):
     """本地意图识别器测试"""
     
@@ -237,6 +363,178 @@ class TestLocalIntentRecognizer(unittest.TestCase):
         result = self.recognizer.recognize("我想挂号", ["挂号", "缴费"])
         self.assertGreaterEqual(result.confidence, 0)
         self.assertLessEqual(result.confidence, 1)
+    
+    def test_fuzzy_match_matches_reference(self):
+        """测试模糊匹配与逐窗口完整计算相似度的结果一致"""
+        def reference(keyword, text, threshold):
+            tokens = TextPreprocessor.tokenize(text)
+            for i in range(len(tokens)):
+                for j in range(i + 1, min(i + len(keyword) + 2, len(tokens) + 1)):
+                    segment = ''.join(tokens[i:j])
+                    if SimilarityCalculator.edit_distance_similarity(keyword, segment) >= threshold:
+                        return True
+            return False
+        
+        recognizer = create_local_recognizer()
+        keywords = sorted({kw.lower() for p in recognizer.intent_patterns.values() for kw in p.keywords})
+        for text in intent_library_inputs(ALL_INTENTS, count=50)[::3]:
+            processed = TextPreprocessor.preprocess(text)
+            for keyword in keywords:
+                self.assertEqual(
+                    recognizer._fuzzy_match(keyword, processed),
+                    reference(keyword, processed, recognizer.config['fuzzy_threshold']),
+                    (keyword, text)
+                )
+    
+    def test_similarity_scores_match_reference(self):
+        """测试矩阵批量计算的相似度与逐个意图计算一致"""
+        recognizer = create_local_recognizer()
+        intents = list(recognizer.intent_patterns)
+        for text in intent_library_inputs(ALL_INTENTS, count=100):
+            processed = TextPreprocessor.preprocess(text)
+            scores = recognizer._similarity_scores(processed, intents)
+            for intent in intents:
+                self.assertAlmostEqual(scores[intent],
+                                       recognizer._similarity_match(processed, intent),
+                                       places=12, msg=(text, intent))
+    
+    def test_similarity_scores_without_matrix(self):
+        """测试未构建矩阵（未安装NumPy）时回退到逐个计算"""
+        recognizer = create_local_recognizer("hospital")
+        recognizer._intent_matrix = None
+        scores = recognizer._similarity_scores("我想挂号", ["挂号", "缴费"])
+        self.assertEqual(scores, {
+            "挂号": recognizer._similarity_match("我想挂号", "挂号"),
+            "缴费": recognizer._similarity_match("我想挂号", "缴费"),
+        })
+        self.assertEqual(recognizer.recognize("我想挂号", ["挂号", "缴费"]).intent, "挂号")
+    
+    def test_invalid_pattern_reported_at_train(self):
+        """测试无效正则在训练时报告，并仍计入得分分母"""
+        recognizer = LocalIntentRecognizer()
+        recognizer.add_intent(IntentPattern(intent="挂号", keywords=["挂号"],
+                                            patterns=[r"挂(号", r"挂.*号"]))
+        output = StringIO()
+        with redirect_stdout(output):
+            recognizer.train()
+        self.assertIn("挂(号", output.getvalue())
+        
+        with redirect_stdout(output):
+            score, matched = recognizer._pattern_match("我想挂个号", recognizer.intent_patterns["挂号"])
+        self.assertEqual((score, matched), (0.5, [r"挂.*号"]))
+        self.assertEqual(output.getvalue().count("挂(号"), 1)
+    
+    def test_merged_patterns_match_reference(self):
+        """测试合并扫描与逐个re.search的结果一致"""
+        recognizer = LocalIntentRecognizer()
+        recognizer.add_intents_from_dict(IntentLibrary.HOSPITAL_INTENTS)
+        recognizer.add_intent(IntentPattern(intent="重复", patterns=[r"(a)\1", r"^b", r"a"]))
+        recognizer.add_intent(IntentPattern(intent="标志", patterns=[r"b", r"(?i)c"]))
+        recognizer.train()
+        self.assertIsNone(recognizer._compiled_patterns["重复"].merged)
+        self.assertIsNone(recognizer._compiled_patterns["标志"].merged)
+        self.assertIsNotNone(recognizer._compiled_patterns["缴费"].merged)
+        
+        for text in intent_library_inputs(ALL_INTENTS, count=100) + ["aa", "ba", "Ca", "bc"]:
+            for pattern in recognizer.intent_patterns.values():
+                expected = [p for p in pattern.patterns if re.search(p, text, re.IGNORECASE)]
+                score, matched = recognizer._pattern_match(text, pattern)
+                self.assertEqual(matched, expected, (text, pattern.intent))
+                self.assertEqual(score, len(expected) / len(pattern.patterns))
+    
+    def test_scorers_with_analyzed_text(self):
+        """测试各评分方法复用分析结果时与现场预处理的结果一致"""
+        recognizer = create_local_recognizer()
+        intents = list(recognizer.intent_patterns)
+        for text in intent_library_inputs(ALL_INTENTS, count=100):
+            analyzed = TextPreprocessor.analyze(text)
+            processed = analyzed.text
+            hits = recognizer._keyword_automaton.find_all(analyzed.lower)
+            self.assertEqual(recognizer._similarity_scores(processed, intents, analyzed),
+                             recognizer._similarity_scores(processed, intents))
+            for pattern in recognizer.intent_patterns.values():
+                self.assertEqual(
+                    recognizer._keyword_match(processed, pattern, hits, analyzed),
+                    recognizer._keyword_match(processed, pattern),
+                    (text, pattern.intent)
+                )
+                self.assertEqual(
+                    recognizer._example_similarity(processed, pattern, analyzed),
+                    recognizer._example_similarity(processed, pattern),
+                    (text, pattern.intent)
+                )
+    
+    def test_views_shared_by_intent_set(self):
+        """测试相同意图集合（顺序、重复不同）共用一个视图，未知意图被忽略"""
+        view = self.recognizer._get_view(["确认", "挂号"])
+        self.assertIs(self.recognizer._get_view(["挂号", "确认", "挂号"]), view)
+        self.assertEqual(list(view.candidates), ["挂号", "确认"])
+        self.assertEqual(self.recognizer._get_view(None).candidates, self.recognizer.intent_patterns)
+        self.assertEqual(self.recognizer._get_view(["未知"]).candidates, {})
+        self.assertEqual(view.automaton.find_all("我想挂号交钱"), {"挂号"})
+    
+    def test_views_bounded_and_reset_on_train(self):
+        """测试视图缓存容量上限，以及添加意图后重新构建"""
+        self.recognizer.max_views = 2
+        for intents in (["挂号"], ["缴费"], ["确认"]):
+            self.recognizer._get_view(intents)
+        self.assertEqual(len(self.recognizer._views), 2)
+        
+        self.recognizer.add_intent(IntentPattern(intent="取药", keywords=["取药"]))
+        self.assertEqual(self.recognizer.recognize("取药", ["取药", "缴费"]).intent, "取药")
+        self.assertEqual(len(self.recognizer._views), 1)
+    
+    def test_recognize_with_views_matches_full_candidates(self):
+        """测试按视图识别与在全部意图上识别后再筛选候选的得分一致"""
+        recognizer = create_local_recognizer()
+        names = list(recognizer.intent_patterns)
+        rng = random.Random(0)
+        for text in intent_library_inputs(ALL_INTENTS, count=50):
+            available = rng.sample(names, 4)
+            analyzed = TextPreprocessor.analyze(text)
+            view = recognizer._get_view(available)
+            full = recognizer._similarity_scores(analyzed.text, names, analyzed)
+            scores = recognizer._similarity_scores(analyzed.text, list(view.candidates), analyzed, view)
+            for intent in view.candidates:
+                self.assertAlmostEqual(scores[intent], full[intent], places=12)
+            hits = recognizer._keyword_automaton.find_all(analyzed.lower)
+            view_hits = view.automaton.find_all(analyzed.lower)
+            for intent, pattern in view.candidates.items():
+                self.assertEqual(recognizer._keyword_match(analyzed.text, pattern, view_hits, analyzed),
+                                 recognizer._keyword_match(analyzed.text, pattern, hits, analyzed))
+    
+    def test_recognize_batch_matches_recognize(self):
+        """测试批量识别与逐条识别的结果一致"""
+        recognizer = create_local_recognizer()
+        names = list(recognizer.intent_patterns)
+        rng = random.Random(0)
+        texts = intent_library_inputs(ALL_INTENTS, count=100) + ["", "  "]
+        available = [rng.choice([None, ["挂号", "缴费"], ["未知"], rng.sample(names, 4)])
+                     for _ in texts]
+        
+        for expected, result in zip([recognizer.recognize(t, a) for t, a in zip(texts, available)],
+                                    recognizer.recognize_batch(texts, available)):
+            self.assertEqual((result.intent, result.matched_keywords, result.match_strategy),
+                             (expected.intent, expected.matched_keywords, expected.match_strategy))
+            self.assertAlmostEqual(result.confidence, expected.confidence, places=12)
+        
+        self.assertEqual([r.intent for r in recognizer.recognize_batch(["我想挂号", "买单"])],
+                         [recognizer.recognize("我想挂号").intent, recognizer.recognize("买单").intent])
+        with self.assertRaises(ValueError):
+            recognizer.recognize_batch(["挂号"], [])
+    
+    def test_keyword_match_with_automaton(self):
+        """测试自动机命中集合与逐个关键词判断的结果一致"""
+        recognizer = create_local_recognizer()
+        for text in intent_library_inputs(ALL_INTENTS, count=100):
+            processed = TextPreprocessor.preprocess(text)
+            hits = recognizer._keyword_automaton.find_all(processed.lower())
+            for pattern in recognizer.intent_patterns.values():
+                self.assertEqual(
+                    recognizer._keyword_match(processed, pattern, hits),
+                    recognizer._keyword_match(processed, pattern),
+                    (text, pattern.intent)
+                )
 
 
 class TestIntentLibrary(unittest.TestCase):
@@ -415,6 +713,8 @@ def main():
     suite.addTests(loader.loadTestsFromTestCase(TestTextPreprocessor))
     suite.addTests(loader.loadTestsFromTestCase(TestSimilarityCalculator))
     suite.addTests(loader.loadTestsFromTestCase(TestTFIDFVectorizer))
+    suite.addTests(loader.loadTestsFromTestCase(TestAhoCorasickAutomaton))
+    suite.addTests(loader.loadTestsFromTestCase(TestExampleIndex))
     suite.addTests(loader.loadTestsFromTestCase(TestLocalIntentRecognizer))
     suite.addTests(loader.loadTestsFromTestCase(TestIntentLibrary))
     suite.addTests(loader.loadTestsFromTestCase(TestCreateLocalRecognizer))
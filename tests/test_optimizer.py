@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+表达式优化测试
+测试常量折叠、拼接模板，以及优化后与逐节点求值的结果一致
+"""
+
+import sys
+import os
+import copy
+import random
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.ast_nodes import Variable, BinaryOp, StringLiteral
+from src.optimizer import Constant, Template, optimize_expression
+from src.compiler import compile_script
+from src.linker import link_script
+from src.interpreter import Interpreter, ExecutionContext
+
+
+def expression(source: str):
+    """解析 Set $r = <source> 中的表达式"""
+    return parse(f'Step t\n    Set $r = {source}\n    Exit').steps['t'].statements[0].expression
+
+
+class TestOptimizeExpression(unittest.TestCase):
+    """优化结果测试"""
+    
+    def test_constant_folding(self):
+        """测试常量子表达式在编译期求值"""
+        self.assertEqual(optimize_expression(expression('1 + 2 * 3')), Constant(7))
+        self.assertEqual(optimize_expression(expression('10 / 0')), Constant(0))
+        self.assertEqual(optimize_expression(expression('not (1 < 2)')), Constant(False))
+        self.assertEqual(optimize_expression(expression('"a" + 1 + 2')), Constant("a12"))
+        self.assertEqual(optimize_expression(expression('$x * (2 + 3)')),
+                         BinaryOp(Variable('x'), '*', Constant(5)))
+        # 运行时才会报错的表达式不折叠
+        self.assertIsInstance(optimize_expression(expression('"a" - 1')), BinaryOp)
+    
+    def test_template(self):
+        """测试拼接链展开为模板，相邻常量合并"""
+        optimized = optimize_expression(expression('"您好，" + $name + "，金额" + (10 + 40) + "元"'))
+        self.assertEqual(optimized, Template((Constant("您好，"), Variable('name'), Constant("，金额50元"))))
+        
+        # 第一个字符串之前仍是普通加法
+        optimized = optimize_expression(expression('$a + $b + "元" + $c'))
+        self.assertEqual(optimized, Template((BinaryOp(Variable('a'), '+', Variable('b')),
+                                              Constant("元"), Variable('c'))))
+        
+        # 括号内的拼接一起展开
+        optimized = optimize_expression(expression('"a" + ($x + "b") + "c"'))
+        self.assertEqual(optimized, Template((Constant("a"), Variable('x'), Constant("bc"))))
+        
+        self.assertEqual(optimize_expression(expression('$a + 1')), BinaryOp(Variable('a'), '+', Constant(1)))
+    
+    def test_ast_not_mutated(self):
+        """测试优化不修改原AST"""
+        expr = expression('"x" + 1 + $y + "z"')
+        snapshot = copy.deepcopy(expr)
+        optimize_expression(expr)
+        self.assertEqual(expr, snapshot)
+        self.assertIsInstance(expr.left.left.left, StringLiteral)
+
+
+class TestOptimizedExecution(unittest.TestCase):
+    """优化后执行结果测试"""
+    
+    EXPRESSIONS = [
+        '$a + $b + "元"',
+        '"合计" + $a + $b',
+        '$a + ($b + "x") + $c',
+        '"共" + ($a + 1) + "件，" + $c',
+        '$a * 2 + "-" + -$b',
+        '"是否" + ($a > $b) + (1 == 1)',
+        '$c + $a + $b',
+    ]
+    VALUES = [0, 3, 2.5, -1, "", "文本", "7"]
+    
+    def test_same_as_tree(self):
+        """测试随机变量取值下与逐节点求值结果一致"""
+        rng = random.Random(0)
+        interpreter = Interpreter(parse('Step t\n    Exit'), backend='tree')
+        for source in self.EXPRESSIONS:
+            expr = expression(source)
+            script = parse(f'Step t\n    Set $r = {source}\n    Exit')
+            assign = compile_script(script)['t'].body[0]
+            layout = link_script(script).layout
+            for _ in range(30):
+                variables = {name: rng.choice(self.VALUES) for name in 'abc'}
+                tree_context = ExecutionContext(variables=dict(variables))
+                closure_context = ExecutionContext(variables=dict(variables), layout=layout)
+                try:
+                    expected = interpreter._evaluate_expression(expr, tree_context)
+                except TypeError:
+                    with self.assertRaises(TypeError):
+                        assign(interpreter, closure_context)
+                    continue
+                assign(interpreter, closure_context)
+                self.assertEqual(closure_context.variables['r'], expected, (source, variables))
+    
+    def test_literal_speak(self):
+        """测试纯字面量Speak直接输出"""
+        script = parse('Step t\n    Speak "欢迎" + "光临" + 1\n    Exit')
+        interpreter = Interpreter(script)
+        interpreter.create_session('s1')
+        self.assertEqual(interpreter.start('s1').message, "欢迎光临1")
+        self.assertEqual(interpreter.get_session('s1').last_speak_output, "欢迎光临1")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+意图识别提示词构建测试
+测试步骤变量收集、上下文压缩、token预算裁剪以及提示词大小统计
+"""
+
+import sys
+import os
+import json
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.interpreter import Interpreter
+from src.intent_recognizer import GeminiIntentRecognizer, MockIntentRecognizer
+from src.prompt_builder import IntentPromptBuilder, INTENT_PREAMBLE, BATCH_PREAMBLE, estimate_tokens
+from src.linker import step_variables
+
+
+SOURCE = '''Step welcome
+    Set $次数 = $次数 + 1
+    If $会员 == "是"
+        Speak "欢迎回来，" + $姓名
+    Else
+        Speak "您好"
+    EndIf
+    Call 查询科室() = $科室列表
+    Listen 5, 30
+    Branch "挂号", done
+    Default welcome
+
+Step done
+    Exit'''
+
+
+class CapturingRecognizer(MockIntentRecognizer):
+    """记录传入上下文的模拟识别器"""
+    
+    def __init__(self):
+        super().__init__()
+        self.contexts = []
+    
+    def recognize_intent(self, user_input, available_intents, context=None):
+        self.contexts.append(context)
+        return super().recognize_intent(user_input, available_intents, context)
+
+
+def context_of(prompt: str):
+    """取出提示词中的上下文JSON"""
+    marker = "当前对话上下文:\n"
+    if marker not in prompt:
+        return None
+    return json.loads(prompt.split(marker, 1)[1].split("\n", 1)[0])
+
+
+class TestStepVariables(unittest.TestCase):
+    """步骤变量收集测试"""
+    
+    def test_collects_referenced_names(self):
+        script = parse(SOURCE)
+        self.assertEqual(step_variables(script.steps["welcome"]), ("次数", "会员", "姓名", "科室列表"))
+        self.assertEqual(step_variables(script.steps["done"]), ())
+    
+    def test_interpreter_passes_step_variables(self):
+        """测试解释器把当前步骤引用的变量名传给识别器"""
+        recognizer = CapturingRecognizer()
+        interpreter = Interpreter(parse(SOURCE), recognizer)
+        interpreter.create_session("s1")
+        interpreter.start("s1")
+        interpreter.process_input("s1", "挂号")
+        context = recognizer.contexts[0]
+        self.assertEqual(context["step_variables"], ("次数", "会员", "姓名", "科室列表"))
+
+
+class TestIntentPromptBuilder(unittest.TestCase):
+    """提示词构建测试"""
+    
+    CONTEXT = {
+        "variables": {"姓名": "张三", "会员": "是", "订单": {"编号": "D1"}, "备注": "x" * 500},
+        "step_variables": ("姓名", "会员", "未赋值"),
+        "history": [{"role": "user", "content": f"第{i}句", "timestamp": 1700000000.0 + i}
+                    for i in range(8)],
+    }
+    
+    def test_compact_context(self):
+        """测试只保留步骤变量、去掉时间戳、使用紧凑JSON"""
+        builder = IntentPromptBuilder(max_tokens=10000, history_turns=3)
+        prompt = builder.build("我想挂号", ["挂号", "缴费"], self.CONTEXT)
+        
+        self.assertTrue(prompt.startswith(INTENT_PREAMBLE))
+        self.assertIn('用户输入: "我想挂号"', prompt)
+        self.assertNotIn("timestamp", prompt)
+        self.assertNotIn('": ', prompt.split("当前对话上下文:\n", 1)[1])
+        self.assertEqual(context_of(prompt), {
+            "variables": {"姓名": "张三", "会员": "是"},
+            "history": [["user", "第5句"], ["user", "第6句"], ["user", "第7句"]],
+        })
+    
+    def test_without_step_variables(self):
+        """测试未给出步骤变量时保留全部变量，并截断过长的值"""
+        builder = IntentPromptBuilder(max_tokens=10000, max_value_chars=20)
+        context = {"variables": self.CONTEXT["variables"]}
+        variables = context_of(builder.build("挂号", ["挂号"], context))["variables"]
+        self.assertEqual(variables["订单"], {"编号": "D1"})
+        self.assertEqual(variables["备注"], "x" * 20 + "…")
+        
+        self.assertIsNone(context_of(builder.build("挂号", ["挂号"], {"variables": {}, "history": []})))
+        self.assertIsNone(context_of(builder.build("挂号", ["挂号"])))
+    
+    def test_budget(self):
+        """测试超出预算时先丢弃较早的历史，再丢弃变量"""
+        base = estimate_tokens(IntentPromptBuilder().build("我想挂号", ["挂号", "缴费"]))
+        builder = IntentPromptBuilder(max_tokens=base + 40)
+        prompt = builder.build("我想挂号", ["挂号", "缴费"], self.CONTEXT)
+        self.assertLessEqual(estimate_tokens(prompt), builder.max_tokens)
+        history = context_of(prompt)["history"]
+        self.assertEqual(history[-1], ["user", "第7句"])
+        self.assertLess(len(history), 5)
+        self.assertEqual(builder.last["dropped_history"], 5 - len(history))
+        
+        builder.max_tokens = base
+        prompt = builder.build("我想挂号", ["挂号", "缴费"], self.CONTEXT)
+        self.assertIsNone(context_of(prompt))
+        self.assertEqual((builder.last["dropped_history"], builder.last["dropped_variables"]), (5, 2))
+    
+    def test_stats(self):
+        """测试每次构建记录提示词大小"""
+        builder = IntentPromptBuilder()
+        first = builder.build("我想挂号", ["挂号"], self.CONTEXT)
+        builder.build_batch([("挂号", ["挂号"]), ("缴费", ["缴费"])], self.CONTEXT)
+        stats = builder.get_stats()
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['last']['chars'], builder.last['chars'])
+        self.assertEqual(stats['total_chars'], len(first) + builder.last['chars'])
+        self.assertEqual(stats['over_budget'], 0)
+    
+    def test_batch_prompt(self):
+        """测试批量提示词共用静态前导"""
+        prompt = IntentPromptBuilder().build_batch([("挂号", ["挂号"])], self.CONTEXT)
+        self.assertTrue(prompt.startswith(BATCH_PREAMBLE))
+        self.assertIn('待识别输入(JSON数组):\n[{"id":0,"input":"挂号","intents":["挂号"]}]\n', prompt)
+    
+    def test_recognizer_uses_builder(self):
+        """测试识别器通过构建器生成提示词"""
+        builder = IntentPromptBuilder()
+        recognizer = GeminiIntentRecognizer("test-key", prompt_builder=builder)
+        prompts = []
+        recognizer._make_request = lambda prompt, max_retries=3: prompts.append(prompt) or '{"intent": "挂号"}'
+        recognizer.recognize_intent("我想挂号", ["挂号"], self.CONTEXT)
+        self.assertEqual(builder.calls, 1)
+        self.assertEqual(len(prompts[0]), builder.last['chars'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
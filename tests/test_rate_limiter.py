@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+LLM请求限流测试
+测试令牌桶、Retry-After解析、抖动退避以及识别器的限流降级
+"""
+
+import sys
+import os
+import time
+import random
+import threading
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from src.intent_recognizer import GeminiIntentRecognizer, MockIntentRecognizer
+from src.async_gemini import AsyncGeminiClient
+from tests.stubs import GeminiStubServer, FakeClock
+
+
+class TestTokenBucket(unittest.TestCase):
+    """令牌桶测试"""
+    
+    def test_refill_and_capacity(self):
+        """测试按速率补充令牌且不超过容量"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+        self.assertEqual(sum(bucket.try_acquire() for _ in range(5)), 3)
+        
+        clock.now += 1
+        self.assertEqual(sum(bucket.try_acquire() for _ in range(5)), 2)
+        
+        clock.now += 100
+        self.assertEqual(bucket.available, 3)
+        
+        stats = bucket.get_stats()
+        self.assertEqual((stats['granted'], stats['rejected'], stats['reject_rate']), (5, 5, 0.5))
+        self.assertEqual(stats['rate_per_minute'], 120)
+    
+    def test_wait_for_token(self):
+        """测试等待令牌"""
+        bucket = TokenBucket(rate=20, capacity=1)
+        self.assertTrue(bucket.try_acquire())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(bucket.acquire(timeout=1)))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(results, [True] * 3)
+        self.assertEqual((bucket.granted, bucket.rejected), (4, 0))
+        self.assertFalse(TokenBucket(rate=0.1, capacity=1, clock=FakeClock()).acquire(2, timeout=0))
+    
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+
+
+class TestBackoff(unittest.TestCase):
+    """退避测试"""
+    
+    def test_parse_retry_after(self):
+        """测试解析秒数和HTTP日期"""
+        self.assertEqual(parse_retry_after("5"), 5.0)
+        self.assertEqual(parse_retry_after("-3"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480.0), 10.0)
+    
+    def test_backoff_delay(self):
+        """测试抖动范围以及遵循Retry-After"""
+        rng = random.Random(0)
+        for attempt in range(6):
+            for _ in range(20):
+                delay = backoff_delay(attempt, base=1.0, cap=8.0, rng=rng)
+                self.assertTrue(0 <= delay <= min(8.0, 2 ** attempt))
+        delays = {backoff_delay(2, rng=rng) for _ in range(10)}
+        self.assertGreater(len(delays), 1)
+        
+        delay = backoff_delay(0, base=0.5, retry_after=3.0, rng=rng)
+        self.assertTrue(3.0 <= delay <= 3.5)
+
+
+class TestRecognizerRateLimit(unittest.TestCase):
+    """识别器限流测试"""
+    
+    def setUp(self):
+        self.server = GeminiStubServer(reply=lambda prompt: '{"intent": "挂号", "confidence": 0.9}')
+        self.server.start()
+    
+    def tearDown(self):
+        self.server.stop()
+    
+    def make_recognizer(self, **kwargs) -> GeminiIntentRecognizer:
+        recognizer = GeminiIntentRecognizer("test-key", **kwargs)
+        recognizer.base_url = self.server.base_url
+        return recognizer
+    
+    def test_degrade_when_bucket_empty(self):
+        """测试令牌桶为空时不发请求，交给降级识别器"""
+        fallback = MockIntentRecognizer()
+        fallback.set_response("我想挂号", "缴费")
+        recognizer = self.make_recognizer(rate_limiter=TokenBucket(rate=0.01, capacity=1),
+                                          fallback_recognizer=fallback)
+        self.assertEqual(recognizer.recognize_intent("我想挂号", ["挂号", "缴费"]).intent, "挂号")
+        self.assertEqual(recognizer.recognize_intent("我想挂号", ["挂号", "缴费"]).intent, "缴费")
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(recognizer.rate_limiter.rejected, 1)
+        self.assertEqual(recognizer.get_degraded_stats(), {'rate_limited': 1, 'circuit_open': 0, 'total': 1})
+    
+    def test_async_client_degrades(self):
+        """测试异步客户端取不到令牌时同样降级"""
+        client = AsyncGeminiClient("test-key", base_url=self.server.base_url,
+                                   rate_limiter=TokenBucket(rate=0.01, capacity=1))
+        try:
+            recognizer = GeminiIntentRecognizer("test-key", async_client=client)
+            recognizer.recognize_intent("挂号吧", ["挂号"])
+            result = recognizer.recognize_intent("我要挂号", ["挂号", "缴费"])
+            self.assertEqual(result.raw_response, "fallback_match: 挂号")
+            self.assertEqual(len(self.server.requests), 1)
+        finally:
+            client.close()
+    
+    def test_retry_after_honoured(self):
+        """测试429时按Retry-After等待后重试，等待过久时放弃"""
+        recognizer = self.make_recognizer()
+        self.server.statuses = [(429, {"Retry-After": "0.3"})]
+        start = time.monotonic()
+        self.assertEqual(recognizer.recognize_intent("我想挂号", ["挂号", "缴费"]).intent, "挂号")
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(len(self.server.requests), 2)
+        
+        recognizer.max_backoff = 5
+        self.server.statuses = [(429, {"Retry-After": "60"})]
+        start = time.monotonic()
+        result = recognizer.recognize_intent("我想挂号", ["挂号", "缴费"])
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(result.raw_response, "fallback_match: 挂号")
+        self.assertEqual(len(self.server.requests), 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+脚本缓存测试
+测试磁盘缓存的命中、语法版本失效和损坏条目回退
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.script_cache import ScriptCache, grammar_fingerprint
+
+
+SOURCE = '''Step welcome
+    Speak "欢迎" + $name
+    Branch "挂号", registration
+    Default welcome
+
+Step registration
+    Speak "挂号成功"
+    Exit'''
+
+
+class TestScriptCache(unittest.TestCase):
+    """磁盘脚本缓存测试"""
+    
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ScriptCache(self.cache_dir)
+    
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    def test_miss_then_hit(self):
+        """测试首次解析后命中缓存"""
+        script, errors = self.cache.parse(SOURCE)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(errors, [])
+        
+        # 新实例模拟新的worker进程
+        other = ScriptCache(self.cache_dir)
+        cached, _ = other.parse(SOURCE)
+        self.assertEqual(other.hits, 1)
+        self.assertEqual(cached, script)
+        self.assertEqual(cached, parse(SOURCE))
+    
+    def test_errors_are_cached(self):
+        """测试解析错误随脚本一起缓存"""
+        source = 'Speak "无步骤"\n' + SOURCE
+        _, errors = self.cache.parse(source)
+        _, cached_errors = ScriptCache(self.cache_dir).parse(source)
+        self.assertEqual([str(e) for e in cached_errors], [str(e) for e in errors])
+        self.assertTrue(cached_errors)
+    
+    def test_grammar_change_invalidates(self):
+        """测试语法变化后缓存失效"""
+        self.cache.parse(SOURCE)
+        
+        changed = ScriptCache(self.cache_dir, fingerprint='0' * 64)
+        changed.parse(SOURCE)
+        self.assertEqual(changed.hits, 0)
+        self.assertEqual(changed.misses, 1)
+        
+        # 清理旧版本目录
+        self.assertEqual(changed.prune_stale(), 1)
+        self.assertEqual(os.listdir(self.cache_dir), ['0' * 16])
+    
+    def test_corrupted_entry_falls_back(self):
+        """测试损坏条目回退到重新解析"""
+        self.cache.parse(SOURCE)
+        path = self.cache._entry_path(self.cache.cache_key(SOURCE))
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+        
+        script, _ = self.cache.parse(SOURCE)
+        self.assertEqual(script, parse(SOURCE))
+        self.assertEqual(self.cache.corrupted, 1)
+        
+        # 回退后重新写入了有效条目
+        self.assertIsNotNone(self.cache.get(SOURCE))
+    
+    def test_fingerprint_stable(self):
+        """测试语法指纹稳定"""
+        self.assertEqual(grammar_fingerprint(), grammar_fingerprint())
+        self.assertEqual(len(grammar_fingerprint()), 64)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
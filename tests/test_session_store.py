@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+会话存储测试
+测试空闲超时、LRU淘汰、过期堆清理以及解释器接入
+"""
+
+import sys
+import os
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.interpreter import Interpreter
+from src.intent_recognizer import MockIntentRecognizer
+from src.session_store import BoundedSessionStore, InMemorySessionStore
+from tests.stubs import FakeClock
+
+
+class TestBoundedSessionStore(unittest.TestCase):
+    """有界会话存储测试"""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = BoundedSessionStore(max_sessions=3, idle_ttl=10, clock=self.clock)
+    
+    def test_put_get_remove(self):
+        """测试基本读写"""
+        self.store.put("a", 1)
+        self.assertEqual(self.store.get("a"), 1)
+        self.assertIsNone(self.store.get("b"))
+        self.assertEqual(self.store.remove("a"), 1)
+        self.assertIsNone(self.store.remove("a"))
+        self.assertEqual(len(self.store), 0)
+        
+        stats = self.store.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['removed'], 1)
+    
+    def test_idle_expiry(self):
+        """测试空闲超时"""
+        self.store.put("a", 1)
+        self.clock.advance(9)
+        self.assertIn("a", self.store)
+        self.clock.advance(1)
+        self.assertNotIn("a", self.store)
+        self.assertIsNone(self.store.get("a"))
+        self.assertEqual(self.store.expired, 1)
+    
+    def test_access_extends_ttl(self):
+        """测试访问会刷新超时"""
+        self.store.put("a", 1)
+        self.clock.advance(8)
+        self.assertEqual(self.store.get("a"), 1)
+        self.clock.advance(8)
+        self.assertEqual(self.store.get("a"), 1)
+        self.clock.advance(10)
+        self.assertIsNone(self.store.get("a"))
+    
+    def test_lru_eviction(self):
+        """测试超过最大会话数时淘汰最久未访问的会话"""
+        for sid in ("a", "b", "c"):
+            self.store.put(sid, sid)
+        self.store.get("a")
+        self.store.put("d", "d")
+        
+        self.assertEqual(sorted(self.store), ["a", "c", "d"])
+        self.assertEqual(self.store.evicted, 1)
+    
+    def test_sweep(self):
+        """测试批量清理只移除到期会话"""
+        self.store.put("a", 1)
+        self.clock.advance(5)
+        self.store.put("b", 2)
+        self.clock.advance(5)
+        
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertEqual(list(self.store), ["b"])
+        self.clock.advance(5)
+        self.assertEqual(self.store.sweep(), 1)
+        self.assertEqual(len(self.store), 0)
+    
+    def test_overwrite_keeps_new_deadline(self):
+        """测试覆盖写入后旧的过期记录不影响新条目"""
+        self.store.put("a", 1)
+        self.clock.advance(5)
+        self.store.put("a", 2)
+        self.clock.advance(6)
+        self.assertEqual(self.store.get("a"), 2)
+    
+    def test_heap_stays_bounded(self):
+        """测试反复覆盖写入时过期堆不会无限增长"""
+        store = BoundedSessionStore(max_sessions=10, idle_ttl=10, clock=self.clock)
+        for i in range(1000):
+            store.put(f"s{i % 20}", i)
+        self.assertEqual(len(store), 10)
+        self.assertLessEqual(len(store._heap), 2 * 10 + 65)
+    
+    def test_invalid_limits(self):
+        """测试非法参数"""
+        with self.assertRaises(ValueError):
+            BoundedSessionStore(max_sessions=0)
+        with self.assertRaises(ValueError):
+            BoundedSessionStore(idle_ttl=0)
+
+
+class TestInterpreterSessionStore(unittest.TestCase):
+    """解释器会话存储接入测试"""
+    
+    SOURCE = '''Step welcome
+    Speak "你好"
+    Listen 5, 30
+    Branch "退出", goodbye
+    Default welcome
+
+Step goodbye
+    Speak "再见"
+    Exit'''
+    
+    def test_default_store_is_unbounded(self):
+        """测试默认使用无上限存储"""
+        interpreter = Interpreter(parse(self.SOURCE), MockIntentRecognizer())
+        self.assertIsInstance(interpreter.contexts, InMemorySessionStore)
+        for i in range(100):
+            interpreter.create_session(f"s{i}")
+        self.assertEqual(interpreter.session_count(), 100)
+    
+    def test_expired_session(self):
+        """测试过期会话不再可用"""
+        clock = FakeClock()
+        store = BoundedSessionStore(max_sessions=10, idle_ttl=60, clock=clock)
+        interpreter = Interpreter(parse(self.SOURCE), MockIntentRecognizer(),
+                                  session_store=store)
+        
+        interpreter.create_session("s1")
+        self.assertEqual(interpreter.start("s1").message, "你好")
+        
+        clock.advance(61)
+        self.assertIsNone(interpreter.get_session("s1"))
+        output = interpreter.process_input("s1", "退出")
+        self.assertEqual(output.state.name, "ERROR")
+    
+    def test_lru_bounds_sessions(self):
+        """测试会话数受上限约束"""
+        store = BoundedSessionStore(max_sessions=5, idle_ttl=60)
+        interpreter = Interpreter(parse(self.SOURCE), MockIntentRecognizer(),
+                                  session_store=store)
+        for i in range(20):
+            interpreter.create_session(f"s{i}")
+            interpreter.start(f"s{i}")
+        
+        self.assertEqual(interpreter.session_count(), 5)
+        self.assertIsNotNone(interpreter.get_session("s19"))
+        self.assertIsNone(interpreter.get_session("s0"))
+        self.assertEqual(store.get_stats()['evicted'], 15)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+字节码虚拟机测试
+测试字节码生成、反汇编、序列化，以及与逐节点遍历AST的执行结果完全一致
+"""
+
+import sys
+import os
+import marshal
+import tempfile
+import shutil
+import unittest
+
+# 添加项目路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.parser import parse
+from src.script_cache import ScriptCache
+from src.interpreter import Interpreter, InterpreterState
+from src.intent_recognizer import MockIntentRecognizer
+from src.vm import (
+    compile_bytecode, attach_bytecode, disassemble, dumps, loads,
+    OPNAMES, JUMP, JUMP_IF_FALSE, GOTO
+)
+from benchmarks.fixtures import DeterministicServiceHandler, random_conversation
+from tests.stubs import run_script
+
+
+def opnames(bytecode, step: str):
+    code = bytecode.steps[bytecode.step_names.index(step)].code
+    return [OPNAMES[code[pc]] for pc in range(0, len(code), 2)]
+
+
+class TestBytecodeCompiler(unittest.TestCase):
+    """字节码生成测试"""
+    
+    def test_control_flow_as_jumps(self):
+        """测试If/While编译为跳转指令"""
+        bytecode = compile_bytecode(parse('''Step test
+    Set $i = 0
+    While $i < 3
+        If $i == 1
+            Speak "一"
+        Else
+            Goto done
+        EndIf
+        Set $i = $i + 1
+    EndWhile
+    Listen 5, 30
+
+Step done
+    Exit'''))
+        self.assertEqual(opnames(bytecode, 'test'), [
+            'LOAD_CONST', 'STORE_VAR', 'SETUP_LOOP',
+            'LOAD_VAR', 'LOAD_CONST', 'COMPARE_OP', 'JUMP_IF_FALSE', 'LOOP_GUARD',
+            'LOAD_VAR', 'LOAD_CONST', 'COMPARE_OP', 'JUMP_IF_FALSE',
+            'LOAD_CONST', 'SPEAK', 'JUMP', 'GOTO',
+            'LOAD_VAR', 'LOAD_CONST', 'BINARY_OP', 'STORE_VAR', 'JUMP',
+        ])
+        step = bytecode.steps[0]
+        self.assertTrue(step.has_listen)
+        self.assertEqual(step.loops, 1)
+        self.assertEqual(bytecode.steps[1].code, ())
+        
+        # 跳转目标都落在指令边界上，Goto携带目标步骤下标
+        for pc in range(0, len(step.code), 2):
+            if step.code[pc] in (JUMP, JUMP_IF_FALSE):
+                self.assertEqual(step.code[pc + 1] % 2, 0)
+                self.assertLessEqual(step.code[pc + 1], len(step.code))
+            if step.code[pc] == GOTO:
+                self.assertEqual(step.code[pc + 1], 1)
+    
+    def test_optimized_expressions(self):
+        """测试常量折叠、拼接模板与常量条件"""
+        bytecode = compile_bytecode(parse('''Step test
+    Speak "您好，" + $name + "，金额" + (10 + 40) + "元"
+    If 1 > 2
+        Speak "不会执行"
+    Else
+        Set $a = 1
+        Set $b = $a
+        Set $c = 1.0
+    EndIf
+    Exit'''))
+        self.assertEqual(opnames(bytecode, 'test'), [
+            'LOAD_CONST', 'LOAD_VAR', 'LOAD_CONST', 'CONCAT', 'SPEAK',
+            'LOAD_CONST', 'STORE_VAR', 'LOAD_VAR', 'STORE_VAR', 'LOAD_CONST', 'STORE_VAR',
+        ])
+        # 1 与 1.0 不合并为同一个常量
+        self.assertEqual(bytecode.steps[0].consts, ("您好，", "，金额50元", 1, 1.0))
+    
+    def test_compiled_once_per_script(self):
+        """测试同一脚本只编译一次"""
+        script = parse('Step a\n    Speak "hi"\n    Exit')
+        bytecode = compile_bytecode(script)
+        self.assertIs(compile_bytecode(script), bytecode)
+        self.assertIs(Interpreter(script, backend='vm')._bytecode, bytecode)
+    
+    def test_disassemble(self):
+        """测试反汇编输出"""
+        bytecode = compile_bytecode(parse('''Step a
+    Call 查询科室() = $科室
+    If $科室 != ""
+        Goto b
+    EndIf
+
+Step b
+    Speak "共" + len($科室) + "个"
+    Exit'''))
+        self.assertEqual(disassemble(bytecode, 'a').splitlines(), [
+            "Step a:",
+            "     0 CALL_SERVICE     0 (查询科室/0)",
+            "     2 STORE_VAR        0 ($科室)",
+            "     4 LOAD_VAR         0 ($科室)",
+            "     6 LOAD_CONST       1 ('')",
+            "     8 COMPARE_OP       1 (!=)",
+            "    10 JUMP_IF_FALSE   14 (to 14)",
+            "    12 GOTO             1 (b)",
+        ])
+        text = disassemble(bytecode)
+        self.assertIn("Step b:", text)
+        self.assertIn("CALL_FUNCTION    1 (len/1)", text)
+        self.assertIn("SPEAK            1 (output)", text)
+
+
+class TestSerialization(unittest.TestCase):
+    """字节码序列化测试"""
+    
+    def load(self, name: str):
+        with open(os.path.join(project_root, 'scripts', f'{name}.dsl'), 'r', encoding='utf-8') as f:
+            return f.read()
+    
+    def test_round_trip(self):
+        """测试序列化后内容不变"""
+        bytecode = compile_bytecode(parse(self.load('restaurant')))
+        data = dumps(bytecode)
+        restored = loads(data)
+        self.assertEqual(restored.names, bytecode.names)
+        self.assertEqual(restored.step_names, bytecode.step_names)
+        for original, copy in zip(bytecode.steps, restored.steps):
+            self.assertEqual((copy.name, copy.code, copy.consts, copy.loops, copy.has_listen),
+                             (original.name, original.code, original.consts,
+                              original.loops, original.has_listen))
+        self.assertEqual(disassemble(restored), disassemble(bytecode))
+    
+    def test_invalid_data(self):
+        """测试损坏或版本不符的数据"""
+        with self.assertRaises(ValueError):
+            loads(b"not bytecode")
+        with self.assertRaises(ValueError):
+            loads(marshal.dumps((0, (), (), ())))
+    
+    def test_attach_checks_layout(self):
+        """测试字节码与脚本不一致时不使用"""
+        bytecode = loads(dumps(compile_bytecode(parse('Step a\n    Set $x = 1\n    Exit'))))
+        self.assertFalse(attach_bytecode(parse('Step a\n    Set $y = 1\n    Exit'), bytecode))
+        script = parse('Step a\n    Set $x = 2\n    Exit')
+        self.assertTrue(attach_bytecode(script, bytecode))
+        self.assertIs(compile_bytecode(script), bytecode)
+    
+    def test_script_cache(self):
+        """测试字节码随脚本缓存保存，加载后直接使用"""
+        cache_dir = tempfile.mkdtemp()
+        try:
+            # 默认不编译也不保存字节码
+            source = self.load('theater')
+            ScriptCache(cache_dir).parse(source)
+            script, _ = ScriptCache(cache_dir, store_bytecode=True).parse(source)
+            self.assertNotIn('_bytecode', script.__dict__)
+            
+            source = self.load('hospital')
+            ScriptCache(cache_dir, store_bytecode=True).parse(source)
+            script, _ = ScriptCache(cache_dir).parse(source)
+            self.assertIn('_bytecode', script.__dict__)
+            
+            interpreter = Interpreter(script, MockIntentRecognizer(), DeterministicServiceHandler(), backend='vm')
+            interpreter.create_session('s1')
+            self.assertTrue(interpreter.start('s1').waiting_for_input)
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class TestVMSemantics(unittest.TestCase):
+    """执行语义测试（与逐节点遍历AST结果一致）"""
+    
+    def assertSameResult(self, source: str, variables: dict = None):
+        tree_output, tree_context = run_script(source, 'tree', variables)
+        vm_output, vm_context = run_script(source, 'vm', variables)
+        self.assertEqual(vm_output, tree_output)
+        self.assertEqual(vm_context.variables, tree_context.variables)
+        self.assertEqual(vm_context.last_speak_output, tree_context.last_speak_output)
+        return vm_output, vm_context
+    
+    def test_expressions(self):
+        """测试算术、拼接、逻辑与内置函数"""
+        _, context = self.assertSameResult('''Step test
+    Set $a = 10 - 4 * 2
+    Set $b = $a / 0
+    Set $c = -$a
+    Set $d = "共" + $n + "件，" + 1.5 + $missing
+    Set $e = 1 < 2 and not ($n >= 3)
+    Set $f = len("挂号") + int("3")
+    Set $g = $n + $a + "元"
+    Exit''', {'n': 3})
+        self.assertEqual(context.variables['d'], '共3件，1.5')
+        self.assertEqual(context.variables['g'], '5元')
+    
+    def test_nested_speak_discarded(self):
+        """测试嵌套语句块中的Speak只记录不输出"""
+        output, context = self.assertSameResult('''Step test
+    Speak "开始"
+    Set $i = 0
+    While $i < 3
+        Set $i = $i + 1
+        If $i == 2
+            Speak "第" + $i + "次"
+        EndIf
+    EndWhile
+    Speak ""
+    Listen 5, 30''')
+        self.assertEqual(output.message, "开始")
+        self.assertEqual(context.last_speak_output, "")
+    
+    def test_goto_and_service(self):
+        """测试服务调用结果与Goto跳转"""
+        output, _ = self.assertSameResult('''Step test
+    Speak "被丢弃的输出"
+    Call 查询科室($dept, 2) = $result
+    Call 记录日志()
+    If $vip == 1
+        Goto vip
+    EndIf
+    Goto normal
+
+Step vip
+    Speak "贵宾：" + $result
+    Exit
+
+Step normal
+    Speak "普通通道"
+    Exit''', {'vip': 1, 'dept': "内科"})
+        self.assertTrue(output.message.startswith("贵宾："))
+        self.assertEqual(output.state, InterpreterState.FINISHED)
+    
+    def test_nested_loops_guard(self):
+        """测试每个循环各自计数，外层循环重新开始内层计数"""
+        self.assertSameResult('''Step test
+    Set $i = 0
+    Set $n = 0
+    While $i < 30
+        Set $i = $i + 1
+        Set $j = 0
+        While $j < 40
+            Set $j = $j + 1
+            Set $n = $n + 1
+        EndWhile
+    EndWhile
+    Exit''')
+        with self.assertRaises(RuntimeError):
+            run_script('Step test\n    While 1\n        Set $i = 1\n    EndWhile', 'vm')
+    
+    def test_type_error(self):
+        """测试运行时类型错误与其他后端一致"""
+        for backend in ('tree', 'vm'):
+            with self.assertRaises(TypeError):
+                run_script('Step test\n    Set $a = "x" - 1\n    Exit', backend)
+
+
+class TestShippedScripts(unittest.TestCase):
+    """业务脚本跨后端等价性测试"""
+    
+    def assert_equivalent(self, name: str):
+        path = os.path.join(project_root, 'scripts', f'{name}.dsl')
+        with open(path, 'r', encoding='utf-8') as f:
+            script = parse(f.read())
+        
+        for seed in range(20):
+            transcripts = {}
+            for backend in Interpreter.BACKENDS:
+                interpreter = Interpreter(script, MockIntentRecognizer(),
+                                          DeterministicServiceHandler(), backend=backend)
+                transcripts[backend] = random_conversation(interpreter, f's{seed}', seed)
+            for backend in ('closure', 'vm'):
+                self.assertEqual(transcripts[backend], transcripts['tree'], f"{name} {backend} seed={seed}")
+    
+    def test_hospital(self):
+        """测试医院脚本"""
+        self.assert_equivalent('hospital')
+    
+    def test_restaurant(self):
+        """测试餐厅脚本"""
+        self.assert_equivalent('restaurant')
+    
+    def test_theater(self):
+        """测试剧院脚本"""
+        self.assert_equivalent('theater')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)